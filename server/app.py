@@ -1,18 +1,23 @@
 import os
 import json
+import math
 import datetime
-import urllib.request
-from bs4 import BeautifulSoup
-import io
+import hashlib
+import threading
 from flask import Flask, request, jsonify, render_template, redirect, url_for, session, Response, stream_with_context
 import mysql.connector
 from dotenv import load_dotenv
-from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage, AssistantMessage
-from azure.core.credentials import AzureKeyCredential
 from datetime import timedelta
-from newsapi import NewsApiClient
 import rag as rag_module
+import jobs
+from cache import cache
+import metrics
+import profiler
+import tracing
+import memory
+import logs
+import http_client
+import resilience
 
 load_dotenv()
 
@@ -31,32 +36,69 @@ for _key in _REQUIRED_ENV:
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = os.environ['FLASK_SECRET_KEY']
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
-
-from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage, AssistantMessage
-from azure.core.credentials import AzureKeyCredential
-
-# ── GitHub Models AI Client ───────────────────────────────────────────────────
-ai_client = ChatCompletionsClient(
-    endpoint="https://models.github.ai/inference",
-    credential=AzureKeyCredential(os.environ['GITHUB_TOKEN']),
-)
-
-# ── RAG: build knowledge base at startup ─────────────────────────────────────
-rag_module.build_knowledge_base()
+metrics.init_app(app)
+profiler.init_app(app)
+tracing.init_app(app)
+memory.init_app(app)
+logs.init_app(app)
+log = logs.get_logger('app')
+
+# ── Response cache TTLs (seconds); backend chosen by CACHE_BACKEND ──────────
+NEWS_CACHE_TTL = int(os.environ.get('NEWS_CACHE_TTL', '300'))
+HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', '900'))
+CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', '3600'))
+# Last good upstream data is kept this long and served while an upstream is down
+STALE_CACHE_TTL = int(os.environ.get('STALE_CACHE_TTL', '86400'))
+
+# ── Lazily constructed upstream clients ──────────────────────────────────────
+# The Azure SDK is slow to import, so it is imported and the clients built
+# on the first request that needs them. The RAG knowledge base is likewise
+# built on the first get_context() call.
+_client_lock = threading.Lock()
+_ai_client = None
+_newsapi = None
+
+
+def get_ai_client():
+    """Return the shared GitHub Models client, creating it on first use."""
+    global _ai_client
+    if _ai_client is None:
+        with _client_lock:
+            if _ai_client is None:
+                from azure.ai.inference import ChatCompletionsClient
+                from azure.core.credentials import AzureKeyCredential
+                _ai_client = ChatCompletionsClient(
+                    endpoint=os.environ.get('GITHUB_MODELS_ENDPOINT', 'https://models.github.ai/inference'),
+                    credential=AzureKeyCredential(os.environ['GITHUB_TOKEN']),
+                    transport=http_client.azure_transport(),
+                    retry_total=0,   # retries are handled by resilience.py
+                )
+    return _ai_client
+
+
+def get_newsapi():
+    """Return the shared NewsAPI client, creating it on first use."""
+    global _newsapi
+    if _newsapi is None:
+        with _client_lock:
+            if _newsapi is None:
+                from news_client import NewsClient
+                _newsapi = NewsClient(api_key=os.environ['NEWS_API_KEY'])
+    return _newsapi
 
 
 # ── Database connection ───────────────────────────────────────────────────────
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.environ['DB_HOST'],
-        user=os.environ['DB_USER'],
-        password=os.environ['DB_PASSWORD'],
-        database=os.environ['DB_NAME'],
-        port=int(os.environ['DB_PORT']),
-        ssl_ca='ca.pem' if os.environ.get('DB_SSL_CA') else None,
-        ssl_disabled=False
-    )
+    with metrics.upstream_timer('mysql_connect'):
+        return mysql.connector.connect(
+            host=os.environ['DB_HOST'],
+            user=os.environ['DB_USER'],
+            password=os.environ['DB_PASSWORD'],
+            database=os.environ['DB_NAME'],
+            port=int(os.environ['DB_PORT']),
+            ssl_ca='ca.pem' if os.environ.get('DB_SSL_CA') else None,
+            ssl_disabled=False
+        )
 
 
 # --- FRONTEND ROUTES ---
@@ -116,7 +158,7 @@ def register():
         return jsonify({'message': 'User registered successfully'}), 201
 
     except Exception as e:
-        print('Registration error:', str(e))
+        log.exception('registration failed')
         return jsonify({'message': 'Server error during registration: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
@@ -154,7 +196,7 @@ def login():
         return jsonify({'message': 'Login successful', 'role': user['role']}), 200
 
     except Exception as e:
-        print('Login error:', str(e))
+        log.exception('login failed')
         return jsonify({'message': 'Server error during login: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
@@ -179,7 +221,7 @@ def get_balance():
         return jsonify({'balance': str(user['balance'])}), 200
 
     except Exception as e:
-        print('Balance error:', str(e))
+        log.exception('balance failed')
         return jsonify({'message': 'Server error: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
@@ -199,62 +241,104 @@ def chat():
         return jsonify({'message': 'Message is required'}), 400
 
     try:
-        context = rag_module.get_context(user_message, top_k=3)
-        history_str = ""
-        for msg in history[-6:]:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            history_str += f"{role}: {msg['content']}\n"
-            
-        system_prompt = (
-            "You are KodBank AI, a helpful and professional financial assistant "
-            "embedded in the KodBank personal finance platform. "
-            "Answer clearly and concisely. If the question relates to the app, "
-            "use the provided context to give accurate guidance.\n"
-            + context + "\n\n"
-            + "--- Conversation History ---\n"
-            + history_str + "\n--- End History ---\n\n"
-            + f"User Message: {user_message}"
-        )
+        with tracing.span('rag.get_context') as sp:
+            context = rag_module.get_context(user_message, top_k=2, max_chars=400)
+            sp.set(context_chars=len(context))
+
+        # Stand-alone questions (no history) are answered from the shared
+        # cache, keyed on the question and the context retrieved for it: a
+        # news refresh only retires answers whose context changed
+        answer_key = None
+        if not history:
+            question = ' '.join(user_message.lower().split())
+            answer_key = 'chat:' + hashlib.sha256(f'{question}\0{context}'.encode()).hexdigest()
+            cached_answer = cache.get(answer_key)
+            if cached_answer is not None:
+                def replay():
+                    yield 'data: ' + json.dumps({'token': cached_answer}) + '\n\n'
+                    yield 'data: [DONE]\n\n'
+                return Response(replay(), mimetype='text/event-stream',
+                                headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+        from azure.ai.inference.models import SystemMessage, UserMessage, AssistantMessage
+
+        with tracing.span('prompt.build') as sp:
+            history_str = ""
+            for msg in history[-6:]:
+                role = "User" if msg["role"] == "user" else "Assistant"
+                history_str += f"{role}: {msg['content']}\n"
+
+            system_prompt = (
+                "You are KodBank AI, a helpful and professional financial assistant "
+                "embedded in the KodBank personal finance platform. "
+                "Answer clearly and concisely. If the question relates to the app, "
+                "use the provided context to give accurate guidance.\n"
+                + context + "\n\n"
+                + "--- Conversation History ---\n"
+                + history_str + "\n--- End History ---\n\n"
+                + f"User Message: {user_message}"
+            )
+
+            messages = [SystemMessage(content=system_prompt)]
+            for msg in history:
+                if msg["role"] == "user":
+                    messages.append(UserMessage(content=msg["content"]))
+                elif msg["role"] == "model":
+                    messages.append(AssistantMessage(content=msg["content"]))
+            messages.append(UserMessage(content=user_message))
+            sp.set(prompt_chars=len(system_prompt), messages=len(messages))
+
+        # TTFT spans the request to the model until the first streamed token
+        root = tracing.current_span()
+        ttft = tracing.start_span('llm.ttft', parent=root)
+        # The bulkhead slot stays taken until the stream is consumed or dropped
+        with metrics.upstream_timer('github_models'):
+            response, slot = resilience.call('github_models', lambda: get_ai_client().complete(
+                messages=messages,
+                model="meta/Llama-4-Scout-17B-16E-Instruct",
+                stream=True
+            ), hold_slot=True)
 
-        messages = [SystemMessage(content=system_prompt)]
-        for msg in history:
-            if msg["role"] == "user":
-                messages.append(UserMessage(content=msg["content"]))
-            elif msg["role"] == "model":
-                messages.append(AssistantMessage(content=msg["content"]))
-        messages.append(UserMessage(content=user_message))
-
-        response = ai_client.complete(
-            messages=messages, 
-            model="meta/Llama-4-Scout-17B-16E-Instruct",
-            stream=True
-        )
-        
         def generate():
+            parts = []
+            stream = tracing.start_span('llm.stream', parent=root)
             try:
                 for chunk in response:
                     # Azure responses emit delta patches
                     if chunk.choices and len(chunk.choices) > 0:
                         delta = chunk.choices[0].delta.content
                         if delta:
+                            ttft.end()
+                            parts.append(delta)
                             yield 'data: ' + json.dumps({'token': delta}) + '\n\n'
+                ttft.end()   # no-op unless the stream produced no tokens
+                if answer_key and parts:
+                    cache.set(answer_key, ''.join(parts), ttl=CHAT_CACHE_TTL)
+                stream.set(tokens=len(parts), chars=sum(len(p) for p in parts))
+                stream.end()
                 yield 'data: [DONE]\n\n'
             except Exception as e:
-                import traceback
-                traceback.print_exc()
-                print('Llama Stream Error:', str(e))
+                ttft.end('error')
+                stream.set(error=str(e))
+                stream.end('error')
+                log.exception('chat stream failed')
                 err = json.dumps({'token': '⚠️ Stream interrupted.'})
                 yield 'data: ' + err + '\n\n'
                 yield 'data: [DONE]\n\n'
-
-        return Response(stream_with_context(generate()),
-                        mimetype='text/event-stream',
-                        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
-
+            finally:
+                slot.release()
+
+        streamed = Response(stream_with_context(generate()),
+                            mimetype='text/event-stream',
+                            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+        # Also covers a client that disconnects before generate() starts
+        streamed.call_on_close(slot.release)
+        return streamed
+
+    except resilience.UpstreamUnavailable as e:
+        return _unavailable(e, 'The AI assistant is busy; please try again shortly.')
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print('Llama initialization error:', str(e))
+        log.exception('chat request failed')
         return jsonify({'message': 'Failed to communicate with AI model'}), 500
 
 
@@ -294,7 +378,7 @@ def deposit():
         return jsonify({'message': 'Deposit successful'}), 200
 
     except Exception as e:
-        print('Deposit error:', str(e))
+        log.exception('deposit failed')
         return jsonify({'message': 'Server error: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
@@ -345,7 +429,7 @@ def withdraw():
         return jsonify({'message': 'Withdrawal successful'}), 200
 
     except Exception as e:
-        print('Withdraw error:', str(e))
+        log.exception('withdraw failed')
         return jsonify({'message': 'Server error: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
@@ -377,33 +461,35 @@ def get_transactions():
         return jsonify({'transactions': transactions}), 200
 
     except Exception as e:
-        print('Transactions error:', str(e))
+        log.exception('transactions failed')
         return jsonify({'message': 'Server error: ' + str(e)}), 500
     finally:
         if conn and conn.is_connected():
             cursor.close()
             conn.close()
 
-# ── NewsAPI ───────────────────────────────────────────────────────────────────
-newsapi = NewsApiClient(api_key=os.environ['NEWS_API_KEY'])
-
-
 @app.route('/api/news', methods=['GET'])
 def get_news():
     if 'user_id' not in session:
         return jsonify({'message': 'Unauthorized'}), 401
 
     category = request.args.get('category', 'latest')
-    
+    cache_key = f'news:{category.lower()}'
+    filtered_articles = cache.get(cache_key)
+    if filtered_articles is not None:
+        return jsonify({'articles': filtered_articles}), 200
+
     try:
-        if category == 'latest':
-            # Fetch top business headlines
-            response = newsapi.get_top_headlines(category='business', language='en', country='us')
-            raw_articles = response.get('articles', [])
-        else:
-            # Perform keyword search
-            response = newsapi.get_everything(q=category, language='en', sort_by='publishedAt')
-            raw_articles = response.get('articles', [])
+        newsapi = get_newsapi()
+        with metrics.upstream_timer('newsapi'):
+            if category == 'latest':
+                # Fetch top business headlines
+                response = newsapi.get_top_headlines(category='business', language='en', country='us')
+                raw_articles = response.get('articles', [])
+            else:
+                # Perform keyword search
+                response = newsapi.get_everything(q=category, language='en', sort_by='publishedAt')
+                raw_articles = response.get('articles', [])
 
         filtered_articles = []
         seen_urls = set()
@@ -437,25 +523,81 @@ def get_news():
             if len(filtered_articles) >= 20:
                 break
 
-        return jsonify({'articles': filtered_articles}), 200
-
     except Exception as e:
-        print('NewsAPI error:', str(e))
+        log.error('news fetch failed', extra={'category': category, 'error': str(e)})
+        stale = cache.get(f'stale:{cache_key}')
+        if stale is not None:
+            return jsonify({'articles': stale, 'stale': True}), 200
+        if isinstance(e, resilience.UpstreamUnavailable):
+            return _unavailable(e, 'News is temporarily unavailable.')
         return jsonify({'message': 'Failed to fetch news', 'error': str(e)}), 500
 
-    # ── RAG: refresh news context in background ───────────────────────────────
+    cache.set(cache_key, filtered_articles, ttl=NEWS_CACHE_TTL)
+    cache.set(f'stale:{cache_key}', filtered_articles, ttl=STALE_CACHE_TTL)
+
+    # ── RAG: refresh news context in a background job ─────────────────────────
+    payload = {'articles': filtered_articles}
     try:
-        import threading
-        threading.Thread(
-            target=rag_module.refresh_news,
-            args=(filtered_articles,),
-            daemon=True
-        ).start()
-    except Exception:
-        pass
+        job = jobs.manager.submit('rag-news', rag_module.refresh_news,
+                                  filtered_articles, owner=session['user_id'])
+        payload['job_id'] = job.id
+    except jobs.JobQueueFull as e:
+        log.warning('rag refresh skipped', extra={'error': str(e)})
+
+    return jsonify(payload), 200
+
+
+def _unavailable(e: resilience.UpstreamUnavailable, message: str):
+    """503 for an upstream call that was rejected without being attempted."""
+    response = jsonify({'message': message, 'reason': e.reason})
+    response.status_code = 503
+    if e.retry_after:
+        response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+    return response
+
+
+# ── Background jobs ───────────────────────────────────────────────────────────
+def _get_own_job(job_id):
+    job = jobs.manager.get(job_id)
+    if not job or job.owner != session['user_id']:
+        return None
+    return job
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """SSE stream of a job's progress events; ends after the terminal event."""
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+
+    def generate():
+        for event in job.iter_events():
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield 'data: ' + json.dumps(event) + '\n\n'
+        yield 'data: [DONE]\n\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
 
 # ── Stock Analytics API ─────────────────────────────────────────────────────
-from scraper import fetch_stock_history, calculate_summary_statistics
+# scraper.py, bars.py, downsample.py and the other NumPy-backed modules are
+# imported inside the routes that use them, so importing app does not load NumPy.
 
 @app.route('/api/analytics/tickers')
 def get_tickers():
@@ -466,31 +608,427 @@ def get_tickers():
             tickers = json.load(f)
         return jsonify(tickers), 200
     except Exception as e:
-        print('Tickers error:', str(e))
+        log.exception('tickers load failed')
         return jsonify([]), 200
 
+# Daily series fetched from Yahoo; every other range/interval is derived locally
+_DAILY_BASES = ('2y', '5y', 'max')
+
+
+def _fetch_history(ticker: str, range_: str) -> 'Bars':
+    """Daily bars for `range_` from Yahoo Finance, timed as an upstream call."""
+    from scraper import fetch_stock_history
+    with metrics.upstream_timer('yahoo_finance'):
+        return fetch_stock_history(ticker, range_=range_)
+
+
+def _daily_history(ticker: str, range_: str) -> tuple['Bars', bool]:
+    """
+    Cached daily bars covering `range_`: the smallest cached base series that
+    is long enough, else a fetch of the smallest sufficient base. Returns
+    (bars, is_stale).
+    """
+    from scraper import RANGES
+    days = RANGES[range_]
+    needed = next(b for b in _DAILY_BASES
+                  if RANGES[b] is None or (days is not None and days <= RANGES[b]))
+    for base in _DAILY_BASES[_DAILY_BASES.index(needed) + 1:]:
+        longer = cache.get(f'bars:{ticker}:{base}:1d')
+        if longer is not None:
+            return longer, False
+    return cache.get_or_stale(f'bars:{ticker}:{needed}:1d', HISTORY_CACHE_TTL,
+                              lambda: _fetch_history(ticker, needed),
+                              stale_ttl=STALE_CACHE_TTL, fallback=(RuntimeError,))
+
+
 @app.route('/api/analytics/stock/<ticker>')
 def get_stock_data(ticker):
-    """Fetch historical data and compute statistics for the given ticker."""
+    """
+    Historical bars and statistics for the given ticker. Optional query
+    parameters: range (1mo … 10y, max; default 2y) and interval (1d, 1wk,
+    1mo; default 1d). Shorter ranges and coarser intervals are cut and
+    resampled from cached daily bars, so switching timeframes needs no
+    upstream call. For charts: points (10 … 5000) caps the bars returned,
+    downsampled for chart=line (LTTB) or chart=candle (OHLC buckets,
+    default); start / end (YYYY-MM-DD) return only that window of the range,
+    so zooming in gets full resolution with the same point budget.
+    Statistics always describe the whole range.
+    """
+    import downsample
+    from scraper import (INTERVALS, RANGES, calculate_summary_statistics, resample_history,
+                         slice_dates, slice_range)
     ticker = ticker.upper().strip()
+    range_ = request.args.get('range', '2y')
+    interval = request.args.get('interval', '1d')
+    chart = request.args.get('chart', 'candle')
+    if range_ not in RANGES or interval not in INTERVALS or chart not in downsample.CHARTS:
+        return jsonify({'message': f"range must be one of {', '.join(RANGES)}; "
+                                   f"interval one of {', '.join(INTERVALS)}; "
+                                   f"chart one of {', '.join(downsample.CHARTS)}"}), 400
     try:
-        history = fetch_stock_history(ticker)
-        if not history:
+        points = int(request.args['points']) if request.args.get('points') else None
+    except ValueError:
+        points = 0
+    if points is not None and not downsample.MIN_POINTS <= points <= downsample.MAX_POINTS:
+        return jsonify({'message': f'points must be an integer from {downsample.MIN_POINTS} '
+                                   f'to {downsample.MAX_POINTS}'}), 400
+    try:
+        start, end = (datetime.date.fromisoformat(request.args[k]).isoformat()
+                      if request.args.get(k) else None for k in ('start', 'end'))
+    except ValueError:
+        return jsonify({'message': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if start and end and start > end:
+        return jsonify({'message': 'start must not be after end'}), 400
+    try:
+        with tracing.span('analytics.history', ticker=ticker, range=range_) as sp:
+            daily, stale = _daily_history(ticker, range_)
+            sp.set(stale=stale)
+        with tracing.span('analytics.resample', interval=interval):
+            history = resample_history(slice_range(daily, range_), interval)
+        if not len(history):
             return jsonify({'message': f'No historical data found for {ticker}'}), 404
-        statistics = calculate_summary_statistics(history)
-        return jsonify({
-            'ticker':     ticker,
-            'history':    history,
-            'statistics': statistics,
-        }), 200
+        with tracing.span('analytics.indicators', bars=len(history)):
+            statistics = calculate_summary_statistics(history)
+        view = slice_dates(history, start, end)
+        total = len(view)
+        if points is not None:
+            with tracing.span('analytics.downsample', bars=total, points=points, chart=chart):
+                view = downsample.downsample(view, points, chart)
+        payload = {
+            'ticker':      ticker,
+            'range':       range_,
+            'interval':    interval,
+            'history':     view.to_rows(),
+            'statistics':  statistics,
+            'total_bars':  total,
+            'downsampled': len(view) < total,
+        }
+        if points is not None:
+            payload['chart'] = chart
+        if stale:
+            payload['stale'] = True
+        return jsonify(payload), 200
+    except resilience.UpstreamUnavailable as e:
+        return _unavailable(e, f'Market data for {ticker} is temporarily unavailable.')
     except RuntimeError as e:
         return jsonify({'message': str(e)}), 502
     except Exception as e:
-        print(f'Analytics error for {ticker}:', str(e))
+        log.exception('analytics failed', extra={'ticker': ticker})
         return jsonify({'message': f'Failed to fetch stock data: {str(e)}'}), 500
 
 
-
+@app.route('/api/analytics/backtest/<ticker>')
+def backtest_stock(ticker):
+    """
+    Backtest the analytics signal rules over a ticker's daily closes.
+    Optional query parameters: range (default 5y) and rules (comma-separated
+    subset of backtest.RULES).
+    """
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    import backtest
+    from scraper import RANGES, slice_range
+    ticker = ticker.upper().strip()
+    range_ = request.args.get('range', '5y')
+    rules = [r for r in request.args.get('rules', ','.join(backtest.RULES)).split(',') if r]
+    if range_ not in RANGES or not rules or set(rules) - set(backtest.RULES):
+        return jsonify({'message': f"range must be one of {', '.join(RANGES)}; "
+                                   f"rules a subset of {', '.join(backtest.RULES)}"}), 400
+    try:
+        with tracing.span('analytics.history', ticker=ticker, range=range_) as sp:
+            daily, stale = _daily_history(ticker, range_)
+            sp.set(stale=stale)
+        history = slice_range(daily, range_)
+        if len(history) < 2:
+            return jsonify({'message': f'Not enough historical data for {ticker}'}), 404
+        with tracing.span('analytics.backtest', bars=len(history), rules=len(rules)):
+            results = backtest.run(history.close, rules=rules)
+        payload = {
+            'ticker':   ticker,
+            'range':    range_,
+            'from':     str(history.date[0]),
+            'to':       str(history.date[-1]),
+            'bars':     len(history),
+            'cost_bps': backtest.COST_BPS,
+            'results':  results,
+        }
+        if stale:
+            payload['stale'] = True
+        return jsonify(payload), 200
+    except resilience.UpstreamUnavailable as e:
+        return _unavailable(e, f'Market data for {ticker} is temporarily unavailable.')
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 502
+    except Exception as e:
+        log.exception('backtest failed', extra={'ticker': ticker})
+        return jsonify({'message': f'Backtest failed: {str(e)}'}), 500
+
+
+# Live quotes: one poller per watched ticker, fanned out to every stream.
+# Statistics match the default (2y daily) view of /api/analytics/stock.
+# quotes.py pulls in NumPy (via indicators.py), so the hub is built on the
+# first stream.
+_quote_hub = None
+
+
+def get_quote_hub():
+    """Return the shared QuoteHub, creating it on first use."""
+    global _quote_hub
+    if _quote_hub is None:
+        with _client_lock:
+            if _quote_hub is None:
+                import quotes
+                from scraper import fetch_latest_bar, slice_range
+                _quote_hub = quotes.QuoteHub(
+                    load=lambda ticker: slice_range(_daily_history(ticker, '2y')[0], '2y').to_rows(),
+                    poll=fetch_latest_bar,
+                )
+    return _quote_hub
+
+
+@app.route('/api/analytics/stream/<ticker>')
+def stream_quotes(ticker):
+    """
+    SSE stream of live updates for a ticker: a snapshot event with the latest
+    bar and statistics, then quote events carrying only the changed fields.
+    The stream ends after QUOTE_STREAM_MAX_AGE seconds so it never outlives
+    the worker timeout; EventSource reconnects on its own.
+    """
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    import quotes
+    try:
+        sub = get_quote_hub().subscribe(ticker.upper().strip())
+    except quotes.HubFull as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '30'}
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        for event in sub.events(max_age=quotes.STREAM_MAX_AGE):
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield 'data: ' + json.dumps(event) + '\n\n'
+
+    resp = Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+    # Runs even if the client goes away before the first event is sent
+    resp.call_on_close(sub.close)
+    return resp
+
+
+
+
+# ── Portfolio risk ────────────────────────────────────────────────────────────
+# portfolio.py needs NumPy, so the matrix cache is built on the first request.
+_portfolio_matrices = None
+
+
+def get_portfolio_matrices():
+    """Return the shared portfolio MatrixCache, creating it on first use."""
+    global _portfolio_matrices
+    if _portfolio_matrices is None:
+        with _client_lock:
+            if _portfolio_matrices is None:
+                import portfolio
+                _portfolio_matrices = portfolio.MatrixCache(ttl=HISTORY_CACHE_TTL)
+    return _portfolio_matrices
+
+
+def _portfolio_column(ticker: str, range_: str):
+    import portfolio
+    from scraper import slice_range
+    history = slice_range(_daily_history(ticker, range_)[0], range_)
+    if not len(history):
+        raise RuntimeError(f'No historical data found for {ticker}')
+    return portfolio.price_column(history)
+
+
+@app.route('/api/analytics/portfolio')
+def portfolio_risk():
+    """
+    Risk statistics across a set of holdings. Query parameters: tickers
+    (comma-separated), weights (comma-separated, same order; default equal),
+    range (default 1y) and benchmark (default ^NSEI for all-Indian holdings,
+    else ^GSPC; empty for none).
+    """
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    import portfolio
+    from scraper import RANGES
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.args.get('tickers', '').split(',')
+                                 if t.strip()))
+    range_ = request.args.get('range', '1y')
+    try:
+        weights = [float(w) for w in request.args['weights'].split(',')] \
+            if request.args.get('weights') else [1.0] * len(tickers)
+    except ValueError:
+        weights = []
+    if not 1 <= len(tickers) <= portfolio.MAX_HOLDINGS or range_ not in RANGES:
+        return jsonify({'message': f'tickers must list 1 to {portfolio.MAX_HOLDINGS} symbols; '
+                                   f"range one of {', '.join(RANGES)}"}), 400
+    if (len(weights) != len(tickers) or not all(map(math.isfinite, weights))
+            or min(weights) < 0 or sum(weights) <= 0):
+        return jsonify({'message': 'weights must be non-negative numbers, one per ticker'}), 400
+    default = '^NSEI' if all(t.endswith(('.NS', '.BO')) for t in tickers) else '^GSPC'
+    benchmark = request.args.get('benchmark', default).strip().upper() or None
+    columns = tickers + ([benchmark] if benchmark and benchmark not in tickers else [])
+    try:
+        with tracing.span('portfolio.matrix', tickers=len(columns), range=range_) as sp:
+            matrix, outcome = get_portfolio_matrices().get(columns, range_,
+                                                           lambda t: _portfolio_column(t, range_))
+            sp.set(outcome=outcome, rows=len(matrix.dates))
+        with tracing.span('portfolio.risk'):
+            stats = portfolio.risk(matrix, tickers, weights, benchmark)
+    except resilience.UpstreamUnavailable as e:
+        return _unavailable(e, 'Market data for this portfolio is temporarily unavailable.')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 422
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 502
+    except Exception as e:
+        log.exception('portfolio risk failed', extra={'tickers': ','.join(tickers)})
+        return jsonify({'message': f'Portfolio analysis failed: {str(e)}'}), 500
+    return jsonify({'tickers': tickers, 'range': range_, 'benchmark': benchmark, **stats}), 200
+
+
+# ── Screener ──────────────────────────────────────────────────────────────────
+def _screener_history(ticker: str) -> 'Bars':
+    """
+    Cached 2y daily bars when present, else a fetch that is not cached: a
+    market-wide refresh would otherwise flush the response cache.
+    """
+    cached = cache.get(f'bars:{ticker}:2y:1d')
+    return cached if cached is not None else _fetch_history(ticker, '2y')
+
+
+# screener.py needs NumPy, so it is imported with the schedule's first use.
+_screener_schedule = None
+
+
+def get_screener_schedule():
+    """Return the screener's RefreshSchedule, creating it on first use."""
+    global _screener_schedule
+    if _screener_schedule is None:
+        with _client_lock:
+            if _screener_schedule is None:
+                import screener
+                _screener_schedule = screener.RefreshSchedule(
+                    lambda owner: jobs.manager.submit('screener', screener.refresh, _screener_history,
+                                                      screener.load_symbols(), owner=owner,
+                                                      holds_lease=True))
+    return _screener_schedule
+
+
+# An admin starts the schedule (POST /api/analytics/screener/refresh). Once a
+# table is in a shared cache, workers started later keep it fresh too; the
+# refresh lease lets only one of them build at a time.
+if cache.get('screener:built_at') is not None:
+    get_screener_schedule().ensure_started()
+
+
+@app.route('/api/analytics/screener')
+def screen_market():
+    """
+    Filter and sort the latest statistics of every ticker in
+    combined_tickers.json. Query parameters: where (repeatable or
+    comma-separated, e.g. rsi<30,price>sma200), market (NSE or US), sort
+    (column, '-' prefix for descending) and limit (default 50, max 500).
+    """
+    if 'user_id' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+    import screener
+    table = screener.current()
+    if table is None:
+        return jsonify({'message': 'The screener has not been built yet; try again later.'}), \
+            503, {'Retry-After': '60'}
+    where = [w for arg in request.args.getlist('where') for w in arg.split(',') if w.strip()]
+    try:
+        limit = min(int(request.args.get('limit', 50)), screener.MAX_LIMIT)
+        with tracing.span('screener.query', filters=len(where)) as sp:
+            rows, total = table.query(where, market=request.args.get('market'),
+                                      sort=request.args.get('sort'), limit=limit)
+            sp.set(matched=total)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'built_at': round(table.built_at, 3),
+        'universe': len(table),
+        'matched':  total,
+        'results':  [table.row(i) for i in rows],
+    }), 200
+
+
+@app.route('/api/analytics/screener/refresh', methods=['POST'])
+def refresh_screener():
+    """
+    Start a screener rebuild now and the periodic schedule (admin only);
+    poll the job via /api/jobs/<id>.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'message': 'Forbidden'}), 403
+    try:
+        job = get_screener_schedule().trigger(owner=session.get('user_id'))
+    except jobs.JobQueueFull:
+        return jsonify({'message': 'Too many background jobs; try again later.'}), 503
+    get_screener_schedule().ensure_started()
+    if job is None:
+        return jsonify({'message': 'A screener refresh is already running in another worker.'}), 409
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+@metrics.register_collector
+def _cache_metrics():
+    m = cache.metrics()
+    label = f'{{backend="{m["backend"]}"}}'
+    return [
+        '# TYPE kodbank_cache_hits_total counter',
+        f'kodbank_cache_hits_total{label} {m["hits"]}',
+        '# TYPE kodbank_cache_misses_total counter',
+        f'kodbank_cache_misses_total{label} {m["misses"]}',
+        '# TYPE kodbank_cache_errors_total counter',
+        f'kodbank_cache_errors_total{label} {m["errors"]}',
+        '# TYPE kodbank_cache_get_seconds_total counter',
+        f'kodbank_cache_get_seconds_total{label} {m["get_seconds"]}',
+        '# TYPE kodbank_cache_set_seconds_total counter',
+        f'kodbank_cache_set_seconds_total{label} {m["set_seconds"]}',
+    ]
+
+
+# ── Memory accounting & budgets ───────────────────────────────────────────────
+memory.register('rag_index', rag_module.index_size_bytes,
+                evict=rag_module.trim_to_guide, budget_env='MEM_BUDGET_RAG_BYTES')
+memory.register('response_cache', lambda: getattr(cache, 'size_bytes', 0),
+                evict=getattr(cache, 'evict_to', None), budget_env='MEM_BUDGET_CACHE_BYTES')
+memory.register('trace_buffer', tracing.buffer_size_bytes,
+                evict=tracing.trim_buffer, budget_env='MEM_BUDGET_TRACE_BYTES')
+memory.register('portfolio_matrices',
+                lambda: _portfolio_matrices.size_bytes() if _portfolio_matrices else 0,
+                evict=lambda budget: get_portfolio_matrices().evict_to(budget),
+                budget_env='MEM_BUDGET_PORTFOLIO_BYTES')
+
+
+@metrics.register_collector
+def _memory_metrics():
+    r = memory.report()
+    lines = ['# TYPE kodbank_memory_bytes gauge']
+    lines += [f'kodbank_memory_bytes{{subsystem="{name}"}} {s["bytes"]}'
+              for name, s in r['subsystems'].items()]
+    if r['rss_bytes'] is not None:
+        lines += ['# TYPE kodbank_process_resident_bytes gauge',
+                  f'kodbank_process_resident_bytes {r["rss_bytes"]}']
+    return lines
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition. Set METRICS_TOKEN to require a bearer token."""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'message': 'Unauthorized'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
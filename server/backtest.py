@@ -0,0 +1,165 @@
+"""
+backtest.py — Vectorized backtests of the analytics signal rules.
+
+calculate_summary_statistics() describes only the latest bar. This module
+evaluates the same rules over a whole history, for many tickers at once:
+
+  golden_cross  long while SMA50 > SMA200 (Golden Cross in, Death Cross out)
+  macd          long while the MACD line is above its signal line
+  rsi           enter when RSI(14) < 30 (oversold), exit when RSI > 70
+  bollinger     enter at/below the lower band, exit at/above the upper band
+
+Everything works on (tickers × bars) float64 matrices: the array indicators
+from indicators.py (cumulative-sum moving averages, EMAs and Wilder averages
+as one IIR filter per matrix), stateful enter/exit rules by forward-filling
+signals, and trade statistics with bincount over trade ids — no Python
+loop per bar or per ticker.
+
+    results = backtest.run_many({'TCS.NS': closes, ...})   # {symbol: {rule: metrics}}
+
+A position decided at bar t's close earns bar t+1's return, so there is no
+look-ahead. Costs (COST_BPS per position change) are charged on the bar the
+new position takes effect.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from indicators import BB_WINDOW, SIGNAL_SPAN, ema, rolling_std, rsi, sma
+
+RULES = ('golden_cross', 'macd', 'rsi', 'bollinger')
+COST_BPS = float(os.environ.get('BACKTEST_COST_BPS', '5'))
+TRADING_DAYS = 252
+CHUNK_ROWS = 256              # tickers per process-pool task
+
+
+def _hold(enter: np.ndarray, exit_: np.ndarray) -> np.ndarray:
+    """1 from an entry signal until the next exit signal (exits win ties), else 0."""
+    state = np.where(exit_, 0.0, np.where(enter, 1.0, np.nan))
+    cols = np.where(np.isnan(state), 0, np.arange(state.shape[1]))
+    np.maximum.accumulate(cols, axis=1, out=cols)
+    filled = state[np.arange(state.shape[0])[:, None], cols]
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def positions(close: np.ndarray, rule: str) -> np.ndarray:
+    """Target position (0 or 1) at each bar's close under `rule`."""
+    with np.errstate(invalid='ignore'):
+        if rule == 'golden_cross':
+            return (sma(close, 50) > sma(close, 200)).astype(float)
+        if rule == 'macd':
+            macd = ema(close, 2 / 13) - ema(close, 2 / 27)
+            return (macd > ema(macd, 2 / (SIGNAL_SPAN + 1))).astype(float)
+        if rule == 'rsi':
+            r = rsi(close)
+            return _hold(r < 30, r > 70)
+        if rule == 'bollinger':
+            mid, std = sma(close, BB_WINDOW), rolling_std(close, BB_WINDOW)
+            return _hold(close <= mid - 2 * std, close >= mid + 2 * std)
+    raise ValueError(f"unknown rule '{rule}' (expected one of {', '.join(RULES)})")
+
+
+# ── Performance ───────────────────────────────────────────────────────────────
+
+def evaluate(close: np.ndarray, pos: np.ndarray, cost_bps: float = COST_BPS) -> dict[str, np.ndarray]:
+    """Per-row metrics for target positions `pos` on prices `close` (same shape)."""
+    m, n = close.shape
+    ret = np.zeros((m, n))
+    ret[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+    held = np.zeros((m, n))
+    held[:, 1:] = pos[:, :-1]                       # yesterday's decision, today's return
+    turnover = np.abs(np.diff(held, axis=1, prepend=0.0))
+    strat = held * ret - turnover * cost_bps / 1e4
+
+    equity = np.cumprod(1 + strat, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+    std = strat[:, 1:].std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, strat[:, 1:].mean(axis=1) / std * np.sqrt(TRADING_DAYS), 0.0)
+
+    # Trades: runs of held bars; an open position at the end counts as a trade
+    is_held = held > 0
+    starts = is_held & ~np.concatenate([np.zeros((m, 1), bool), is_held[:, :-1]], axis=1)
+    trade_id = np.cumsum(starts.ravel()) - 1
+    flat_held = is_held.ravel()
+    trade_log = np.bincount(trade_id[flat_held], weights=np.log1p(strat.ravel()[flat_held]),
+                            minlength=int(starts.sum()))
+    trade_row = np.nonzero(starts)[0]
+    trades = np.bincount(trade_row, minlength=m)
+    wins = np.bincount(trade_row, weights=trade_log > 0, minlength=m)
+
+    years = max(n - 1, 1) / TRADING_DAYS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'total_return':    equity[:, -1] - 1,
+            'annual_return':   equity[:, -1] ** (1 / years) - 1,
+            'buy_hold_return': close[:, -1] / close[:, 0] - 1,
+            'max_drawdown':    (equity / peak - 1).min(axis=1),
+            'sharpe':          sharpe,
+            'trades':          trades,
+            'hit_rate':        np.where(trades > 0, wins / trades, np.nan),
+            'exposure':        held[:, 1:].mean(axis=1) if n > 1 else np.zeros(m),
+        }
+
+
+def backtest_matrix(close: np.ndarray, rules=RULES, cost_bps: float = COST_BPS) -> dict[str, dict]:
+    """{rule: {metric: array over rows}} for a (tickers × bars) close matrix."""
+    close = np.asarray(close, dtype=np.float64)
+    return {rule: evaluate(close, positions(close, rule), cost_bps) for rule in rules}
+
+
+def _to_rows(symbols: list[str], results: dict[str, dict]) -> dict[str, dict]:
+    out = {s: {} for s in symbols}
+    for rule, metrics in results.items():
+        for i, s in enumerate(symbols):
+            row = {}
+            for name, values in metrics.items():
+                v = float(values[i])
+                row[name] = int(v) if name == 'trades' else (None if np.isnan(v) else round(v, 6))
+            out[s][rule] = row
+    return out
+
+
+def _run_chunk(symbols: list[str], close: np.ndarray, rules, cost_bps: float) -> dict[str, dict]:
+    return _to_rows(symbols, backtest_matrix(close, rules, cost_bps))
+
+
+def run_many(series: dict[str, np.ndarray], rules=RULES, cost_bps: float = COST_BPS,
+             processes: int = 0) -> dict[str, dict]:
+    """
+    Backtest many tickers: {symbol: closes} -> {symbol: {rule: metrics}}.
+    Tickers with the same number of bars are stacked into one matrix; chunks
+    of CHUNK_ROWS run in a process pool when processes > 0.
+    """
+    for rule in rules:
+        if rule not in RULES:
+            raise ValueError(f"unknown rule '{rule}' (expected one of {', '.join(RULES)})")
+    by_length: dict[int, list[str]] = {}
+    for symbol, closes in series.items():
+        if len(closes) >= 2:
+            by_length.setdefault(len(closes), []).append(symbol)
+
+    tasks = []
+    for symbols in by_length.values():
+        for i in range(0, len(symbols), CHUNK_ROWS):
+            chunk = symbols[i:i + CHUNK_ROWS]
+            tasks.append((chunk, np.vstack([np.asarray(series[s], dtype=np.float64) for s in chunk])))
+
+    results: dict[str, dict] = {}
+    if processes and len(tasks) > 1:
+        ctx = multiprocessing.get_context('spawn')   # see screener.refresh
+        with ProcessPoolExecutor(processes, mp_context=ctx) as pool:
+            for part in pool.map(_run_chunk, *zip(*tasks), [rules] * len(tasks), [cost_bps] * len(tasks)):
+                results.update(part)
+    else:
+        for chunk, close in tasks:
+            results.update(_run_chunk(chunk, close, rules, cost_bps))
+    return results
+
+
+def run(closes, rules=RULES, cost_bps: float = COST_BPS) -> dict[str, dict]:
+    """Backtest a single close series: {rule: metrics}."""
+    return run_many({'_': closes}, rules, cost_bps).get('_', {})
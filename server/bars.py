@@ -0,0 +1,121 @@
+"""
+bars.py — Daily OHLCV bars as typed, contiguous NumPy columns.
+
+scraper.fetch_stock_history() decodes the Yahoo chart JSON straight into a
+Bars object, and the analytics code (slicing, resampling, indicators,
+backtests, portfolio matrices) works on its arrays. Row dicts in the shape
+the API has always returned are built only at the JSON boundary:
+
+    bars = fetch_stock_history('TCS.NS')
+    bars.close[-20:].mean()        # float64 array
+    jsonify(bars.to_rows())        # [{'Date': '2024-01-02', 'Open': …}, …]
+
+Missing prices are NaN (to_rows() turns them back into None). Volume is
+int64 with a has_volume mask, so a missing volume is not mistaken for 0.
+Bars pickle as a handful of arrays, which keeps cached histories small.
+"""
+
+import numpy as np
+
+_PRICES = ('open', 'high', 'low', 'close', 'adj_close')
+_ROW_KEYS = ('Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume')
+
+
+def _floats(values) -> np.ndarray:
+    """float64 array; None (JSON null) becomes NaN."""
+    return np.array(values, dtype=np.float64)
+
+
+class Bars:
+    """Parallel arrays of daily bars, oldest → newest; Close is never NaN."""
+
+    __slots__ = ('date', 'open', 'high', 'low', 'close', 'adj_close', 'volume', 'has_volume')
+
+    def __init__(self, date: np.ndarray, open: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 close: np.ndarray, adj_close: np.ndarray, volume: np.ndarray,
+                 has_volume: np.ndarray | None = None):
+        self.date = date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.adj_close = adj_close
+        self.volume = volume
+        self.has_volume = np.ones(len(volume), dtype=bool) if has_volume is None else has_volume
+
+    @classmethod
+    def from_columns(cls, date, open, high, low, close, adj_close, volume) -> 'Bars':
+        """
+        Bars from raw columns as decoded from JSON (lists with None for
+        missing values). Rows without a Close are dropped; a missing
+        Adj Close falls back to the Close.
+        """
+        close = _floats(close)
+        keep = ~np.isnan(close)
+        adj = _floats(adj_close) if adj_close is not None and len(adj_close) == len(close) else close
+        adj = np.where(np.isnan(adj), close, adj)
+        vol = _floats(volume) if len(volume) == len(close) else np.full(len(close), np.nan)
+        has_volume = ~np.isnan(vol)
+        return cls(
+            np.asarray(date, dtype='datetime64[D]')[keep],
+            _floats(open)[keep], _floats(high)[keep], _floats(low)[keep],
+            close[keep], adj[keep],
+            np.where(has_volume, vol, 0).astype(np.int64)[keep], has_volume[keep],
+        )
+
+    @classmethod
+    def from_rows(cls, rows: list[dict]) -> 'Bars':
+        """Bars from row dicts (the to_rows() / API shape)."""
+        return cls.from_columns(
+            [r['Date'] for r in rows],
+            [r.get('Open') for r in rows], [r.get('High') for r in rows], [r.get('Low') for r in rows],
+            [r.get('Close') for r in rows], [r.get('Adj Close') for r in rows],
+            [r.get('Volume') for r in rows],
+        )
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    def __getitem__(self, index: slice | np.ndarray) -> 'Bars':
+        return Bars(*(getattr(self, name)[index] for name in self.__slots__))
+
+    def aggregate(self, starts: np.ndarray) -> 'Bars':
+        """
+        One OHLCV bar per group of consecutive bars starting at `starts`
+        (ascending, starts[0] == 0): first Open, max High, min Low, last
+        Close / Adj Close, summed Volume (missing only if it is missing on
+        every bar of the group), dated by the group's first bar.
+        """
+        ends = np.append(starts[1:], len(self)) - 1
+        return Bars(
+            self.date[starts],
+            self.open[starts],
+            np.fmax.reduceat(self.high, starts),
+            np.fmin.reduceat(self.low, starts),
+            self.close[ends],
+            self.adj_close[ends],
+            np.add.reduceat(self.volume, starts),
+            np.logical_or.reduceat(self.has_volume, starts),
+        )
+
+    # ── JSON boundary ─────────────────────────────────────────────────────────
+
+    def to_rows(self) -> list[dict]:
+        """Row dicts with ISO dates; NaN prices and missing volumes become None."""
+        columns = [np.datetime_as_string(self.date, unit='D').tolist()]
+        for name in _PRICES:
+            values = getattr(self, name)
+            column = values.tolist()
+            if np.isnan(values).any():
+                column = [None if v != v else v for v in column]
+            columns.append(column)
+        volume = self.volume.tolist()
+        if not self.has_volume.all():
+            volume = [v if ok else None for v, ok in zip(volume, self.has_volume.tolist())]
+        columns.append(volume)
+        return [dict(zip(_ROW_KEYS, row)) for row in zip(*columns)]
+
+    def row(self, i: int) -> dict:
+        """A single bar as a row dict (negative indexes count from the end)."""
+        i = range(len(self))[i]
+        return self[i:i + 1].to_rows()[0]
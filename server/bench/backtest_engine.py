@@ -0,0 +1,112 @@
+"""
+bench/backtest_engine.py — Throughput benchmark for the vectorized backtest engine.
+
+Backtests every rule in backtest.RULES over synthetic daily random walks
+(default 1,000 tickers × 10 years of 252 bars) and reports wall time and
+bars per second. The target is the whole default universe in under
+--target-seconds (default 10s) on one core; exit status 1 when missed.
+
+Usage:
+    cd server
+    python bench/backtest_engine.py                             # print report
+    python bench/backtest_engine.py --tickers 5000 --years 20
+    python bench/backtest_engine.py --processes 4               # process pool
+    python bench/backtest_engine.py --save-baseline             # store bench/backtest_engine_baseline.json
+    python bench/backtest_engine.py --compare                   # exit 1 on >25% regression
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'backtest_engine_baseline.json')
+sys.path.insert(0, SERVER_DIR)
+
+import backtest   # noqa: E402
+
+
+def synthetic_universe(tickers: int, bars: int, seed: int = 0) -> dict[str, np.ndarray]:
+    """Geometric random walks with per-ticker drift and volatility."""
+    rng = np.random.default_rng(seed)
+    drift = rng.normal(0.0003, 0.0004, (tickers, 1))
+    vol = rng.uniform(0.008, 0.035, (tickers, 1))
+    closes = rng.uniform(20, 3000, (tickers, 1)) * np.exp(np.cumsum(
+        rng.normal(0, 1, (tickers, bars)) * vol + drift, axis=1))
+    return {f'SYN{i:05d}': closes[i] for i in range(tickers)}
+
+
+def measure(universe: dict[str, np.ndarray], runs: int, processes: int) -> dict:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        results = backtest.run_many(universe, processes=processes)
+        times.append(time.perf_counter() - t0)
+    bars = sum(len(c) for c in universe.values())
+    best = min(times)
+    trades = sum(r[rule]['trades'] for r in results.values() for rule in backtest.RULES)
+    return {
+        'seconds_median':    round(statistics.median(times), 3),
+        'seconds_best':      round(best, 3),
+        'bars_per_second':   int(bars * len(backtest.RULES) / best),
+        'tickers_backtested': len(results),
+        'trades':            trades,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=1000)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=0, help='process pool size (0 = in-process)')
+    parser.add_argument('--target-seconds', type=float, default=10.0)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown vs baseline (default 0.25)')
+    args = parser.parse_args()
+
+    bars = int(args.years * backtest.TRADING_DAYS)
+    universe = synthetic_universe(args.tickers, bars)
+    report = {
+        'config': {'tickers': args.tickers, 'bars': bars, 'rules': list(backtest.RULES),
+                   'processes': args.processes},
+        'result': measure(universe, args.runs, args.processes),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    failed = False
+    if args.compare:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        base = baseline['result']['seconds_median']
+        now = report['result']['seconds_median']
+        if baseline['config'] != report['config']:
+            print('WARNING: baseline was recorded with a different configuration')
+        if now > base * (1 + args.tolerance):
+            print(f"REGRESSION: {now}s > {base * (1 + args.tolerance):.3f}s (baseline {base}s)")
+            failed = True
+        else:
+            print(f"OK: {now}s (baseline {base}s)")
+
+    seconds = report['result']['seconds_median']
+    if seconds > args.target_seconds:
+        print(f"TARGET MISSED: {seconds}s > {args.target_seconds}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""
+bench/bench_app.py — WSGI entry point that serves app.py against stand-ins.
+
+For running the real server process (gunicorn) offline, e.g. under
+bench/loadgen.py --spawn. BENCH_DB_PATH names the SQLite file used instead
+of MySQL (bench/sqlite_db.py); NEWS_API_URL, YAHOO_CHART_URL and
+GITHUB_MODELS_ENDPOINT point the upstreams at bench/standins.py's
+UpstreamStandIn.
+
+    gunicorn --chdir bench bench_app:app
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as kodbank                    # noqa: E402
+from sqlite_db import SQLiteDatabase     # noqa: E402
+
+kodbank.get_db_connection = SQLiteDatabase(os.environ['BENCH_DB_PATH']).connect
+app = kodbank.app
@@ -0,0 +1,238 @@
+"""
+bench/endpoints.py — Offline per-endpoint benchmark for the KodBank Flask app.
+
+Runs app.py in-process (Flask test client, one client per worker thread)
+with every upstream replaced by a local stand-in, so results are
+reproducible without network access or credentials:
+  • MySQL            → bench/sqlite_db.py (same tables as schema.sql)
+  • Yahoo / NewsAPI  → UpstreamStandIn fixture server (bench/standins.py)
+  • GitHub Models    → UpstreamStandIn streaming chat completions at
+                       --token-rate tokens/s
+
+Each scenario reports requests, errors, throughput and p50/p99/mean latency
+(full body read, so streams are timed to the last token); chat scenarios also
+report time-to-first-token.
+
+Usage:
+    cd server
+    python bench/endpoints.py                          # print report
+    python bench/endpoints.py --only chat,balance      # subset of scenarios
+    python bench/endpoints.py --save-baseline          # store bench/endpoints_baseline.json
+    python bench/endpoints.py --compare                # exit 1 on p50/p99 regression
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'endpoints_baseline.json')
+sys.path[:0] = [SERVER_DIR, BENCH_DIR]
+
+from sqlite_db import SQLiteDatabase        # noqa: E402
+from standins import UNTHROTTLED_ENV, UpstreamStandIn   # noqa: E402
+from startup import _DUMMY_ENV              # noqa: E402
+
+USER, PASSWORD = 'bench', 'bench-password'
+_unique = itertools.count()
+
+
+# ── Scenarios: name -> fn(client) returning the response to time ─────────────
+# Each returns (response, streamed); streamed responses are read chunk by chunk.
+
+def _login(c):
+    return c.post('/api/auth/login', json={'uname': USER, 'password': PASSWORD}), False
+
+
+def _chat(c):
+    return c.post('/api/chat', json={'message': f'How do I deposit money? #{next(_unique)}'},
+                  buffered=False), True
+
+
+def _chat_cached(c):
+    return c.post('/api/chat', json={'message': 'How do I deposit money?'}, buffered=False), True
+
+
+SCENARIOS = {
+    'login':            _login,
+    'balance':          lambda c: (c.get('/api/user/balance'), False),
+    'deposit':          lambda c: (c.post('/api/user/deposit', json={'amount': 10}), False),
+    'transactions':     lambda c: (c.get('/api/user/transactions'), False),
+    'news_cached':      lambda c: (c.get('/api/news'), False),
+    'news_uncached':    lambda c: (c.get(f'/api/news?category=topic{next(_unique)}'), False),
+    'analytics_cached': lambda c: (c.get('/api/analytics/stock/TCS.NS'), False),
+    'analytics_uncached': lambda c: (c.get(f'/api/analytics/stock/B{next(_unique)}.NS'), False),
+    'analytics_resampled': lambda c: (c.get('/api/analytics/stock/TCS.NS?range=1y&interval=1wk'), False),
+    'analytics_downsampled': lambda c: (c.get('/api/analytics/stock/TCS.NS?range=max&points=300&chart=line'), False),
+    'tickers':          lambda c: (c.get('/api/analytics/tickers'), False),
+    'chat':             _chat,
+    'chat_cached':      _chat_cached,
+}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[idx]
+
+
+def _timed(client, scenario) -> tuple[float, float | None, bool]:
+    """(total seconds, first-chunk seconds or None, ok) for one request."""
+    t0 = time.perf_counter()
+    resp, streamed = scenario(client)
+    first = None
+    if streamed:
+        for chunk in resp.response:
+            if first is None and chunk:
+                first = time.perf_counter() - t0
+        resp.close()
+    else:
+        resp.get_data()
+    return time.perf_counter() - t0, first, resp.status_code < 400
+
+
+def run_scenario(app_module, name: str, requests: int, concurrency: int, warmup: int) -> dict:
+    scenario = SCENARIOS[name]
+    clients = []
+    for _ in range(concurrency):
+        client = app_module.app.test_client()
+        _login(client)
+        clients.append(client)
+    for _ in range(warmup):
+        _timed(clients[0], scenario)
+
+    latencies, ttfts, errors = [], [], [0]
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def worker(client):
+        while next(remaining) < requests:
+            total, first, ok = _timed(client, scenario)
+            with lock:
+                latencies.append(total)
+                if first is not None:
+                    ttfts.append(first)
+                if not ok:
+                    errors[0] += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    ttfts.sort()
+    result = {
+        'requests':       len(latencies),
+        'errors':         errors[0],
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms':         round(_percentile(latencies, 50) * 1000, 2),
+        'p99_ms':         round(_percentile(latencies, 99) * 1000, 2),
+        'mean_ms':        round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+    if ttfts:
+        result['ttft_p50_ms'] = round(_percentile(ttfts, 50) * 1000, 2)
+        result['ttft_p99_ms'] = round(_percentile(ttfts, 99) * 1000, 2)
+    return result
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Regressions: p50/p99 above baseline by more than tolerance and min_delta_ms."""
+    problems = []
+    for name, now in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p99_ms', 'ttft_p50_ms'):
+            if key in now and key in base:
+                limit = max(base[key] * (1 + tolerance), base[key] + min_delta_ms)
+                if now[key] > limit:
+                    problems.append(f'{name} {key}: {now[key]}ms > {limit:.2f}ms (baseline {base[key]}ms)')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--token-rate', type=float, default=500, help='stand-in chat tokens/s (0 = no delay)')
+    parser.add_argument('--tokens', type=int, default=40, help='tokens per chat answer')
+    parser.add_argument('--fixtures', help='directory of chart_<TICKER>.json payloads to replay')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown vs baseline (default 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='ignore slowdowns smaller than this (timer noise)')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='kodbank-bench-')
+    upstream = UpstreamStandIn(token_rate=args.token_rate, tokens=args.tokens,
+                               fixtures_dir=args.fixtures).start()
+    for key, value in {**_DUMMY_ENV, **UNTHROTTLED_ENV}.items():
+        os.environ.setdefault(key, value)
+    os.environ.update({
+        'YAHOO_CHART_URL':        upstream.yahoo_url,
+        'NEWS_API_URL':           upstream.news_url,
+        'GITHUB_MODELS_ENDPOINT': upstream.models_url,
+        'CACHE_BACKEND':          'memory',
+        'LOG_LEVEL':              os.environ.get('LOG_LEVEL', 'ERROR'),
+    })
+    import app as app_module
+    db = SQLiteDatabase(os.path.join(workdir, 'kodbank.sqlite3'))
+    db.add_user(USER, PASSWORD)
+    app_module.get_db_connection = db.connect
+
+    report = {
+        'config': {'requests': args.requests, 'concurrency': args.concurrency,
+                   'token_rate': args.token_rate, 'tokens': args.tokens},
+        'scenarios': {},
+    }
+    try:
+        for name in names:
+            report['scenarios'][name] = run_scenario(app_module, name, args.requests,
+                                                     args.concurrency, args.warmup)
+            print(f"{name:<20} {json.dumps(report['scenarios'][name])}", file=sys.stderr)
+    finally:
+        upstream.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report['upstream_requests'] = upstream.requests
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        for line in problems:
+            print('REGRESSION:', line)
+        if problems:
+            sys.exit(1)
+        print(f"OK: {len(report['scenarios'])} scenarios within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""
+bench/loadgen.py — Traffic-mix load generator with an SLO report.
+
+Virtual users behave like dashboard.html: each logs in once (keeping the
+session cookie in its own requests.Session) and then loops over a weighted
+mix of balance, transactions, deposit/withdraw, news, tickers, stock
+analytics and streaming chat calls, with a short think time in between.
+Concurrency ramps through --stages, holding each level for --stage-seconds;
+SSE routes (chat) also record time-to-first-token.
+
+The report (JSON, also written to --out) has, per stage, throughput, error
+rate and p50/p95/p99 per route, plus the saturation point: the last stage
+that met the SLOs while throughput was still growing, and why the next one
+did not.
+
+Usage:
+    cd server
+    python bench/loadgen.py --spawn                        # gunicorn + stand-ins, all offline
+    python bench/loadgen.py --url http://127.0.0.1:5000 --user alice --password secret
+    python bench/loadgen.py --spawn --stages 1,4,16,32 --mix chat=5,balance=20 --out run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+DEFAULT_MIX = ('balance=25,transactions=15,analytics=15,news=10,chat=10,'
+               'tickers=5,deposit=5,withdraw=5,login=2')
+TICKERS = ['RELIANCE.NS', 'TCS.NS', 'INFY.NS', 'HDFCBANK.NS', 'ICICIBANK.NS', 'SBIN.NS',
+           'ITC.NS', 'LT.NS', 'AXISBANK.NS', 'WIPRO.NS', 'AAPL', 'MSFT', 'NVDA', 'TSLA']
+NEWS_CATEGORIES = ['latest', 'markets', 'banking', 'crypto', 'economy']
+
+
+def _parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for item in filter(None, spec.split(',')):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def _pct(sorted_values: list[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return round(sorted_values[idx] * 1000, 2)
+
+
+# ── Virtual user ──────────────────────────────────────────────────────────────
+
+class VirtualUser(threading.Thread):
+    def __init__(self, gen: 'LoadGenerator', seed: int):
+        super().__init__(daemon=True)
+        self.gen = gen
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+
+    def _url(self, path: str) -> str:
+        return self.gen.base_url + path
+
+    def login(self):
+        return self.http.post(self._url('/api/auth/login'), timeout=self.gen.timeout,
+                              json={'uname': self.gen.user, 'password': self.gen.password})
+
+    def chat(self):
+        """Stream a chat answer; returns (response, seconds to first data event)."""
+        t0 = time.perf_counter()
+        question = self.rng.choice(('How do I deposit money?', 'What is RSI?',
+                                    'Explain my transaction history', 'How do withdrawals work?'))
+        resp = self.http.post(self._url('/api/chat'), json={'message': f'{question} ({self.rng.random():.6f})'},
+                              stream=True, timeout=self.gen.timeout)
+        ttft = None
+        for line in resp.iter_lines():
+            if ttft is None and line.startswith(b'data:'):
+                ttft = time.perf_counter() - t0
+        resp.close()
+        return resp, ttft
+
+    def action(self, name: str):
+        timeout = self.gen.timeout
+        if name == 'login':
+            return self.login(), None
+        if name == 'balance':
+            return self.http.get(self._url('/api/user/balance'), timeout=timeout), None
+        if name == 'transactions':
+            return self.http.get(self._url('/api/user/transactions'), timeout=timeout), None
+        if name in ('deposit', 'withdraw'):
+            return self.http.post(self._url(f'/api/user/{name}'), timeout=timeout,
+                                  json={'amount': round(self.rng.uniform(1, 50), 2)}), None
+        if name == 'news':
+            return self.http.get(self._url('/api/news'), timeout=timeout,
+                                 params={'category': self.rng.choice(NEWS_CATEGORIES)}), None
+        if name == 'tickers':
+            return self.http.get(self._url('/api/analytics/tickers'), timeout=timeout), None
+        if name == 'analytics':
+            return self.http.get(self._url(f'/api/analytics/stock/{self.rng.choice(TICKERS)}'),
+                                 timeout=timeout), None
+        if name == 'chat':
+            return self.chat()
+        raise ValueError(f'unknown action {name}')
+
+    def run(self):
+        try:
+            self.login()
+        except requests.RequestException:
+            pass
+        names, weights = zip(*self.gen.mix.items())
+        while not self.gen.stopping.is_set():
+            name = self.rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                resp, ttft = self.action(name)
+                ok = resp.status_code < 500 and resp.status_code != 401
+            except requests.RequestException:
+                ttft, ok = None, False
+            self.gen.record(name, time.perf_counter() - t0, ttft, ok)
+            if self.gen.think:
+                self.gen.stopping.wait(self.rng.expovariate(1 / self.gen.think))
+
+
+# ── Generator and report ──────────────────────────────────────────────────────
+
+class LoadGenerator:
+    def __init__(self, base_url, user, password, mix, think_ms, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.user = user
+        self.password = password
+        self.mix = mix
+        self.think = think_ms / 1000
+        self.timeout = timeout
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._samples: dict[str, dict] = {}
+        self._users: list[VirtualUser] = []
+
+    def record(self, name: str, seconds: float, ttft: float | None, ok: bool):
+        with self._lock:
+            s = self._samples.setdefault(name, {'latency': [], 'ttft': [], 'errors': 0})
+            s['latency'].append(seconds)
+            if ttft is not None:
+                s['ttft'].append(ttft)
+            if not ok:
+                s['errors'] += 1
+
+    def _drain(self) -> dict[str, dict]:
+        with self._lock:
+            samples, self._samples = self._samples, {}
+        return samples
+
+    def run_stage(self, concurrency: int, seconds: float) -> dict:
+        while len(self._users) < concurrency:
+            vu = VirtualUser(self, seed=len(self._users))
+            self._users.append(vu)
+            vu.start()
+        self._drain()   # discard requests that straddle the ramp
+        t0 = time.perf_counter()
+        time.sleep(seconds)
+        samples = self._drain()
+        elapsed = time.perf_counter() - t0
+
+        routes = {}
+        total = errors = 0
+        for name, s in sorted(samples.items()):
+            lat = sorted(s['latency'])
+            total += len(lat)
+            errors += s['errors']
+            routes[name] = {
+                'requests': len(lat),
+                'errors':   s['errors'],
+                'p50_ms':   _pct(lat, 50),
+                'p95_ms':   _pct(lat, 95),
+                'p99_ms':   _pct(lat, 99),
+            }
+            if s['ttft']:
+                ttft = sorted(s['ttft'])
+                routes[name].update(ttft_p50_ms=_pct(ttft, 50), ttft_p95_ms=_pct(ttft, 95),
+                                    ttft_p99_ms=_pct(ttft, 99))
+        return {
+            'concurrency':    concurrency,
+            'seconds':        round(elapsed, 2),
+            'requests':       total,
+            'throughput_rps': round(total / elapsed, 2),
+            'error_rate':     round(errors / total, 4) if total else 0.0,
+            'routes':         routes,
+        }
+
+    def stop(self):
+        self.stopping.set()
+        for vu in self._users:
+            vu.join(timeout=self.timeout)
+
+
+def slo_violations(stage: dict, slo_p95_ms: float, slo_ttft_p95_ms: float, slo_error_rate: float) -> list[str]:
+    problems = []
+    if stage['error_rate'] > slo_error_rate:
+        problems.append(f"error rate {stage['error_rate']:.2%} > {slo_error_rate:.2%}")
+    for name, r in stage['routes'].items():
+        if 'ttft_p95_ms' in r:
+            if r['ttft_p95_ms'] > slo_ttft_p95_ms:
+                problems.append(f"{name} TTFT p95 {r['ttft_p95_ms']}ms > {slo_ttft_p95_ms}ms")
+        elif r['p95_ms'] is not None and r['p95_ms'] > slo_p95_ms:
+            problems.append(f"{name} p95 {r['p95_ms']}ms > {slo_p95_ms}ms")
+    return problems
+
+
+def saturation(stages: list[dict], min_gain: float) -> dict:
+    """Last stage that met the SLOs with throughput still scaling, and what broke next."""
+    healthy, reason = None, None
+    for prev, stage in zip([None] + stages, stages):
+        if stage['slo_violations']:
+            reason = '; '.join(stage['slo_violations'])
+            break
+        if prev is not None and stage['throughput_rps'] < prev['throughput_rps'] * (1 + min_gain):
+            reason = (f"throughput {stage['throughput_rps']} rps at concurrency {stage['concurrency']} "
+                      f"< {1 + min_gain:.2f}x {prev['throughput_rps']} rps")
+            break
+        healthy = stage
+    return {
+        'concurrency':    healthy['concurrency'] if healthy else None,
+        'throughput_rps': healthy['throughput_rps'] if healthy else None,
+        'limited_by':     reason,
+    }
+
+
+# ── Spawned server (gunicorn + stand-ins) ─────────────────────────────────────
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(args, workdir: str):
+    """Start stand-ins and gunicorn serving bench_app; returns (base_url, cleanup)."""
+    from sqlite_db import SQLiteDatabase
+    from standins import UNTHROTTLED_ENV, UpstreamStandIn
+    from startup import _DUMMY_ENV
+
+    upstream = UpstreamStandIn(token_rate=args.token_rate, tokens=args.tokens).start()
+    db_path = os.path.join(workdir, 'kodbank.sqlite3')
+    SQLiteDatabase(db_path).add_user(args.user, args.password)
+    port = _free_port()
+    env = dict(os.environ)
+    for key, value in {**_DUMMY_ENV, **UNTHROTTLED_ENV}.items():
+        env.setdefault(key, value)
+    env.update({
+        'BENCH_DB_PATH': db_path, 'NEWS_API_URL': upstream.news_url,
+        'YAHOO_CHART_URL': upstream.yahoo_url, 'GITHUB_MODELS_ENDPOINT': upstream.models_url,
+        'LOG_LEVEL': env.get('LOG_LEVEL', 'WARNING'),
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--chdir', BENCH_DIR, 'bench_app:app',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+         '--worker-class', 'gthread', '--threads', str(args.threads), '--timeout', '120'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited:\n' + server.stderr.read().decode(errors='replace'))
+        try:
+            if requests.get(base_url + '/login', timeout=2).status_code == 200:
+                break
+        except requests.RequestException:
+            time.sleep(0.2)
+    else:
+        server.kill()
+        raise RuntimeError('gunicorn did not become ready within 60s')
+
+    def cleanup():
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        upstream.stop()
+    return base_url, cleanup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='base URL of a running KodBank server')
+    target.add_argument('--spawn', action='store_true', help='start gunicorn + stand-ins locally')
+    parser.add_argument('--user', default='loadgen')
+    parser.add_argument('--password', default='loadgen-password')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'action=weight list (default {DEFAULT_MIX})')
+    parser.add_argument('--stages', default='1,2,4,8,16,32', help='concurrency levels to ramp through')
+    parser.add_argument('--stage-seconds', type=float, default=15)
+    parser.add_argument('--think-ms', type=float, default=100, help='mean think time between actions')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--slo-p95-ms', type=float, default=1000)
+    parser.add_argument('--slo-ttft-p95-ms', type=float, default=2000)
+    parser.add_argument('--slo-error-rate', type=float, default=0.01)
+    parser.add_argument('--min-gain', type=float, default=0.10,
+                        help='throughput growth per stage below which the server counts as saturated')
+    parser.add_argument('--stop-on-saturation', action='store_true')
+    parser.add_argument('--out', help='write the JSON report here as well')
+    spawn = parser.add_argument_group('--spawn options')
+    spawn.add_argument('--workers', type=int, default=1)
+    spawn.add_argument('--threads', type=int, default=16)
+    spawn.add_argument('--token-rate', type=float, default=50, help='stand-in chat tokens/s')
+    spawn.add_argument('--tokens', type=int, default=60)
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    stages = [int(s) for s in args.stages.split(',')]
+    workdir = tempfile.mkdtemp(prefix='kodbank-loadgen-')
+    cleanup = None
+    base_url = args.url
+    if args.spawn:
+        base_url, cleanup = spawn_server(args, workdir)
+
+    gen = LoadGenerator(base_url, args.user, args.password, mix, args.think_ms, args.timeout)
+    results = []
+    try:
+        for concurrency in stages:
+            stage = gen.run_stage(concurrency, args.stage_seconds)
+            stage['slo_violations'] = slo_violations(stage, args.slo_p95_ms, args.slo_ttft_p95_ms,
+                                                     args.slo_error_rate)
+            results.append(stage)
+            print(f"concurrency {concurrency:>4}: {stage['throughput_rps']:>8} rps  "
+                  f"errors {stage['error_rate']:.2%}  "
+                  f"{'; '.join(stage['slo_violations']) or 'SLOs met'}", file=sys.stderr)
+            if args.stop_on_saturation and saturation(results, args.min_gain)['limited_by']:
+                break
+    finally:
+        gen.stop()
+        if cleanup:
+            cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'target': 'spawn' if args.spawn else base_url,
+        'config': {'mix': mix, 'stages': stages, 'stage_seconds': args.stage_seconds,
+                   'think_ms': args.think_ms,
+                   'slo': {'p95_ms': args.slo_p95_ms, 'ttft_p95_ms': args.slo_ttft_p95_ms,
+                           'error_rate': args.slo_error_rate}},
+        'stages': results,
+        'saturation': saturation(results, args.min_gain),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+bench/sqlite_db.py — SQLite stand-in for KodBank's MySQL connection.
+
+Implements the slice of the mysql.connector API that app.py uses
+(connection.cursor(dictionary=True), cursor.execute with %s placeholders,
+fetchone / fetchall / rowcount, commit, is_connected, close) on top of a
+SQLite file created from the same tables as schema.sql. Each call to
+connect() opens a new connection, like get_db_connection() does.
+
+Usage:
+    db = SQLiteDatabase(path)
+    db.add_user('bench', 'bench')
+    app.get_db_connection = db.connect
+"""
+
+import datetime
+import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Users (
+    uid TEXT PRIMARY KEY,
+    uname TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    phone TEXT NOT NULL,
+    role TEXT DEFAULT 'customer',
+    balance REAL DEFAULT 100000.00,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS UserToken (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uname TEXT NOT NULL REFERENCES Users(uname) ON DELETE CASCADE,
+    token TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS Transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uname TEXT NOT NULL REFERENCES Users(uname) ON DELETE CASCADE,
+    type TEXT NOT NULL CHECK (type IN ('deposit', 'withdraw')),
+    amount REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_uname ON Transactions (uname, created_at);
+"""
+
+# MySQL returns DATETIME/TIMESTAMP columns as datetime objects
+sqlite3.register_converter('TIMESTAMP', lambda b: datetime.datetime.fromisoformat(b.decode()))
+
+
+class _Cursor:
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), tuple(params))
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self) -> list:
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class _Connection:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._open = True
+
+    def cursor(self, dictionary: bool = False) -> _Cursor:
+        return _Cursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self) -> bool:
+        return self._open
+
+    def close(self):
+        self._open = False
+        self._conn.close()
+
+
+class SQLiteDatabase:
+    """A SQLite file with the KodBank schema; connect() mimics get_db_connection()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+    def connect(self) -> _Connection:
+        return _Connection(self.path)
+
+    def add_user(self, uname: str, password: str, role: str = 'customer', balance: float = 100000.0):
+        conn = sqlite3.connect(self.path)
+        conn.execute('INSERT OR REPLACE INTO Users (uid, uname, password, email, phone, role, balance) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (f'uid-{uname}', uname, password, f'{uname}@bench.local', '0000000000', role, balance))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,427 @@
+"""
+bench/standins.py — Local stand-ins for KodBank's upstream services.
+
+Each stand-in runs in a background thread on 127.0.0.1 and a free port, so
+code can be exercised without network access or credentials.
+
+    RedisStandIn    — tiny RESP2 server (GET / SET [EX|PX] [NX] / DEL / PING / SELECT)
+                      for testing cache.RedisCache.
+    UpstreamStandIn — HTTP server answering as Yahoo Finance (chart API),
+                      NewsAPI (top-headlines / everything) and a streaming
+                      chat-completions endpoint (GitHub Models / Azure AI
+                      Inference wire format) with a configurable token rate.
+                      inject() adds faults (error status, Retry-After, delay)
+                      for resilience testing.
+
+Usage:
+    with RedisStandIn() as redis:
+        backend = cache.RedisCache(redis.url)
+
+    with UpstreamStandIn(token_rate=200) as up:
+        os.environ['YAHOO_CHART_URL'] = up.yahoo_url
+        os.environ['GITHUB_MODELS_ENDPOINT'] = up.models_url
+"""
+
+import datetime
+import http.server
+import json
+import os
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _StandIn:
+    """Start/stop plumbing shared by the TCP stand-ins."""
+
+    handler_class = None
+
+    def __init__(self):
+        self._server = _ThreadingTCPServer(('127.0.0.1', 0), self.handler_class)
+        self._server.standin = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+# ── Redis ─────────────────────────────────────────────────────────────────────
+
+class _RESPHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.strip().split()   # inline command (e.g. redis-cli PING)
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, str):
+            self.wfile.write(b'+' + value.encode() + b'\r\n')
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        store = self.server.standin
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            store.commands += 1
+            if cmd == b'PING':
+                self._reply('PONG')
+            elif cmd in (b'SELECT', b'AUTH'):
+                self._reply('OK')
+            elif cmd == b'GET':
+                self._reply(store.get(args[1]))
+            elif cmd == b'SET':
+                ttl = None
+                opts = [a.upper() for a in args[3:]]
+                if b'PX' in opts:
+                    ttl = int(args[3 + opts.index(b'PX') + 1]) / 1000
+                elif b'EX' in opts:
+                    ttl = int(args[3 + opts.index(b'EX') + 1])
+                if b'NX' in opts:
+                    self._reply('OK' if store.add(args[1], args[2], ttl) else None)
+                else:
+                    store.set(args[1], args[2], ttl)
+                    self._reply('OK')
+            elif cmd == b'DEL':
+                self._reply(sum(store.delete(k) for k in args[1:]))
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+            self.wfile.flush()
+
+
+class RedisStandIn(_StandIn):
+    """In-memory Redis-protocol server with key expiry."""
+
+    handler_class = _RESPHandler
+
+    def __init__(self):
+        super().__init__()
+        self.commands = 0
+        self._data: dict[bytes, tuple[float | None, bytes]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'redis://127.0.0.1:{self.port}/0'
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+
+    def add(self, key, value, ttl) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= time.time()):
+                return False
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            return True
+
+    def delete(self, key) -> int:
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+
+# ── HTTP upstreams (Yahoo Finance, NewsAPI, chat completions) ────────────────
+
+# Lifts resilience.py's per-upstream rate and concurrency limits, which are
+# sized for the real services, so benchmarks measure the app rather than them
+UNTHROTTLED_ENV = {
+    f'UPSTREAM_{name}_{key}': value
+    for name in ('YAHOO_FINANCE', 'NEWSAPI', 'GITHUB_MODELS')
+    for key, value in (('RATE', '10000'), ('BURST', '10000'), ('CONCURRENCY', '256'))
+}
+
+def synthetic_chart(ticker: str, bars: int = 504) -> dict:
+    """Deterministic Yahoo v8 chart payload: a seeded random walk of daily bars."""
+    rng = random.Random(ticker)
+    end = datetime.datetime(2026, 1, 2, 14, 30, tzinfo=datetime.timezone.utc)
+    timestamps, opens, highs, lows, closes, volumes = [], [], [], [], [], []
+    price = rng.uniform(50, 3000)
+    day = end - datetime.timedelta(days=bars * 7 // 5)
+    while len(timestamps) < bars:
+        day += datetime.timedelta(days=1)
+        if day.weekday() >= 5:
+            continue
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0.0004, 0.018)))
+        timestamps.append(int(day.timestamp()))
+        opens.append(round(open_, 2))
+        closes.append(round(price, 2))
+        highs.append(round(max(open_, price) * (1 + rng.random() * 0.01), 2))
+        lows.append(round(min(open_, price) * (1 - rng.random() * 0.01), 2))
+        volumes.append(rng.randint(100_000, 5_000_000))
+    quote = {'open': opens, 'high': highs, 'low': lows, 'close': closes, 'volume': volumes}
+    return {'chart': {'error': None, 'result': [{
+        'meta': {'symbol': ticker, 'currency': 'INR', 'dataGranularity': '1d'},
+        'timestamp': timestamps,
+        'indicators': {'quote': [quote], 'adjclose': [{'adjclose': closes}]},
+    }]}}
+
+
+def synthetic_articles(query: str, count: int = 30) -> dict:
+    rng = random.Random(query)
+    articles = []
+    for i in range(count):
+        words = ' '.join(rng.choice(('markets', 'rally', 'rates', 'earnings', 'bank', 'inflation',
+                                     'stocks', 'bonds', 'outlook', 'growth')) for _ in range(8))
+        articles.append({
+            'source': {'id': None, 'name': f'Stand-in Wire {i % 4}'},
+            'title': f'{query.title()} headline {i}: {words}',
+            'description': f'{words.capitalize()}. ' * 3,
+            'url': f'https://news.example/{query}/{i}',
+            'urlToImage': None if i % 5 == 0 else f'https://news.example/img/{i}.png',
+            'publishedAt': '2026-01-02T10:00:00Z',
+            'content': words,
+        })
+    return {'status': 'ok', 'totalResults': count, 'articles': articles}
+
+
+class _UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle plus
+        # delayed ACKs add ~40ms to every response on a kept-alive connection
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fault(self, path: str) -> bool:
+        """Apply an injected fault for `path`; True if it produced the response."""
+        fault = self.server.standin.take_fault(path)
+        if fault is None:
+            return False
+        if fault['delay']:
+            time.sleep(fault['delay'])
+        if fault['status'] is None:
+            return False
+        body = json.dumps({'status': 'error', 'message': f"injected {fault['status']}"}).encode()
+        self.send_response(fault['status'])
+        if fault['retry_after'] is not None:
+            self.send_header('Retry-After', str(fault['retry_after']))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def do_GET(self):
+        standin = self.server.standin
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        standin.count(url.path)
+        if self._fault(url.path):
+            return
+        if url.path.startswith('/v8/finance/chart/'):
+            ticker = url.path.rsplit('/', 1)[1]
+            self._json(standin.chart(ticker, query.get('range', ['2y'])[0]))
+        elif url.path == '/v2/top-headlines':
+            self._json(synthetic_articles(query.get('category', ['business'])[0]))
+        elif url.path == '/v2/everything':
+            self._json(synthetic_articles(query.get('q', ['markets'])[0]))
+        else:
+            self._json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        standin = self.server.standin
+        url = urlparse(self.path)
+        standin.count(url.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self._fault(url.path):
+            return
+        if not url.path.endswith('/chat/completions'):
+            self._json({'error': 'not found'}, 404)
+            return
+        request = json.loads(body or b'{}')
+        if not request.get('stream'):
+            self._json({'id': 'cmpl-standin', 'created': int(time.time()), 'model': request.get('model'),
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': standin.answer()}}]})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        base = {'id': 'cmpl-standin', 'created': int(time.time()), 'model': request.get('model')}
+        for token in standin.answer_tokens():
+            if standin.token_rate:
+                time.sleep(1 / standin.token_rate)
+            self._chunk(dict(base, choices=[{'index': 0, 'finish_reason': None,
+                                             'delta': {'role': 'assistant', 'content': token}}]))
+        self._chunk(dict(base, choices=[{'index': 0, 'finish_reason': 'stop', 'delta': {}}]))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _chunk(self, payload: dict):
+        self._write_chunk(b'data: ' + json.dumps(payload).encode() + b'\n\n')
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+class UpstreamStandIn(_StandIn):
+    """
+    Yahoo chart, NewsAPI and streaming chat-completions on one local port.
+
+    Chart payloads are replayed from `fixtures_dir/chart_<TICKER>.json` when
+    present, otherwise synthesized deterministically per ticker; tick() moves
+    a ticker's latest bar, and range=1d/5d requests return only the last bars. Chat answers
+    are `tokens` tokens streamed at `token_rate` tokens/s (0 = no delay).
+    """
+
+    handler_class = _UpstreamHandler
+
+    def __init__(self, token_rate: float = 200, tokens: int = 40, fixtures_dir: str | None = None):
+        super().__init__()
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.fixtures_dir = fixtures_dir
+        self.requests: dict[str, int] = {}
+        self._ticks: dict[str, float] = {}
+        self._faults: list[dict] = []
+        self._lock = threading.Lock()
+
+    def inject(self, path_prefix: str, status: int | None = None, delay: float = 0.0,
+               retry_after: float | None = None, times: int | None = None):
+        """
+        Make requests whose path starts with path_prefix fail with `status`
+        (optionally with Retry-After) and/or stall for `delay` seconds, for the
+        next `times` requests (None = until clear_faults()).
+        """
+        with self._lock:
+            self._faults.append({'prefix': path_prefix, 'status': status, 'delay': delay,
+                                 'retry_after': retry_after, 'remaining': times})
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults.clear()
+
+    def take_fault(self, path: str) -> dict | None:
+        with self._lock:
+            for fault in self._faults:
+                if path.startswith(fault['prefix']):
+                    if fault['remaining'] is not None:
+                        fault['remaining'] -= 1
+                        if fault['remaining'] <= 0:
+                            self._faults.remove(fault)
+                    return fault
+        return None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    @property
+    def yahoo_url(self) -> str:
+        return self.base_url + '/v8/finance/chart'
+
+    @property
+    def news_url(self) -> str:
+        return self.base_url + '/v2'
+
+    @property
+    def models_url(self) -> str:
+        return self.base_url + '/inference'
+
+    def count(self, path: str):
+        key = path.rsplit('/', 1)[0] if path.startswith('/v8/finance/chart/') else path
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def tick(self, ticker: str, close: float):
+        """Move the latest bar's close (and high/low if needed) to `close`."""
+        with self._lock:
+            self._ticks[ticker] = close
+
+    def chart(self, ticker: str, range_: str = '2y') -> dict:
+        payload = None
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f'chart_{ticker}.json')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    payload = json.load(f)
+        if payload is None:
+            payload = synthetic_chart(ticker)
+        result = payload['chart']['result'][0]
+        quote = result['indicators']['quote'][0]
+        close = self._ticks.get(ticker)
+        if close is not None:
+            quote['close'][-1] = result['indicators']['adjclose'][0]['adjclose'][-1] = close
+            quote['high'][-1] = max(quote['high'][-1], close)
+            quote['low'][-1] = min(quote['low'][-1], close)
+        tail = {'1d': 1, '5d': 5}.get(range_)
+        if tail:
+            result['timestamp'] = result['timestamp'][-tail:]
+            for series in (quote, result['indicators']['adjclose'][0]):
+                for key in series:
+                    series[key] = series[key][-tail:]
+        return payload
+
+    def answer_tokens(self) -> list[str]:
+        return [f'word{i} ' for i in range(self.tokens)]
+
+    def answer(self) -> str:
+        return ''.join(self.answer_tokens())
@@ -0,0 +1,137 @@
+"""
+bench/startup.py — Cold-start benchmark for the KodBank Flask app.
+
+Measures, in fresh interpreter processes:
+  1. `python -X importtime -c "import app"` — total import time and the
+     slowest modules (cumulative), so a heavy top-level import shows up.
+  2. Time-to-first-request — process start → import app → first GET /login
+     served through the Flask test client.
+
+Usage:
+    cd server
+    python bench/startup.py                       # print report
+    python bench/startup.py --save-baseline       # store bench/startup_baseline.json
+    python bench/startup.py --compare             # fail (exit 1) on >25% regression
+
+Required env vars that are missing get dummy values, so no .env is needed;
+nothing here touches the network or the database.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'startup_baseline.json')
+
+_DUMMY_ENV = {
+    'GITHUB_TOKEN': 'bench', 'NEWS_API_KEY': 'bench', 'FLASK_SECRET_KEY': 'bench',
+    'DB_HOST': '127.0.0.1', 'DB_USER': 'bench', 'DB_PASSWORD': 'bench',
+    'DB_NAME': 'bench', 'DB_PORT': '3306',
+}
+
+_FIRST_REQUEST_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+resp = app.app.test_client().get('/login')
+t2 = time.perf_counter()
+assert resp.status_code == 200, resp.status_code
+print(f"{(t1 - t0) * 1000:.3f} {(t2 - t0) * 1000:.3f}")
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    for key, value in _DUMMY_ENV.items():
+        env.setdefault(key, value)
+    return env
+
+
+def measure_importtime(top: int = 10) -> dict:
+    """Run -X importtime and return total µs plus the slowest top-level imports."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=SERVER_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace('import time:', '|', 1).split('|')
+        name = name[1:].rstrip()  # keep the two-spaces-per-level indentation
+        modules.append({'module': name, 'self_us': int(self_us),
+                        'cumulative_us': int(cumulative_us),
+                        'depth': (len(name) - len(name.lstrip())) // 2})
+    app_idx = next((i for i, m in enumerate(modules) if m['module'].strip() == 'app'), None)
+    app_entry = modules[app_idx] if app_idx is not None else None
+    # importtime prints children before their parent: walk back from `app`
+    # to the previous top-level entry and keep its direct imports (depth 1)
+    children = []
+    for m in reversed(modules[:app_idx or 0]):
+        if m['depth'] == 0:
+            break
+        if m['depth'] == 1:
+            children.append(m)
+    slowest = sorted(children, key=lambda m: m['cumulative_us'], reverse=True)[:top]
+    return {
+        'total_ms': round(app_entry['cumulative_us'] / 1000, 2) if app_entry else None,
+        'slowest': [{'module': m['module'].strip(), 'cumulative_ms': round(m['cumulative_us'] / 1000, 2)}
+                    for m in slowest],
+    }
+
+
+def measure_first_request(runs: int = 5) -> dict:
+    """Median import time and time-to-first-request over `runs` fresh processes."""
+    imports, firsts = [], []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-c', _FIRST_REQUEST_SNIPPET],
+            cwd=SERVER_DIR, env=_env(), capture_output=True, text=True, check=True,
+        )
+        import_ms, first_ms = proc.stdout.strip().splitlines()[-1].split()
+        imports.append(float(import_ms))
+        firsts.append(float(first_ms))
+    return {
+        'import_ms_median':        round(statistics.median(imports), 2),
+        'first_request_ms_median': round(statistics.median(firsts), 2),
+        'runs': runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown vs baseline (default 0.25)')
+    args = parser.parse_args()
+
+    report = {'importtime': measure_importtime(), 'first_request': measure_first_request(args.runs)}
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        base_ms = baseline['first_request']['first_request_ms_median']
+        now_ms = report['first_request']['first_request_ms_median']
+        limit = base_ms * (1 + args.tolerance)
+        if now_ms > limit:
+            print(f"REGRESSION: time-to-first-request {now_ms}ms > {limit:.1f}ms (baseline {base_ms}ms)")
+            sys.exit(1)
+        print(f"OK: time-to-first-request {now_ms}ms (baseline {base_ms}ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+build_rag_index.py — Prebuild the RAG guide index artifact.
+
+Fits the TF-IDF vectorizer on the chunked user guide once and writes
+rag_index/guide_index.{npz,json} (see rag.save_artifact). Workers then load
+it in milliseconds instead of refitting; rag.py falls back to fitting only
+if the artifact is missing or the guide's content hash changed.
+
+rag_index/ is gitignored, so the artifact only exists where this script
+runs: the Procfile runs it before gunicorn starts. vercel.json deploys no
+Python build step, so a Vercel deployment fits the index on its first
+get_context() call (the runtime fallback).
+
+Usage:
+    cd server && python build_rag_index.py
+"""
+
+import time
+
+import rag
+
+
+def main():
+    t0 = time.perf_counter()
+    guide_text = rag._load_guide_text()
+    content_hash = rag.guide_hash(guide_text)
+    rag.retriever.fit(rag._chunk_guide(guide_text))
+    rag.save_artifact(rag.retriever, content_hash)
+    print(f"[RAG] Artifact v{rag.ARTIFACT_VERSION} written to {rag._ARTIFACT_BASE}.npz/.json "
+          f"({content_hash[:12]}) in {(time.perf_counter() - t0) * 1000:.1f}ms.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""
+cache.py — Pluggable cache backends for KodBank.
+
+All backends share one interface (get / set / add / delete / get_or_set) and store
+values serialized with pickle protocol 5, so the same code can run against:
+
+  memory  — in-process LRU (per worker; default)
+  sqlite  — one SQLite file in WAL mode shared by every worker on the host
+  redis   — any Redis-protocol server (minimal RESP client, no extra deps)
+
+Pick one with CACHE_BACKEND; see get_cache(). Every backend counts hits,
+misses, errors and time spent, exposed through metrics(). A failing cache
+is treated as a miss — it must never fail the request it sits in front of.
+
+Values are unpickled on read, so only point the shared backends at stores
+this deployment controls.
+"""
+
+import itertools
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import logs
+
+log = logs.get_logger('cache')
+
+
+def _dumps(value) -> bytes:
+    return pickle.dumps(value, protocol=5)
+
+
+def _loads(data: bytes):
+    return pickle.loads(data)
+
+
+class CacheBackend:
+    """Base class: subclasses implement _get_raw / _set_raw / _delete."""
+
+    name = 'base'
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0,
+                       'get_seconds': 0.0, 'set_seconds': 0.0}
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    # ── Backend hooks ─────────────────────────────────────────────────────────
+    def _get_raw(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def _set_raw(self, key: str, data: bytes, ttl: float | None):
+        raise NotImplementedError
+
+    def _add_raw(self, key: str, data: bytes, ttl: float | None) -> bool:
+        raise NotImplementedError
+
+    def _delete(self, key: str):
+        raise NotImplementedError
+
+    # ── Public interface ──────────────────────────────────────────────────────
+    def get(self, key: str, default=None):
+        t0 = time.perf_counter()
+        try:
+            data = self._get_raw(key)
+            if data is None:
+                self._count(misses=1, get_seconds=time.perf_counter() - t0)
+                return default
+            value = _loads(data)
+        except Exception as e:
+            # Unreachable backend or an entry that no longer unpickles
+            # (e.g. written by another code version): either way, a miss
+            log.warning('cache get failed', extra={'backend': self.name, 'error': str(e)})
+            self._count(errors=1, misses=1, get_seconds=time.perf_counter() - t0)
+            return default
+        self._count(hits=1, get_seconds=time.perf_counter() - t0)
+        return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        t0 = time.perf_counter()
+        try:
+            self._set_raw(key, _dumps(value), ttl)
+            self._count(sets=1, set_seconds=time.perf_counter() - t0)
+        except Exception as e:
+            log.warning('cache set failed', extra={'backend': self.name, 'error': str(e)})
+            self._count(errors=1, set_seconds=time.perf_counter() - t0)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        """
+        Set `key` only if it is absent (or expired), atomically for every
+        process sharing the backend; True if this call stored it. Works as
+        a lease: a failing backend grants nothing.
+        """
+        try:
+            added = self._add_raw(key, _dumps(value), ttl)
+        except Exception as e:
+            log.warning('cache add failed', extra={'backend': self.name, 'error': str(e)})
+            self._count(errors=1)
+            return False
+        if added:
+            self._count(sets=1)
+        return added
+
+    def delete(self, key: str):
+        try:
+            self._delete(key)
+        except Exception as e:
+            log.warning('cache delete failed', extra={'backend': self.name, 'error': str(e)})
+            self._count(errors=1)
+
+    def get_or_set(self, key: str, ttl: float | None, loader):
+        """Return the cached value, or call loader(), cache and return its result."""
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def get_or_stale(self, key: str, ttl: float | None, loader, stale_ttl: float,
+                     fallback: tuple = (Exception,)) -> tuple:
+        """
+        get_or_set that also keeps a copy under `stale:<key>` for stale_ttl.
+        If loader() raises one of `fallback` (e.g. an upstream outage), that
+        copy is served instead. Returns (value, is_stale).
+        """
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is not _missing:
+            return value, False
+        try:
+            value = loader()
+        except fallback:
+            stale = self.get(f'stale:{key}', _missing)
+            if stale is _missing:
+                raise
+            return stale, True
+        self.set(key, value, ttl)
+        self.set(f'stale:{key}', value, stale_ttl)
+        return value, False
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+        lookups = s['hits'] + s['misses']
+        return {
+            'backend':        self.name,
+            'hits':           s['hits'],
+            'misses':         s['misses'],
+            'sets':           s['sets'],
+            'errors':         s['errors'],
+            'hit_rate':       round(s['hits'] / lookups, 4) if lookups else 0.0,
+            'avg_get_ms':     round(s['get_seconds'] * 1000 / lookups, 4) if lookups else 0.0,
+            'avg_set_ms':     round(s['set_seconds'] * 1000 / s['sets'], 4) if s['sets'] else 0.0,
+            'get_seconds':    round(s['get_seconds'], 6),
+            'set_seconds':    round(s['set_seconds'], 6),
+        }
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU bounded by entry count and total serialized bytes."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _pop(self, key: str):
+        _, data = self._data.pop(key)
+        self._bytes -= len(data)
+
+    def _get_raw(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires is not None and expires < time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return data
+
+    def _set_raw(self, key, data, ttl):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.time() + ttl if ttl else None, data)
+            self._bytes += len(data)
+            self.evict_to(self.max_bytes)
+
+    def _add_raw(self, key, data, ttl):
+        with self._lock:
+            if self._get_raw(key) is not None:
+                return False
+            self._set_raw(key, data, ttl)
+            return True
+
+    def evict_to(self, max_bytes: int) -> int:
+        """Drop least-recently-used entries until under the limits; returns count."""
+        evicted = 0
+        with self._lock:
+            while self._data and (self._bytes > max_bytes or len(self._data) > self.max_entries):
+                self._pop(next(iter(self._data)))
+                evicted += 1
+        return evicted
+
+    def _delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Host-local cache in one SQLite file (WAL mode) shared by all workers.
+    Expired rows are only dropped when read, so every `purge_every` sets
+    (per process) also deletes all expired rows to keep the file bounded.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, purge_every: int = 500):
+        super().__init__()
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._sets = itertools.count(1)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                     'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+        conn.commit()
+        self.purge_expired()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _get_raw(self, key):
+        row = self._conn().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self._delete(key)
+            return None
+        return value
+
+    def _set_raw(self, key, data, ttl):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, data, time.time() + ttl if ttl else None))
+        if next(self._sets) % self.purge_every == 0:
+            self.purge_expired()
+
+    def _add_raw(self, key, data, ttl):
+        now = time.time()
+        cur = self._conn().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires < ?',
+            (key, data, now + ttl if ttl else None, now))
+        return cur.rowcount == 1
+
+    def _delete(self, key):
+        self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def purge_expired(self) -> int:
+        """Delete every expired row; returns how many were removed."""
+        cur = self._conn().execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        if cur.rowcount:
+            log.debug('purged expired rows', extra={'backend': self.name, 'rows': cur.rowcount})
+        return cur.rowcount
+
+
+class RedisCache(CacheBackend):
+    """Minimal RESP2 client (GET / SET PX [NX] / DEL) with one connection per thread."""
+
+    name = 'redis'
+
+    def __init__(self, url: str = 'redis://127.0.0.1:6379/0', timeout: float = 0.5):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', str(self.db))
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RuntimeError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RuntimeError(f'Unexpected Redis reply: {line!r}')
+
+    def _command(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Send one command, reconnecting once if the pooled connection is stale."""
+        for attempt in (1, 2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._command(*args)
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt == 2:
+                    raise
+
+    def _get_raw(self, key):
+        return self.execute('GET', key)
+
+    def _set_raw(self, key, data, ttl):
+        if ttl:
+            self.execute('SET', key, data, 'PX', int(ttl * 1000))
+        else:
+            self.execute('SET', key, data)
+
+    def _add_raw(self, key, data, ttl):
+        args = ('PX', int(ttl * 1000)) if ttl else ()
+        return self.execute('SET', key, data, *args, 'NX') == 'OK'
+
+    def _delete(self, key):
+        self.execute('DEL', key)
+
+
+def get_cache() -> CacheBackend:
+    """Build the backend selected by CACHE_BACKEND (memory | sqlite | redis)."""
+    backend = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        return SQLiteCache(os.environ.get(
+            'CACHE_SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'kodbank_cache.sqlite3')),
+            purge_every=int(os.environ.get('CACHE_SQLITE_PURGE_EVERY', '500')))
+    if backend == 'redis':
+        return RedisCache(os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0'))
+    return LRUCache(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', '1024')),
+        max_bytes=int(os.environ.get('CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    )
+
+
+# Singleton cache shared by all requests in this process
+cache = get_cache()
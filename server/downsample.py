@@ -0,0 +1,85 @@
+"""
+downsample.py — Reduce a bar series to roughly the number of points a chart
+can draw, so long ranges (5y, 10y, max) stay cheap to send and render.
+
+  line     Largest-Triangle-Three-Buckets on the closes: keeps the first and
+           last bar plus, per bucket, the bar forming the largest triangle
+           with the previously kept bar and the next bucket's average, so
+           peaks and troughs survive.
+  candle   equal-count buckets aggregated into one OHLCV bar each
+           (Bars.aggregate), so every high and low is still covered.
+
+    view = downsample(bars, points=600, chart='line')
+
+Full resolution stays available by asking for a narrower date window
+(scraper.slice_dates) with the same point budget.
+"""
+
+import numpy as np
+
+from bars import Bars
+
+CHARTS = ('line', 'candle')
+MIN_POINTS = 10
+MAX_POINTS = 5000
+# Above this many (bucket, predecessor, candidate) cells LTTB walks bucket by bucket
+_TABLE_CELLS = 1_000_000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the `n` points LTTB keeps from (x, y); all of them if n >= len(y)."""
+    m = len(y)
+    if n >= m:
+        return np.arange(m)
+    if n < 3:
+        return np.array([0, m - 1][:max(n, 0)])
+    # n - 2 buckets over the points between the first and the last
+    edges = np.append((np.arange(n - 1) * (m - 2) // (n - 2)) + 1, m)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+    # Triangle area for candidate b with kept point a and next-bucket average
+    # (cx, cy) is |xa·(yb − cy) + ya·(cx − xb) + (xb·cy − cx·yb)| / 2; the
+    # per-point terms do not depend on a, so compute them for all points
+    bucket = np.repeat(np.arange(-1, n - 1), np.append(1, counts))
+    nxt = np.clip(bucket + 1, 0, n - 2)
+    cx, cy = avg_x[nxt], avg_y[nxt]
+    p, q, r = y - cy, cx - x, x * cy - cx * y
+
+    kept = np.empty(n, dtype=np.intp)
+    kept[0], kept[-1] = 0, m - 1
+    width = int(counts[:-1].max())
+    if (n - 2) * width * width <= _TABLE_CELLS:
+        # The pick in bucket i depends only on which point of bucket i - 1
+        # was kept: tabulate the best pick for every predecessor at once,
+        # then follow the chain
+        cand = edges[:n - 2, None] + np.arange(width)                 # bucket i's points
+        valid = cand < edges[1:n - 1, None]
+        cand = np.where(valid, cand, 0)
+        prev = np.vstack([np.zeros((1, width), dtype=cand.dtype), cand[:-1]])
+        area = np.abs(x[prev][:, :, None] * p[cand][:, None, :] + y[prev][:, :, None] * q[cand][:, None, :]
+                      + r[cand][:, None, :])
+        best = np.where(valid[:, None, :], area, -1.0).argmax(axis=2).tolist()
+        cand = cand.tolist()
+        j = 0
+        for i in range(n - 2):
+            j = best[i][j]
+            kept[i + 1] = cand[i][j]
+        return kept
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        a = lo + int(np.argmax(np.abs(x[a] * p[lo:hi] + y[a] * q[lo:hi] + r[lo:hi])))
+        kept[i + 1] = a
+    return kept
+
+
+def downsample(bars: Bars, points: int, chart: str = 'candle') -> Bars:
+    """At most `points` bars: LTTB for 'line' charts, OHLC buckets for 'candle'."""
+    if len(bars) <= points:
+        return bars
+    if chart == 'line':
+        x = bars.date.astype(np.int64).astype(np.float64)
+        return bars[lttb_indices(x, bars.close, points)]
+    starts = np.unique(np.arange(points) * len(bars) // points)
+    return bars.aggregate(starts)
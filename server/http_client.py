@@ -0,0 +1,137 @@
+"""
+http_client.py — Shared outbound HTTP client for KodBank's upstream calls.
+
+One requests.Session for the whole process, so connections to Yahoo Finance,
+NewsAPI and GitHub Models are kept alive and reused instead of paying DNS,
+TCP and TLS setup on every call:
+
+    resp = http_client.get(url, upstream='yahoo_finance', params={...})
+
+  • per-host connection pools (HTTP_POOL_HOSTS hosts × HTTP_POOL_SIZE
+    connections each), kept alive between requests
+  • (connect, read) timeouts per upstream, overridable per call
+  • Accept-Encoding limited to what urllib3 can decode here (gzip/deflate,
+    plus br when brotli is installed); bodies are decoded transparently
+  • rate limiting, circuit breaking and retries per upstream (resilience.py)
+  • kodbank_http_client_* metrics: requests and new connections per host,
+    from which /metrics also derives a connection reuse ratio
+
+HTTP/2 is not used: requests/urllib3 speak HTTP/1.1 only, and with
+keep-alive the per-call handshake cost is already gone.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+import metrics
+import resilience
+
+POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', '10'))
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05'))
+
+# Read timeouts (seconds) per upstream; chat streams may pause between tokens
+READ_TIMEOUTS = {
+    'yahoo_finance': 15,
+    'newsapi':       30,
+    'github_models': 120,
+}
+DEFAULT_READ_TIMEOUT = 30
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36')
+
+client_requests = metrics.Counter('kodbank_http_client_requests_total',
+                                  'Outbound HTTP requests by host and status class.', ('host', 'status'))
+client_connections = metrics.Counter('kodbank_http_client_connections_total',
+                                     'New outbound connections opened, by host.', ('host',))
+
+
+# ── Connection pools that count new connections ───────────────────────────────
+
+class _CountingHTTPPool(HTTPConnectionPool):
+    def _new_conn(self):
+        client_connections.inc(self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPSPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        client_connections.inc(self.host)
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _CountingHTTPPool, 'https': _CountingHTTPSPool}
+
+
+def _count_response(resp, *args, **kwargs):
+    host = requests.utils.urlparse(resp.url).hostname or 'unknown'
+    client_requests.inc(host, f'{resp.status_code // 100}xx')
+
+
+# ── Shared session ────────────────────────────────────────────────────────────
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """The process-wide pooled session (created on first use)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = _PooledAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+                s.mount('https://', adapter)
+                s.mount('http://', adapter)
+                s.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+                s.hooks['response'].append(_count_response)
+                _session = s
+    return _session
+
+
+def timeout_for(upstream: str | None) -> tuple[float, float]:
+    return CONNECT_TIMEOUT, READ_TIMEOUTS.get(upstream, DEFAULT_READ_TIMEOUT)
+
+
+def request(method: str, url: str, upstream: str | None = None, **kwargs) -> requests.Response:
+    """
+    session().request with the upstream's default timeouts, run under its
+    resilience policy (may raise resilience.UpstreamUnavailable).
+    """
+    kwargs.setdefault('timeout', timeout_for(upstream))
+    return resilience.call(upstream, lambda: session().request(method, url, **kwargs))
+
+
+def get(url: str, upstream: str | None = None, **kwargs) -> requests.Response:
+    return request('GET', url, upstream, **kwargs)
+
+
+def azure_transport():
+    """azure-core transport that sends through the shared pooled session."""
+    from azure.core.pipeline.transport import RequestsTransport
+    return RequestsTransport(session=session(), session_owner=False,
+                             connection_timeout=CONNECT_TIMEOUT,
+                             read_timeout=READ_TIMEOUTS['github_models'])
+
+
+@metrics.register_collector
+def _reuse_ratio():
+    per_host: dict[str, float] = {}
+    for (host, _), n in client_requests.values().items():
+        per_host[host] = per_host.get(host, 0) + n
+    conns = {host: n for (host,), n in client_connections.values().items()}
+    lines = ['# TYPE kodbank_http_client_reuse_ratio gauge']
+    for host, n in sorted(per_host.items()):
+        lines.append(f'kodbank_http_client_reuse_ratio{{host="{host}"}} '
+                     f'{max(0.0, 1 - conns.get(host, 0) / n):.4f}')
+    return lines
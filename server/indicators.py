@@ -0,0 +1,389 @@
+"""
+indicators.py — Streaming technical indicator state for the analytics views.
+
+calculate_summary_statistics() (scraper.py) recomputes every indicator over
+the whole history. IndicatorState gives the same numbers incrementally:
+
+    state = IndicatorState.from_history(history)
+    state.update(bar)          # appends a new session's bar or revises the latest
+    stats = state.statistics() # same dict as calculate_summary_statistics()
+
+Each update is O(1): the state keeps Wilder averages (RSI), EMA values
+(12/26/50/200 and the MACD signal), running sums and sums of squares over
+the last 20/50/200 closes, and running totals for the summary fields. It is
+split into everything up to the previous bar plus the latest bar, so revising
+the latest bar while its session is still open does not drift.
+
+to_dict() / from_dict() give a JSON-safe form for caching or persisting.
+summarize() turns raw indicator values into the rounded statistics dict with
+analysis strings; the batch path uses it too, with the array indicators
+(sma, rolling_std, ema, rsi) that backtest.py runs over whole matrices.
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+RSI_PERIOD = 14
+BB_WINDOW = 20
+SMA_WINDOWS = (BB_WINDOW, 50, 200)
+EMA_SPANS = (12, 26, 50, 200)
+SIGNAL_SPAN = 9
+# Running window sums are recomputed from the window this often, so the
+# add/subtract updates cannot accumulate rounding error over long streams
+_RESUM_EVERY = 1000
+
+_SCALARS = ('count', 'first_close', 'last_close', 'close_sum', 'high_max', 'low_min',
+            'volume_sum', 'volume_count', 'gains', 'avg_gain', 'avg_loss', 'ema', 'signal',
+            'sums', 'sumsq')
+
+
+def _num(value) -> float | None:
+    """Float of a bar field; None for missing, NaN or unparseable values."""
+    if value is None:
+        return None
+    try:
+        f = float(str(value).replace(',', '')) if isinstance(value, str) else float(value)
+    except ValueError:
+        return None
+    return None if math.isnan(f) else f
+
+
+class IndicatorState:
+    """Incremental equivalent of calculate_summary_statistics()."""
+
+    VERSION = 1
+
+    def __init__(self):
+        # Committed bars: everything before `latest`
+        self.count = 0
+        self.first_close: float | None = None
+        self.last_close: float | None = None
+        self.close_sum = 0.0
+        self.high_max: float | None = None
+        self.low_min: float | None = None
+        self.volume_sum = 0.0
+        self.volume_count = 0
+        self.gains = 0                       # close-to-close changes seen
+        self.avg_gain: float | None = None
+        self.avg_loss: float | None = None
+        self.ema: dict[int, float | None] = {span: None for span in EMA_SPANS}
+        self.signal: float | None = None
+        self.sums: dict[int, float] = {w: 0.0 for w in SMA_WINDOWS}
+        self.sumsq = 0.0                     # over the Bollinger window
+        self.window: deque = deque(maxlen=max(SMA_WINDOWS))
+        # The bar that may still be revised
+        self.latest: dict | None = None
+
+    @classmethod
+    def from_history(cls, history: list[dict]) -> 'IndicatorState':
+        state = cls()
+        for bar in history:
+            state.append(bar)
+        return state
+
+    # ── Updates ───────────────────────────────────────────────────────────────
+
+    def append(self, bar: dict):
+        """Add a bar for a new session (bars without a Close are ignored)."""
+        if _num(bar.get('Close')) is None:
+            return
+        if self.latest is not None:
+            self._commit(self.latest)
+        self.latest = dict(bar)
+
+    def revise(self, bar: dict):
+        """Replace the latest bar (e.g. an intraday update of today's bar)."""
+        if _num(bar.get('Close')) is None:
+            return
+        self.latest = dict(bar)
+
+    def update(self, bar: dict) -> bool:
+        """
+        Revise the latest bar if `bar` has the same Date, append it if newer.
+        Returns False (and changes nothing) for an older bar.
+        """
+        if self.latest is not None and bar['Date'] < self.latest['Date']:
+            return False
+        if self.latest is not None and bar['Date'] == self.latest['Date']:
+            self.revise(bar)
+        else:
+            self.append(bar)
+        return True
+
+    def _fold(self, bar: dict) -> dict:
+        """Committed state with `bar` folded in; self is not modified."""
+        close = _num(bar.get('Close'))
+        high, low, volume = _num(bar.get('High')), _num(bar.get('Low')), _num(bar.get('Volume'))
+        s = {
+            'count':        self.count + 1,
+            'first_close':  close if self.first_close is None else self.first_close,
+            'last_close':   close,
+            'close_sum':    self.close_sum + close,
+            'high_max':     self.high_max if high is None else max(high, self.high_max if self.high_max is not None else high),
+            'low_min':      self.low_min if low is None else min(low, self.low_min if self.low_min is not None else low),
+            'volume_sum':   self.volume_sum + (volume or 0.0),
+            'volume_count': self.volume_count + (volume is not None),
+            'gains':        self.gains,
+            'avg_gain':     self.avg_gain,
+            'avg_loss':     self.avg_loss,
+        }
+
+        # RSI: Wilder smoothing (alpha 1/14), seeded with the first change
+        if self.last_close is not None:
+            gain, loss = max(close - self.last_close, 0.0), max(self.last_close - close, 0.0)
+            a = 1 / RSI_PERIOD
+            s['gains'] += 1
+            if self.avg_gain is None:
+                s['avg_gain'], s['avg_loss'] = gain, loss
+            else:
+                s['avg_gain'] = (1 - a) * self.avg_gain + a * gain
+                s['avg_loss'] = (1 - a) * self.avg_loss + a * loss
+
+        # EMAs (adjust=False, seeded with the first close) and the MACD signal
+        ema = {}
+        for span, prev in self.ema.items():
+            a = 2 / (span + 1)
+            ema[span] = close if prev is None else (1 - a) * prev + a * close
+        s['ema'] = ema
+        macd = ema[12] - ema[26]
+        a = 2 / (SIGNAL_SPAN + 1)
+        s['signal'] = macd if self.signal is None else (1 - a) * self.signal + a * macd
+
+        # Window sums: drop the close falling out of each window, add this one
+        n = len(self.window)
+        s['sums'] = {w: total - (self.window[n - w] if n >= w else 0.0) + close
+                     for w, total in self.sums.items()}
+        dropped = self.window[n - BB_WINDOW] if n >= BB_WINDOW else 0.0
+        s['sumsq'] = self.sumsq - dropped * dropped + close * close
+        return s
+
+    def _commit(self, bar: dict):
+        folded = self._fold(bar)
+        for name in _SCALARS:
+            setattr(self, name, folded[name])
+        self.window.append(folded['last_close'])
+        if self.count % _RESUM_EVERY == 0:
+            closes = list(self.window)
+            self.sums = {w: math.fsum(closes[-w:]) for w in SMA_WINDOWS}
+            self.sumsq = math.fsum(c * c for c in closes[-BB_WINDOW:])
+
+    # ── Output ────────────────────────────────────────────────────────────────
+
+    def statistics(self) -> dict | None:
+        """Summary statistics including the latest bar (None before any bar)."""
+        if self.latest is None:
+            return None
+        s = self._fold(self.latest)
+        n = s['count']
+
+        def sma(w):
+            return s['sums'][w] / w if n >= w else None
+
+        bb_std = None
+        if n >= BB_WINDOW:
+            mean = s['sums'][BB_WINDOW] / BB_WINDOW
+            bb_std = math.sqrt(max(0.0, (s['sumsq'] - BB_WINDOW * mean * mean) / (BB_WINDOW - 1)))
+
+        rsi = None
+        if s['gains'] >= RSI_PERIOD:
+            rs = s['avg_gain'] / s['avg_loss'] if s['avg_loss'] else 0.0
+            rsi = 100 - 100 / (1 + rs)
+
+        macd = s['ema'][12] - s['ema'][26]
+        prev_macd = prev_signal = None
+        if self.count:
+            prev_macd, prev_signal = self.ema[12] - self.ema[26], self.signal
+
+        return summarize({
+            'price':          s['last_close'],
+            'first_close':    s['first_close'],
+            'period_high':    s['high_max'],
+            'period_low':     s['low_min'],
+            'average_close':  s['close_sum'] / n,
+            'average_volume': s['volume_sum'] / s['volume_count'] if s['volume_count'] else None,
+            'total_records':  n,
+            'rsi':            rsi,
+            'bb_mid':         sma(BB_WINDOW),
+            'bb_std':         bb_std,
+            'sma50':          sma(50),
+            'sma200':         sma(200),
+            'ema50':          s['ema'][50],
+            'ema200':         s['ema'][200],
+            'macd':           macd,
+            'signal':         s['signal'],
+            'prev_macd':      prev_macd,
+            'prev_signal':    prev_signal,
+        })
+
+    # ── Serialization ─────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in _SCALARS}
+        data['ema'] = {str(span): v for span, v in self.ema.items()}
+        data['sums'] = {str(w): v for w, v in self.sums.items()}
+        data['window'] = list(self.window)
+        data['latest'] = self.latest
+        data['version'] = self.VERSION
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'IndicatorState':
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f"unsupported indicator state version {data.get('version')!r}")
+        state = cls()
+        for name in _SCALARS:
+            setattr(state, name, data[name])
+        state.ema = {int(span): v for span, v in data['ema'].items()}
+        state.sums = {int(w): v for w, v in data['sums'].items()}
+        state.window.extend(data['window'])
+        state.latest = data['latest']
+        return state
+
+
+# ── Array indicators (along axis 1 of a tickers × bars matrix) ────────────────
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average; NaN until `window` bars are available."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < window:
+        return out
+    c = np.cumsum(x, axis=1)
+    out[:, window - 1] = c[:, window - 1]
+    out[:, window:] = c[:, window:] - c[:, :-window]
+    out[:, window - 1:] /= window
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """Sample (ddof=1) rolling standard deviation; NaN until `window` bars."""
+    mean = sma(x, window)
+    mean_sq = sma(x * x, window)
+    return np.sqrt(np.maximum(0.0, (mean_sq - mean * mean) * window / (window - 1)))
+
+
+def ema(x: np.ndarray, alpha: float) -> np.ndarray:
+    """EMA with adjust=False semantics (seeded with the first value)."""
+    from scipy.signal import lfilter   # deferred: scipy dominates import time
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, axis=1, zi=(1 - alpha) * x[:, :1])
+    return y
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """Wilder RSI (NaN for the first `period` bars); 0 while there are no losses."""
+    out = np.full(close.shape, np.nan)
+    if close.shape[1] <= period:
+        return out
+    delta = np.diff(close, axis=1)
+    avg_gain = ema(np.maximum(delta, 0.0), 1 / period)
+    avg_loss = ema(np.maximum(-delta, 0.0), 1 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = np.where(avg_loss > 0, avg_gain / avg_loss, 0.0)
+    out[:, period:] = (100 - 100 / (1 + rs))[:, period - 1:]
+    return out
+
+
+def _round(value: float | None, digits: int) -> float | None:
+    return round(float(value), digits) if value is not None else None
+
+
+def summarize(v: dict) -> dict:
+    """
+    Rounded statistics plus analysis strings from raw indicator values
+    (None where a window is not filled yet).
+    """
+    price = v['price']
+    first_close = v['first_close']
+    price_change = round(price - first_close, 4)
+    percent_change = round((price_change / first_close) * 100, 4) if first_close else 0.0
+
+    # ── RSI ──────────────────────────────────────────────────────────────────
+    rsi_val = _round(v['rsi'], 2)
+    if rsi_val is None:
+        rsi_analysis = "Not enough bars for RSI."
+    elif rsi_val > 70:
+        rsi_analysis = "Asset is Overbought. Trend reversal may occur."
+    elif rsi_val < 30:
+        rsi_analysis = "Asset is Oversold. Potential buying opportunity."
+    else:
+        rsi_analysis = "RSI is Neutral."
+
+    # ── Bollinger Bands ──────────────────────────────────────────────────────
+    bb_upper_val = bb_lower_val = None
+    if v['bb_mid'] is not None:
+        bb_upper_val = round(float(v['bb_mid'] + 2 * v['bb_std']), 4)
+        bb_lower_val = round(float(v['bb_mid'] - 2 * v['bb_std']), 4)
+    if bb_upper_val is None:
+        bb_analysis = "Not enough bars for Bollinger Bands."
+    elif price >= bb_upper_val:
+        bb_analysis = "Price near Upper Band, suggesting overvalued."
+    elif price <= bb_lower_val:
+        bb_analysis = "Price near Lower Band, suggesting undervalued."
+    else:
+        bb_analysis = "Price within normal Bollinger Bands range."
+
+    # ── Moving Averages ──────────────────────────────────────────────────────
+    sma50, sma200 = _round(v['sma50'], 4), _round(v['sma200'], 4)
+    ema50, ema200 = _round(v['ema50'], 4), _round(v['ema200'], 4)
+    if sma50 and sma200:
+        if sma50 > sma200 and price > sma50:
+            ma_analysis = "Strong Bullish Trend: Golden Cross."
+        elif sma50 < sma200 and price < sma50:
+            ma_analysis = "Strong Bearish Trend: Death Cross."
+        elif price > sma200:
+            ma_analysis = "Long-term Bullish."
+        else:
+            ma_analysis = "Long-term Bearish."
+    elif price > (sma200 or ema200):
+        ma_analysis = "Long-term Bullish."
+    else:
+        ma_analysis = "Long-term Bearish."
+
+    # ── MACD ─────────────────────────────────────────────────────────────────
+    macd_val = round(float(v['macd']), 4)
+    signal_val = round(float(v['signal']), 4)
+    hist_val = round(float(v['macd'] - v['signal']), 4)
+    prev_macd = v['prev_macd'] if v['prev_macd'] is not None else macd_val
+    prev_signal = v['prev_signal'] if v['prev_signal'] is not None else signal_val
+
+    if prev_macd <= prev_signal and macd_val > signal_val:
+        macd_analysis = "Bullish Crossover"
+    elif prev_macd >= prev_signal and macd_val < signal_val:
+        macd_analysis = "Bearish Crossover"
+    elif macd_val > signal_val:
+        macd_analysis = "Bullish Trend"
+    elif macd_val < signal_val:
+        macd_analysis = "Bearish Trend"
+    else:
+        macd_analysis = "Neutral"
+
+    return {
+        # Summary
+        "last_close":     round(price, 4),
+        "period_high":    _round(v['period_high'], 4),
+        "period_low":     _round(v['period_low'], 4),
+        "average_close":  round(float(v['average_close']), 4),
+        "average_volume": _round(v['average_volume'], 2),
+        "price_change":    price_change,
+        "percent_change":  percent_change,
+        "total_records":   v['total_records'],
+        # RSI
+        "rsi":          rsi_val,
+        "rsi_analysis": rsi_analysis,
+        # Bollinger Bands
+        "bb_upper":   bb_upper_val,
+        "bb_lower":   bb_lower_val,
+        "bb_analysis": bb_analysis,
+        # Moving Averages
+        "ma_50_sma":  sma50,
+        "ma_200_sma": sma200,
+        "ma_50_ema":  ema50,
+        "ma_200_ema": ema200,
+        "ma_analysis": ma_analysis,
+        # MACD
+        "macd_line":   macd_val,
+        "macd_signal": signal_val,
+        "macd_hist":   hist_val,
+        "macd_analysis": macd_analysis,
+    }
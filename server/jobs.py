@@ -0,0 +1,238 @@
+"""
+jobs.py — Background job subsystem for KodBank.
+
+Slow ingestion work (e.g. indexing fresh news into the RAG knowledge base)
+is submitted here instead of running inside the HTTP request. Jobs run on a
+bounded worker pool, live in a module-level registry so later requests can
+poll them, and record progress events that app.py streams over SSE.
+
+A job runs in the worker process that accepted it, but its status and events
+are mirrored to the cache tier under `job:<id>` on every change. With a
+shared CACHE_BACKEND (sqlite / redis) any worker can therefore answer the
+poll and SSE routes, reading a SharedJob snapshot; with the per-process
+memory cache those routes need sticky routing to the submitting worker.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+from cache import cache
+
+log = logs.get_logger('jobs')
+
+# Finished jobs are kept this long so clients can still read their final events
+_JOB_TTL_SECONDS = 15 * 60
+# How often a SharedJob re-reads the cache while streaming events
+_SHARED_POLL_SECONDS = 1.0
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when the number of queued + running jobs hits the cap."""
+
+
+class Job:
+    """A unit of background work plus its ordered list of progress events."""
+
+    def __init__(self, kind: str, owner: str | None = None, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = 'queued'
+        self.result = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.events: list[dict] = []
+        self._cond = threading.Condition()
+        self._store = store
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def _publish(self):
+        """Mirror status and events to the shared store; caller holds _cond."""
+        if self._store is not None:
+            self._store.set(f'job:{self.id}', {'job': self.to_dict(), 'owner': self.owner,
+                                               'events': list(self.events)}, ttl=_JOB_TTL_SECONDS)
+
+    def emit(self, stage: str, **data):
+        """Record a progress event and wake any SSE readers."""
+        with self._cond:
+            self.events.append({'stage': stage, 'ts': round(time.time(), 3), **data})
+            self._publish()
+            self._cond.notify_all()
+
+    def _start(self):
+        with self._cond:
+            self.status = 'running'
+            self.events.append({'stage': 'started', 'ts': round(time.time(), 3)})
+            self._publish()
+            self._cond.notify_all()
+
+    def _finish(self, status: str, result=None, error: str | None = None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.events.append({'stage': status, 'ts': round(self.finished_at, 3),
+                                **({'error': error} if error else {})})
+            self._publish()
+            self._cond.notify_all()
+
+    def iter_events(self, heartbeat: float = 15.0):
+        """
+        Yield events as they arrive, starting from the first one.
+        Yields None every `heartbeat` seconds of silence so callers can keep
+        the connection alive; stops after the terminal event.
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                if sent >= len(self.events) and not self.done:
+                    self._cond.wait(timeout=heartbeat)
+                pending = self.events[sent:]
+                finished = self.done
+            if not pending and not finished:
+                yield None
+                continue
+            for event in pending:
+                yield event
+            sent += len(pending)
+            if finished and sent >= len(self.events):
+                return
+
+    def to_dict(self) -> dict:
+        return {
+            'id':          self.id,
+            'kind':        self.kind,
+            'status':      self.status,
+            'error':       self.error,
+            'created_at':  round(self.created_at, 3),
+            'finished_at': round(self.finished_at, 3) if self.finished_at else None,
+            'events':      len(self.events),
+        }
+
+
+class SharedJob:
+    """
+    Read-only view of a job running in another worker, rebuilt from its
+    `job:<id>` cache entry. Offers the Job read interface (owner, status,
+    done, to_dict, iter_events) so the routes need not tell the two apart.
+    """
+
+    def __init__(self, job_id: str, state: dict, store):
+        self.id = job_id
+        self.owner = state['owner']
+        self.events: list[dict] = state['events']
+        self._state = state['job']
+        self._store = store
+
+    @classmethod
+    def load(cls, job_id: str, store) -> 'SharedJob | None':
+        state = store.get(f'job:{job_id}')
+        return cls(job_id, state, store) if state else None
+
+    @property
+    def kind(self) -> str:
+        return self._state['kind']
+
+    @property
+    def status(self) -> str:
+        return self._state['status']
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> dict:
+        return dict(self._state)
+
+    def iter_events(self, heartbeat: float = 15.0):
+        """Job.iter_events, polling the cache entry for new events."""
+        sent, quiet_since = 0, time.monotonic()
+        while True:
+            pending = self.events[sent:]
+            for event in pending:
+                yield event
+            sent += len(pending)
+            if self.done and sent >= len(self.events):
+                return
+            if pending:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield None
+            time.sleep(_SHARED_POLL_SECONDS)
+            state = self._store.get(f'job:{self.id}')
+            if state is None:               # expired or evicted: nothing more to send
+                return
+            self.events, self._state = state['events'], state['job']
+
+
+class JobManager:
+    """Bounded pool of worker threads with a registry of recent jobs."""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='kodbank-job')
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _active_count(self) -> int:
+        return sum(1 for j in self._jobs.values() if not j.done)
+
+    def _prune(self):
+        cutoff = time.time() - _JOB_TTL_SECONDS
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, fn, *args, owner: str | None = None, **kwargs) -> Job:
+        """
+        Queue fn(*args, progress=job.emit, **kwargs) on the worker pool.
+        Raises JobQueueFull when max_pending jobs are already queued or running.
+        """
+        job = Job(kind, owner=owner, store=self.store)
+        with self._lock:
+            self._prune()
+            if self._active_count() >= self.max_pending:
+                raise JobQueueFull(f"Too many background jobs ({self.max_pending}); try again later.")
+            self._jobs[job.id] = job
+
+        def run():
+            job._start()
+            try:
+                result = fn(*args, progress=job.emit, **kwargs)
+                job._finish('done', result=result)
+            except Exception as e:
+                log.exception('job failed', extra={'kind': kind, 'job_id': job.id})
+                job._finish('failed', error=str(e))
+
+        job.emit('queued')
+        self._executor.submit(run)
+        return job
+
+    def get(self, job_id: str) -> 'Job | SharedJob | None':
+        """The local job, else another worker's job as mirrored in the store."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            return SharedJob.load(job_id, self.store)
+        return job
+
+
+# Singleton manager shared by all requests in this process
+manager = JobManager(
+    max_workers=int(os.environ.get('JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', '16')),
+    store=cache,
+)
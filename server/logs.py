@@ -0,0 +1,255 @@
+"""
+logs.py — Non-blocking structured logging for KodBank.
+
+Modules log through `logs.get_logger(__name__)`. Records never touch the
+output stream on the calling thread: a QueueHandler puts them on a bounded
+queue and a QueueListener thread formats and writes them (JSON lines by
+default, LOG_FORMAT=text for local development). If the queue is full the
+record is dropped and counted rather than blocking the request.
+
+Two filters keep log volume proportional to what is useful:
+  • Per-route sampling — LOG_SAMPLE_RATES="/metrics=0,/api/analytics/stock/<ticker>=0.1"
+    keeps that fraction of requests' INFO/DEBUG records (decided once per
+    request, so a sampled request keeps all its lines). Warnings and errors
+    are never sampled out.
+  • Error rate limiting — at most LOG_ERROR_BURST records per message per
+    LOG_ERROR_WINDOW seconds at WARNING and above; the next record that gets
+    through carries a `suppressed` count.
+
+Inside a request every record carries request_id (X-Request-Id, echoed on
+the response), trace_id and route. Extra fields go in `extra=`:
+
+    log.warning('upstream slow', extra={'upstream': 'newsapi', 'ms': 812})
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+
+import metrics
+import tracing
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+ERROR_BURST = int(os.environ.get('LOG_ERROR_BURST', '5'))
+ERROR_WINDOW = float(os.environ.get('LOG_ERROR_WINDOW', '60'))
+
+log_records = metrics.Counter('kodbank_log_records_total', 'Log records enqueued, by level.', ('level',))
+log_dropped = metrics.Counter('kodbank_log_dropped_total',
+                              'Log records not written, by reason.', ('reason',))
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+_CONTEXT_ATTRS = ('request_id', 'trace_id', 'route')
+
+
+def _parse_rates(spec: str) -> dict[str, float]:
+    rates = {}
+    for item in filter(None, (s.strip() for s in spec.split(','))):
+        route, _, rate = item.rpartition('=')
+        rates[route] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+
+
+# ── Formatting (listener thread) ──────────────────────────────────────────────
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            'ts':     datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                              .isoformat(timespec='milliseconds'),
+            'level':  record.levelname,
+            'logger': record.name,
+            'msg':    record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value is not None:
+                out[key] = value
+        if record.exc_text:
+            out['exc'] = record.exc_text
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = ' '.join(f'{k}={v}' for k, v in vars(record).items()
+                          if k not in _STANDARD_ATTRS and v is not None)
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} [{record.name}] {record.getMessage()}"
+        if fields:
+            line += '  ' + fields
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+# ── Filters and the queue handler (calling thread) ────────────────────────────
+
+def _request_context() -> dict:
+    """request_id / trace_id / route of the current Flask request, if any."""
+    from flask import g, has_request_context, request
+    if not has_request_context():
+        return {'trace_id': tracing.current_trace_id()}
+    root = g.get('_trace_root')
+    return {
+        'request_id': g.get('_request_id'),
+        'trace_id':   tracing.current_trace_id() or (root.trace_id if root else None),
+        'route':      request.url_rule.rule if request.url_rule else 'unmatched',
+        '_sampled':   g.get('_log_sampled', True),
+    }
+
+
+class _ErrorRateLimiter:
+    """Fixed-window limit per (logger, message template)."""
+
+    def __init__(self, burst: int, window: float):
+        self.burst = burst
+        self.window = window
+        self._lock = threading.Lock()
+        self._windows: dict[tuple, list] = {}   # key -> [window start, count, suppressed]
+
+    def allow(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                if len(self._windows) > 1000:
+                    self._windows = {k: v for k, v in self._windows.items()
+                                     if now - v[0] < self.window}
+            if state[1] >= self.burst:
+                state[2] += 1
+                return False
+            state[1] += 1
+            return True
+
+
+class _KodBankQueueHandler(logging.handlers.QueueHandler):
+    """Attach context, sample, rate-limit, then enqueue without blocking."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.limiter = _ErrorRateLimiter(ERROR_BURST, ERROR_WINDOW)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        context = _request_context()
+        if record.levelno < logging.WARNING:
+            if not context.pop('_sampled', True):
+                log_dropped.inc('sampled')
+                return False
+        else:
+            context.pop('_sampled', None)
+            if not self.limiter.allow(record):
+                log_dropped.inc('rate_limited')
+                return False
+        for key, value in context.items():
+            if getattr(record, key, None) is None:
+                setattr(record, key, value)
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and tracebacks here: they may reference objects that
+        # change (or frames that die) before the listener gets to the record.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            log_records.inc(record.levelname)
+        except queue.Full:
+            log_dropped.inc('queue_full')
+
+
+# ── Setup ─────────────────────────────────────────────────────────────────────
+
+_root = logging.getLogger('kodbank')
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _start_listener(q):
+    global _listener
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JSONFormatter())
+    _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def setup():
+    """Install the queue handler on the 'kodbank' logger (idempotent)."""
+    if _root.handlers:
+        return
+    with _setup_lock:
+        if _root.handlers:
+            return
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        _root.addHandler(_KodBankQueueHandler(q))
+        _root.setLevel(LOG_LEVEL)
+        _root.propagate = False
+        _start_listener(q)
+        atexit.register(shutdown)
+        # The listener thread does not survive fork (e.g. gunicorn --preload)
+        os.register_at_fork(after_in_child=lambda: _start_listener(q))
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the 'kodbank' hierarchy, e.g. get_logger('rag') -> kodbank.rag."""
+    setup()
+    return logging.getLogger(f'kodbank.{name}')
+
+
+def init_app(app):
+    """Request ids, per-request sampling decision and a sampled access log."""
+    from flask import g, request
+
+    access = get_logger('access')
+
+    @app.before_request
+    def _log_start():
+        incoming = request.headers.get('X-Request-Id', '')
+        g._request_id = incoming if 8 <= len(incoming) <= 64 and incoming.isalnum() else secrets.token_hex(8)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        rate = SAMPLE_RATES.get(route, 1.0)
+        g._log_sampled = rate >= 1.0 or random.random() < rate
+        g._log_t0 = time.perf_counter()
+
+    @app.after_request
+    def _log_access(response):
+        response.headers['X-Request-Id'] = g.get('_request_id', '')
+        t0 = g.get('_log_t0')
+        if t0 is not None:
+            access.info('request', extra={
+                'method':      request.method,
+                'status':      response.status_code,
+                'duration_ms': round((time.perf_counter() - t0) * 1000, 2),
+            })
+        return response
@@ -0,0 +1,169 @@
+"""
+memory.py — Memory accounting and per-subsystem budgets for KodBank.
+
+Subsystems that hold sizeable data register a size estimate and, optionally,
+an eviction callback and a budget:
+
+    memory.register('cache', lambda: cache.size_bytes,
+                    evict=cache.evict_to, budget_env='MEM_BUDGET_CACHE_BYTES')
+
+enforce() (started on a background thread at most every MEM_CHECK_INTERVAL
+seconds after a request) asks every subsystem that is over its budget to
+evict down to it. report() feeds /debug/memory, which also shows process RSS
+and, on demand, the top tracemalloc allocation sites.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+
+import logs
+
+log = logs.get_logger('memory')
+
+
+class _Subsystem:
+    def __init__(self, name, size_fn, evict=None, budget=None):
+        self.name = name
+        self.size_fn = size_fn
+        self.evict = evict
+        self.budget = budget
+        self.evictions = 0
+
+
+_subsystems: dict[str, _Subsystem] = {}
+_lock = threading.Lock()
+_last_check = 0.0
+CHECK_INTERVAL = float(os.environ.get('MEM_CHECK_INTERVAL', '30'))
+
+
+def register(name: str, size_fn, evict=None, budget_env: str | None = None):
+    """
+    size_fn() -> estimated resident bytes. evict(budget_bytes) should free
+    memory until the subsystem is at or under budget_bytes. The budget is read
+    from `budget_env` (bytes); no budget means the subsystem is only reported.
+    """
+    budget = int(os.environ[budget_env]) if budget_env and os.environ.get(budget_env) else None
+    _subsystems[name] = _Subsystem(name, size_fn, evict, budget)
+
+
+def process_rss_bytes() -> int | None:
+    """Current resident set size (Linux /proc), else peak RSS from getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def _size(sub: _Subsystem) -> int:
+    try:
+        return int(sub.size_fn())
+    except Exception as e:
+        log.warning('size estimate failed', extra={'subsystem': sub.name, 'error': str(e)})
+        return 0
+
+
+def enforce() -> dict[str, int]:
+    """Evict in every subsystem that exceeds its budget; returns bytes freed per subsystem."""
+    freed = {}
+    with _lock:
+        for sub in _subsystems.values():
+            if sub.budget is None or sub.evict is None:
+                continue
+            before = _size(sub)
+            if before <= sub.budget:
+                continue
+            try:
+                sub.evict(sub.budget)
+            except Exception:
+                log.exception('eviction failed', extra={'subsystem': sub.name})
+                continue
+            sub.evictions += 1
+            freed[sub.name] = before - _size(sub)
+            log.warning('over budget', extra={'subsystem': sub.name, 'bytes': before,
+                                              'budget': sub.budget, 'freed': freed[sub.name]})
+    return freed
+
+
+def maybe_enforce():
+    """
+    Start enforce() on a background thread if CHECK_INTERVAL has passed since
+    the last run, so eviction never delays or fails the request it follows.
+    """
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < CHECK_INTERVAL:
+        return
+    _last_check = now
+    threading.Thread(target=enforce, name='kodbank-memory-check', daemon=True).start()
+
+
+def report() -> dict:
+    subsystems = {}
+    for sub in list(_subsystems.values()):
+        size = _size(sub)
+        subsystems[sub.name] = {
+            'bytes':      size,
+            'budget':     sub.budget,
+            'over':       sub.budget is not None and size > sub.budget,
+            'evictions':  sub.evictions,
+        }
+    return {
+        'rss_bytes':    process_rss_bytes(),
+        'subsystems':   subsystems,
+        'tracemalloc':  tracemalloc.is_tracing(),
+    }
+
+
+def tracemalloc_top(limit: int = 25) -> list[dict]:
+    """
+    Top allocation sites by size. Starts tracemalloc on first use, so the first
+    call only reflects allocations made from then on.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(int(os.environ.get('TRACEMALLOC_FRAMES', '1')))
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    top = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        top.append({'site': f'{frame.filename}:{frame.lineno}', 'bytes': stat.size, 'count': stat.count})
+    return [{'traced_current': current, 'traced_peak': peak}] + top
+
+
+def init_app(app):
+    """Budget checks after requests and the admin-only /debug/memory endpoint."""
+    from flask import jsonify, request, session
+
+    @app.teardown_request
+    def _memory_check(exc):
+        maybe_enforce()
+
+    @app.route('/debug/memory')
+    def debug_memory():
+        if session.get('role') != 'admin':
+            return jsonify({'message': 'Forbidden'}), 403
+        try:
+            limit = int(request.args.get('limit', 25))
+        except ValueError:
+            return jsonify({'message': 'limit must be an integer'}), 400
+        if limit < 0:
+            return jsonify({'message': 'limit must not be negative'}), 400
+        if request.args.get('tracemalloc') == 'stop':
+            tracemalloc.stop()
+        if request.args.get('enforce'):
+            enforce()
+        payload = report()
+        if request.args.get('snapshot'):
+            payload['allocations'] = tracemalloc_top(limit)
+        return jsonify(payload), 200
@@ -0,0 +1,207 @@
+"""
+metrics.py — Minimal Prometheus-style instrumentation for KodBank.
+
+Counters, gauges and fixed-bucket histograms with labels, kept in a module
+registry and rendered in the Prometheus text format by render() for the
+/metrics endpoint. Recording is a dict lookup, a bisect and a few adds under
+a per-metric lock, so it is cheap enough for every request.
+
+Other modules can add values computed at scrape time (e.g. cache hit
+counts) with register_collector().
+"""
+
+import bisect
+import contextlib
+import logging
+import threading
+import time
+
+# logs.py imports this module, so take the logger by name rather than through
+# logs.get_logger(); logs.setup() configures the 'kodbank' hierarchy
+log = logging.getLogger('kodbank.metrics')
+
+# Latency buckets in seconds: 5ms … 60s (LLM streams and slow upstreams)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Payload buckets in bytes: 256B … 4MB
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_registry: list = []
+_collectors: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+        _registry.append(self)
+
+    def _header(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        """Snapshot of the current values, keyed by label-value tuple."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f'{self.name}{_fmt_labels(self.labels, k)} {v}' for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *label_values, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_fmt_labels(self.labels, key)} {total}')
+            lines.append(f'{self.name}_count{_fmt_labels(self.labels, key)} {count}')
+        return lines
+
+
+def register_collector(fn):
+    """fn() -> list of Prometheus text lines, evaluated on every scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception:
+            log.exception('metrics collector failed')
+    return '\n'.join(lines) + '\n'
+
+
+# ── KodBank metrics ───────────────────────────────────────────────────────────
+
+http_requests = Counter('kodbank_http_requests_total', 'HTTP requests by route and status.',
+                        ('method', 'route', 'status'))
+http_latency = Histogram('kodbank_http_request_duration_seconds',
+                         'Time until response headers are ready, by route.', ('method', 'route'))
+http_request_bytes = Histogram('kodbank_http_request_size_bytes', 'Request body size by route.',
+                               ('route',), buckets=SIZE_BUCKETS)
+http_response_bytes = Histogram('kodbank_http_response_size_bytes',
+                                'Response body size by route (non-streaming responses).',
+                                ('route',), buckets=SIZE_BUCKETS)
+http_in_flight = Gauge('kodbank_http_requests_in_flight', 'Requests currently being served.')
+
+upstream_latency = Histogram('kodbank_upstream_duration_seconds',
+                             'Latency of calls to upstream services.', ('upstream', 'outcome'))
+
+
+@contextlib.contextmanager
+def upstream_timer(upstream: str):
+    """Time a block that calls an upstream; outcome is 'ok' or 'error'."""
+    t0 = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        upstream_latency.observe(upstream, outcome, value=time.perf_counter() - t0)
+
+
+def timed_upstream(upstream: str, fn):
+    """Wrap fn so every call is recorded under `upstream`."""
+    def wrapper(*args, **kwargs):
+        with upstream_timer(upstream):
+            return fn(*args, **kwargs)
+    wrapper.__name__ = getattr(fn, '__name__', 'wrapper')
+    wrapper.__doc__ = getattr(fn, '__doc__', None)
+    return wrapper
+
+
+def init_app(app):
+    """Install before/after-request hooks that feed the http_* metrics."""
+    from flask import g, request
+
+    def route_label() -> str:
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        g._metrics_in_flight = True
+        http_in_flight.inc()
+
+    @app.after_request
+    def _metrics_record(response):
+        t0 = g.pop('_metrics_t0', None)
+        if t0 is not None:
+            route = route_label()
+            http_latency.observe(request.method, route, value=time.perf_counter() - t0)
+            http_requests.inc(request.method, route, str(response.status_code))
+            if request.content_length:
+                http_request_bytes.observe(route, value=request.content_length)
+            if not response.is_streamed and response.content_length is not None:
+                http_response_bytes.observe(route, value=response.content_length)
+        return response
+
+    @app.teardown_request
+    def _metrics_done(exc):
+        # Runs after streamed bodies finish, so SSE streams count as in flight
+        if g.pop('_metrics_in_flight', False):
+            http_in_flight.dec()
@@ -0,0 +1,44 @@
+"""
+news_client.py — Minimal NewsAPI v2 client on the shared pooled session.
+
+Replaces newsapi-python's NewsApiClient (which opened its own connections)
+for the two endpoints KodBank uses. Method names and arguments match
+NewsApiClient, so call sites read the same; responses are the decoded JSON
+dicts. NEWS_API_URL overrides the base URL (e.g. for bench/standins.py).
+"""
+
+import os
+
+import http_client
+
+NEWS_API_URL = os.environ.get('NEWS_API_URL', 'https://newsapi.org/v2')
+
+
+class NewsAPIError(RuntimeError):
+    pass
+
+
+class NewsClient:
+    def __init__(self, api_key: str, base_url: str = NEWS_API_URL):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+
+    def _get(self, endpoint: str, params: dict) -> dict:
+        resp = http_client.get(f'{self.base_url}/{endpoint}', upstream='newsapi',
+                               params={k: v for k, v in params.items() if v is not None},
+                               headers={'X-Api-Key': self.api_key})
+        try:
+            payload = resp.json()
+        except ValueError:
+            raise NewsAPIError(f'NewsAPI returned HTTP {resp.status_code} with a non-JSON body')
+        if resp.status_code != 200 or payload.get('status') != 'ok':
+            raise NewsAPIError(payload.get('message') or f'NewsAPI returned HTTP {resp.status_code}')
+        return payload
+
+    def get_top_headlines(self, q=None, category=None, language=None, country=None, page_size=None):
+        return self._get('top-headlines', {'q': q, 'category': category, 'language': language,
+                                           'country': country, 'pageSize': page_size})
+
+    def get_everything(self, q=None, language=None, sort_by=None, page_size=None):
+        return self._get('everything', {'q': q, 'language': language, 'sortBy': sort_by,
+                                        'pageSize': page_size})
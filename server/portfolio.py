@@ -0,0 +1,246 @@
+"""
+portfolio.py — Portfolio risk analytics on an aligned close-price matrix.
+
+A PriceMatrix holds one column of daily closes (Adj Close where available)
+per ticker on the union of their trading dates, with NaN where a ticker had
+no bar (different exchange holidays, shorter listings). aligned() forward-
+fills those gaps and trims to the dates every ticker covers; risk() then
+computes, vectorized over that matrix:
+
+  • per asset: total / annualized return, volatility, beta vs a benchmark,
+    max drawdown
+  • annualized covariance and correlation matrices
+  • portfolio: return, volatility (√wᵀΣw), Sharpe, beta, max drawdown,
+    1-day 95% historical VaR and each holding's share of the variance
+
+MatrixCache keeps recent matrices per (range, ticker set). A request for a
+set it has not seen reuses the closest cached matrix: a superset is cut down
+to the needed columns, a subset is extended with only the missing columns
+(existing columns are not reloaded or re-parsed).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from bars import Bars
+
+TRADING_DAYS = 252
+MAX_HOLDINGS = 25
+
+matrix_requests = metrics.Counter('kodbank_portfolio_matrix_total',
+                                  'Aligned price matrix lookups by outcome (hit, subset, extended, built).',
+                                  ('outcome',))
+
+
+def price_column(history: Bars) -> tuple[np.ndarray, np.ndarray]:
+    """(dates as datetime64[D], adjusted closes) of daily bars."""
+    return history.date, history.adj_close
+
+
+class PriceMatrix:
+    """Close prices: rows are dates (ascending), columns are tickers."""
+
+    def __init__(self, dates: np.ndarray, tickers: list[str], values: np.ndarray,
+                 built_at: float | None = None):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.values = values
+        self.built_at = built_at if built_at is not None else time.time()
+        self._col = {t: i for i, t in enumerate(self.tickers)}
+
+    @classmethod
+    def empty(cls) -> 'PriceMatrix':
+        return cls(np.array([], dtype='datetime64[D]'), [], np.empty((0, 0)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.dates.nbytes
+
+    def with_columns(self, columns: dict[str, tuple[np.ndarray, np.ndarray]]) -> 'PriceMatrix':
+        """
+        A new matrix with extra ticker columns ({ticker: (dates, closes)}).
+        Existing columns are copied as-is, re-indexed only if the new
+        tickers bring dates this matrix has not seen.
+        """
+        columns = {t: c for t, c in columns.items() if t not in self._col}
+        dates = self.dates
+        for new_dates, _ in columns.values():
+            dates = np.union1d(dates, new_dates)
+        values = np.full((len(dates), len(self.tickers) + len(columns)), np.nan)
+        if len(dates) == len(self.dates):
+            values[:, :len(self.tickers)] = self.values
+        elif len(self.tickers):
+            values[np.searchsorted(dates, self.dates), :len(self.tickers)] = self.values
+        for j, (new_dates, closes) in enumerate(columns.values(), start=len(self.tickers)):
+            values[np.searchsorted(dates, new_dates), j] = closes
+        # Keeps the age of the oldest column, so reused columns still expire
+        return PriceMatrix(dates, self.tickers + list(columns), values,
+                           self.built_at if self.tickers else None)
+
+    def select(self, tickers: list[str]) -> 'PriceMatrix':
+        """The given columns, in that order; rows no selected ticker has are dropped."""
+        values = self.values[:, [self._col[t] for t in tickers]]
+        keep = ~np.all(np.isnan(values), axis=1)
+        return PriceMatrix(self.dates[keep], tickers, values[keep], self.built_at)
+
+    def aligned(self) -> tuple[np.ndarray, np.ndarray]:
+        """Forward-filled (dates, values), trimmed to dates where every ticker has a price."""
+        values = self.values
+        rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        filled = values[rows, np.arange(values.shape[1])]
+        complete = ~np.isnan(filled).any(axis=1)
+        if not complete.any():
+            return self.dates[:0], filled[:0]
+        start = int(np.argmax(complete))
+        return self.dates[start:], filled[start:]
+
+
+class MatrixCache:
+    """LRU of PriceMatrix objects keyed by (range, frozenset of tickers)."""
+
+    def __init__(self, max_entries: int = 64, ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, matrix: PriceMatrix) -> bool:
+        return time.time() - matrix.built_at < self.ttl
+
+    def get(self, tickers: list[str], range_: str, load_column) -> tuple[PriceMatrix, str]:
+        """
+        Matrix with `tickers` as columns (in that order). load_column(ticker)
+        -> (dates, closes) is called only for tickers no usable cached matrix
+        has. Returns (matrix, outcome) with outcome hit / subset / extended / built.
+        """
+        wanted = frozenset(tickers)
+        superset = subset = None
+        with self._lock:
+            exact = self._entries.get((range_, wanted))
+            if exact is not None and self._fresh(exact):
+                self._entries.move_to_end((range_, wanted))
+                matrix_requests.inc('hit')
+                return exact.select(tickers), 'hit'
+            for (r, key), matrix in self._entries.items():
+                if r != range_ or not self._fresh(matrix):
+                    continue
+                if wanted < key and (superset is None or len(key) < len(superset.tickers)):
+                    superset = matrix
+                elif key < wanted and (subset is None or len(key) > len(subset.tickers)):
+                    subset = matrix
+
+        if superset is not None:
+            matrix_requests.inc('subset')
+            return superset.select(tickers), 'subset'
+
+        outcome = 'extended' if subset is not None else 'built'
+        base = subset if subset is not None else PriceMatrix.empty()
+        missing = [t for t in tickers if t not in base._col]
+        matrix = base.with_columns({t: load_column(t) for t in missing})
+        with self._lock:
+            self._entries[(range_, wanted)] = matrix
+            self._entries.move_to_end((range_, wanted))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        matrix_requests.inc(outcome)
+        return matrix.select(tickers), outcome
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(m.nbytes for m in self._entries.values())
+
+    def evict_to(self, max_bytes: int) -> int:
+        """Drop least recently used matrices until under max_bytes; returns how many."""
+        dropped = 0
+        with self._lock:
+            size = sum(m.nbytes for m in self._entries.values())
+            while self._entries and size > max_bytes:
+                size -= self._entries.popitem(last=False)[1].nbytes
+                dropped += 1
+        return dropped
+
+
+# ── Risk statistics ───────────────────────────────────────────────────────────
+
+def _max_drawdown(returns: np.ndarray) -> np.ndarray:
+    """Max drawdown of the equity curve of each column of `returns`."""
+    equity = np.cumprod(1 + returns, axis=0)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=0)
+    return (equity / peak - 1).min(axis=0)
+
+
+def risk(matrix: PriceMatrix, holdings: list[str], weights: list[float],
+         benchmark: str | None = None, risk_free: float = 0.0) -> dict:
+    """
+    Risk statistics for `holdings` with the given weights (normalized here).
+    The holdings and `benchmark` must all be columns of `matrix`.
+    """
+    dates, prices = matrix.aligned()
+    if len(dates) < 3:
+        raise ValueError('Not enough overlapping price history for these tickers')
+    cols = [matrix.tickers.index(t) for t in holdings]
+    returns = prices[1:] / prices[:-1] - 1
+    r = returns[:, cols]
+    w = np.asarray(weights, dtype=np.float64)
+    if len(w) != len(cols) or not np.isfinite(w).all() or (w < 0).any() or w.sum() <= 0:
+        raise ValueError('weights must be finite, non-negative and not all zero, one per holding')
+    w = w / w.sum()
+
+    cov = np.atleast_2d(np.cov(r, rowvar=False)) * TRADING_DAYS
+    vol = np.sqrt(np.diag(cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.where(np.outer(vol, vol) > 0, cov / np.outer(vol, vol), 0.0)
+    np.fill_diagonal(corr, 1.0)
+
+    port = r @ w
+    port_var = float(w @ cov @ w)
+    port_vol = np.sqrt(port_var)
+    annual = r.mean(axis=0) * TRADING_DAYS
+    port_annual = float(port.mean() * TRADING_DAYS)
+
+    beta = np.full(len(holdings), np.nan)
+    port_beta = None
+    if benchmark is not None:
+        b = returns[:, matrix.tickers.index(benchmark)]
+        b_var = b.var(ddof=1)
+        if b_var > 0:
+            beta = ((r - r.mean(axis=0)).T @ (b - b.mean())) / (len(b) - 1) / b_var
+            port_beta = float(w @ beta)
+
+    def clean(x):
+        x = float(x)
+        return None if np.isnan(x) else round(x, 6)
+
+    return {
+        'from':         str(dates[0]),
+        'to':           str(dates[-1]),
+        'observations': len(r),
+        'weights':      {t: round(float(x), 6) for t, x in zip(holdings, w)},
+        'assets': {
+            t: {
+                'total_return':  clean(prices[-1, c] / prices[0, c] - 1),
+                'annual_return': clean(annual[i]),
+                'volatility':    clean(vol[i]),
+                'beta':          clean(beta[i]),
+                'max_drawdown':  clean(dd),
+            }
+            for i, (t, c, dd) in enumerate(zip(holdings, cols, _max_drawdown(r)))
+        },
+        'portfolio': {
+            'annual_return': round(port_annual, 6),
+            'volatility':    round(port_vol, 6),
+            'sharpe':        round((port_annual - risk_free) / port_vol, 6) if port_vol > 0 else None,
+            'beta':          round(port_beta, 6) if port_beta is not None else None,
+            'max_drawdown':  round(float(_max_drawdown(port[:, None])[0]), 6),
+            'var_95_1d':     round(float(-np.percentile(port, 5)), 6),
+            'risk_contribution': {t: round(float(x), 6) for t, x in
+                                  zip(holdings, w * (cov @ w) / port_var if port_var > 0 else w * 0)},
+        },
+        'covariance':  {'tickers': holdings, 'matrix': np.round(cov, 8).tolist()},
+        'correlation': {'tickers': holdings, 'matrix': np.round(corr, 6).tolist()},
+    }
@@ -0,0 +1,173 @@
+"""
+profiler.py — Opt-in sampling profiler for KodBank request handlers.
+
+Off by default: unless PROFILE_SAMPLE_RATE or PROFILE_TOKEN is set, init_app()
+installs no hooks, so normal requests pay nothing.
+
+When enabled, a request is profiled if
+  • it is the N-th request (1-in-PROFILE_SAMPLE_RATE), or
+  • it carries `X-Profile: <PROFILE_TOKEN>`.
+
+A profiled request registers its thread with one shared sampler thread,
+which reads sys._current_frames() every PROFILE_INTERVAL_MS and counts the
+stack of each registered thread. On teardown the counts are merged into a
+per-route collapsed-stack file (flamegraph.pl / speedscope import format)
+under PROFILE_DIR, which admins can list and download from
+/debug/profiles.
+"""
+
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+
+import logs
+
+log = logs.get_logger('profiler')
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+_write_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """One background thread sampling the stacks of registered threads."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._targets: dict[int, dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()   # set while any thread is registered
+        self._thread = None
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='kodbank-profiler', daemon=True)
+            self._thread.start()
+
+    def start(self, thread_id: int):
+        with self._lock:
+            self._targets[thread_id] = {}
+            self._active.set()
+            self._ensure_running()
+
+    def stop(self, thread_id: int) -> dict[str, int]:
+        with self._lock:
+            counts = self._targets.pop(thread_id, {})
+            if not self._targets:
+                self._active.clear()
+            return counts
+
+    def _run(self):
+        while True:
+            self._active.wait()   # idle (no wake-ups) while nothing is profiled
+            time.sleep(self.interval)
+            with self._lock:
+                frames = sys._current_frames()
+                for thread_id, counts in self._targets.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if stack:
+                        key = ';'.join(reversed(stack))
+                        counts[key] = counts.get(key, 0) + 1
+
+
+def _route_filename(route: str) -> str:
+    return (re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root') + '.collapsed'
+
+
+def _write_collapsed(route: str, counts: dict[str, int]):
+    """Merge `counts` into the route's collapsed-stack file ("stack count" lines)."""
+    with _write_lock:
+        _merge_into(os.path.join(PROFILE_DIR, _route_filename(route)), counts)
+
+
+def _merge_into(path: str, counts: dict[str, int]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    merged: dict[str, int] = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                stack, _, n = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    merged[stack] = merged.get(stack, 0) + int(n)
+    for stack, n in counts.items():
+        merged[stack] = merged.get(stack, 0) + n
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for stack, n in sorted(merged.items()):
+            f.write(f"{stack} {n}\n")
+    os.replace(tmp, path)
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(PROFILE_DIR)):
+        if name.endswith('.collapsed'):
+            st = os.stat(os.path.join(PROFILE_DIR, name))
+            out.append({'name': name, 'bytes': st.st_size, 'modified': round(st.st_mtime, 3)})
+    return out
+
+
+def init_app(app):
+    """Install profiling hooks and /debug/profiles routes if profiling is configured."""
+    sample_rate = int(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0)
+    token = os.environ.get('PROFILE_TOKEN')
+    if not sample_rate and not token:
+        return
+
+    from flask import g, jsonify, request, send_from_directory, session
+
+    sampler = StackSampler(interval=float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000)
+    counter = itertools.count(1)
+
+    @app.before_request
+    def _profile_start():
+        by_header = bool(token) and request.headers.get('X-Profile') == token
+        by_rate = bool(sample_rate) and next(counter) % sample_rate == 0
+        if by_header or by_rate:
+            g._profile_thread = threading.get_ident()
+            sampler.start(g._profile_thread)
+
+    @app.teardown_request
+    def _profile_stop(exc):
+        thread_id = g.pop('_profile_thread', None)
+        if thread_id is None:
+            return
+        counts = sampler.stop(thread_id)
+        if counts:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            try:
+                _write_collapsed(route, counts)
+            except OSError as e:
+                log.warning('could not write profile', extra={'route': route, 'error': str(e)})
+
+    def _is_admin() -> bool:
+        return session.get('role') == 'admin'
+
+    @app.route('/debug/profiles')
+    def list_profiles_endpoint():
+        if not _is_admin():
+            return jsonify({'message': 'Forbidden'}), 403
+        return jsonify({'profiles': list_profiles()}), 200
+
+    @app.route('/debug/profiles/<name>')
+    def download_profile(name):
+        if not _is_admin():
+            return jsonify({'message': 'Forbidden'}), 403
+        if name not in {p['name'] for p in list_profiles()}:
+            return jsonify({'message': 'Profile not found'}), 404
+        return send_from_directory(PROFILE_DIR, name, mimetype='text/plain', as_attachment=True)
+
+    log.info('profiler enabled', extra={'sample_rate': sample_rate, 'header': bool(token)})
@@ -0,0 +1,251 @@
+"""
+quotes.py — Live quote fan-out for the analytics view.
+
+A QuoteHub keeps one QuoteFeed per actively watched ticker, shared by every
+SSE subscriber in this process:
+
+    sub = quote_hub.subscribe('TCS.NS')      # may raise HubFull
+    try:
+        for event in sub.events():           # None = heartbeat
+            ...
+    finally:
+        sub.close()
+
+  • one poller thread per ticker (every QUOTE_POLL_INTERVAL seconds) no
+    matter how many clients watch it; it stops when the last one leaves
+  • the feed loads the daily history once into an IndicatorState
+    (indicators.py), then revises its latest bar (or appends the next
+    session's bar) from a small upstream request — O(1) per update
+  • subscribers get a snapshot first, then only the bar fields and
+    statistics that changed
+  • each subscriber has a bounded queue; one that falls behind is resynced
+    with a fresh snapshot instead of blocking the poller
+
+Feeds are per process: with several gunicorn workers each worker polls the
+tickers its own clients watch.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import logs
+import metrics
+import resilience
+from indicators import IndicatorState
+
+log = logs.get_logger('quotes')
+
+POLL_INTERVAL = float(os.environ.get('QUOTE_POLL_INTERVAL', '5'))
+MAX_TICKERS = int(os.environ.get('QUOTE_MAX_TICKERS', '50'))
+# Streams end after this many seconds (below gunicorn's --timeout); the
+# browser's EventSource reconnects and gets a fresh snapshot
+STREAM_MAX_AGE = float(os.environ.get('QUOTE_STREAM_MAX_AGE', '90'))
+# Events buffered per subscriber before it is resynced with a snapshot
+SUBSCRIBER_QUEUE = 32
+
+active_feeds = metrics.Gauge('kodbank_quote_feeds', 'Tickers with a live upstream poller.')
+active_subscribers = metrics.Gauge('kodbank_quote_subscribers', 'Open live quote streams.')
+polls = metrics.Counter('kodbank_quote_polls_total', 'Live quote polls by outcome.', ('outcome',))
+
+
+class HubFull(RuntimeError):
+    """Raised when QUOTE_MAX_TICKERS tickers are already being polled."""
+
+
+def _changed(old: dict | None, new: dict) -> dict:
+    """Keys of `new` whose values differ from `old`."""
+    if old is None:
+        return dict(new)
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+class Subscription:
+    """One client's view of a feed: a bounded queue of events."""
+
+    def __init__(self, hub: 'QuoteHub', feed: 'QuoteFeed'):
+        self.hub = hub
+        self.feed = feed
+        self.closed = False
+        self._queue: queue.Queue = queue.Queue(SUBSCRIBER_QUEUE)
+
+    def push(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Deltas are useless once one is lost: replace the backlog
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(self.feed.snapshot())
+
+    def events(self, heartbeat: float = 15.0, max_age: float | None = None):
+        """
+        Yield events as they arrive; None after `heartbeat` seconds of silence.
+        Stops after `max_age` seconds if given.
+        """
+        deadline = time.monotonic() + max_age if max_age is not None else None
+        while not self.closed:
+            wait = heartbeat
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return
+            try:
+                yield self._queue.get(timeout=wait)
+            except queue.Empty:
+                yield None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._leave(self)
+
+
+class QuoteFeed:
+    """Latest daily bar and statistics for one ticker, kept fresh by a poller."""
+
+    def __init__(self, hub: 'QuoteHub', ticker: str):
+        self.hub = hub
+        self.ticker = ticker
+        self.state: IndicatorState | None = None
+        self.bar: dict | None = None
+        self.statistics: dict | None = None
+        self.updated_at: float | None = None
+        self.subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'kodbank-quotes-{ticker}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self) -> dict | None:
+        if self.bar is None:
+            return None
+        return {'type': 'snapshot', 'ticker': self.ticker, 'bar': self.bar,
+                'statistics': self.statistics, 'ts': round(self.updated_at, 3)}
+
+    def add(self, sub: Subscription):
+        with self._lock:
+            self.subscribers.add(sub)
+            snapshot = self.snapshot()
+            if snapshot is not None:
+                sub.push(snapshot)
+
+    def remove(self, sub: Subscription) -> int:
+        with self._lock:
+            self.subscribers.discard(sub)
+            return len(self.subscribers)
+
+    def _publish(self, bar: dict, statistics: dict, event: dict):
+        with self._lock:
+            self.bar, self.statistics = bar, statistics
+            self.updated_at = time.time()
+            event['ts'] = round(self.updated_at, 3)
+            for sub in self.subscribers:
+                sub.push(event)
+
+    def _status(self, status: str, **data):
+        with self._lock:
+            for sub in self.subscribers:
+                sub.push({'type': 'status', 'ticker': self.ticker, 'status': status, **data})
+
+    def _load(self):
+        history = self.hub.load(self.ticker)
+        if not history:
+            raise RuntimeError(f'No historical data found for {self.ticker}')
+        self.state = IndicatorState.from_history(history)
+        statistics = self.state.statistics()
+        self._publish(history[-1], statistics, {'type': 'snapshot', 'ticker': self.ticker,
+                                                'bar': history[-1], 'statistics': statistics})
+
+    def _poll(self):
+        bar = self.hub.poll(self.ticker)
+        last = self.bar
+        if bar is None or bar['Date'] < last['Date']:
+            return
+        delta = _changed(last, bar) if bar['Date'] == last['Date'] else dict(bar)
+        if not delta or not self.state.update(bar):
+            return
+        statistics = self.state.statistics()
+        self._publish(bar, statistics, {
+            'type':       'quote',
+            'ticker':     self.ticker,
+            'date':       bar['Date'],
+            'new_bar':    bar['Date'] != last['Date'],
+            'bar':        delta,
+            'statistics': _changed(self.statistics, statistics),
+        })
+
+    def _run(self):
+        wait = 0.0
+        while not self._stop.wait(wait):
+            wait = self.hub.interval
+            try:
+                if self.state is None:
+                    self._load()
+                else:
+                    self._poll()
+                polls.inc('ok')
+            except resilience.UpstreamUnavailable as e:
+                polls.inc('unavailable')
+                wait = max(wait, e.retry_after or 0)
+                self._status('delayed', reason=e.reason, retry_in=round(wait, 1))
+            except Exception as e:
+                polls.inc('error')
+                log.warning('quote poll failed', extra={'ticker': self.ticker, 'error': str(e)})
+                self._status('delayed', reason='error', retry_in=round(wait, 1))
+
+
+class QuoteHub:
+    """
+    Registry of live feeds. `load(ticker)` returns the daily history and
+    `poll(ticker)` the latest daily bar (or None).
+    """
+
+    def __init__(self, load, poll, interval: float = POLL_INTERVAL, max_tickers: int = MAX_TICKERS):
+        self.load = load
+        self.poll = poll
+        self.interval = interval
+        self.max_tickers = max_tickers
+        self._feeds: dict[str, QuoteFeed] = {}
+        self._subscribers = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, ticker: str) -> Subscription:
+        with self._lock:
+            feed = self._feeds.get(ticker)
+            if feed is None:
+                if len(self._feeds) >= self.max_tickers:
+                    raise HubFull(f'Live quotes are limited to {self.max_tickers} tickers; try again later.')
+                feed = self._feeds[ticker] = QuoteFeed(self, ticker)
+                feed.start()
+            sub = Subscription(self, feed)
+            feed.add(sub)
+            self._subscribers += 1
+            self._update_gauges()
+        return sub
+
+    def _leave(self, sub: Subscription):
+        with self._lock:
+            self._subscribers -= 1
+            if sub.feed.remove(sub) == 0 and self._feeds.get(sub.feed.ticker) is sub.feed:
+                sub.feed.stop()
+                del self._feeds[sub.feed.ticker]
+            self._update_gauges()
+
+    def _update_gauges(self):
+        active_feeds.set(value=len(self._feeds))
+        active_subscribers.set(value=self._subscribers)
+
+    def tickers(self) -> dict[str, int]:
+        """Watched tickers and their subscriber counts."""
+        with self._lock:
+            return {t: len(f.subscribers) for t, f in self._feeds.items()}
@@ -1,17 +1,23 @@
 """
-rag.py — Lightweight TF-IDF RAG retriever for KodBank chatbot.
+rag.py — Lightweight hybrid (TF-IDF + BM25) RAG retriever for KodBank chatbot.
 
 Knowledge sources:
-  1. User guide (user_guide.md) — chunked by section at startup
+  1. User guide (user_guide.md) — chunked by section on first use
   2. Live news — injected via add_news_chunks() called from app.py
 """
 
+import hashlib
+import json
+import math
 import os
 import re
 import threading
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+import time
+from collections import Counter
+
+import logs
+
+log = logs.get_logger('rag')
 
 # ── Paths ─────────────────────────────────────────────────────────────────────
 _GUIDE_PATH = os.path.join(os.path.dirname(__file__), '..', '.gemini',
@@ -19,6 +25,14 @@ _GUIDE_PATH = os.path.join(os.path.dirname(__file__), '..', '.gemini',
                            '59fe8601-032a-4370-8e84-e6a9fb780bd3',
                            'user_guide.md')
 
+# Prebuilt index artifact (see build_rag_index.py). Bump ARTIFACT_VERSION
+# whenever the serialized layout or the vectorizer settings change.
+ARTIFACT_VERSION = 2
+_ARTIFACT_BASE = os.environ.get(
+    'RAG_INDEX_PATH',
+    os.path.join(os.path.dirname(__file__), 'rag_index', 'guide_index'),
+)
+
 # Fallback inline guide if the file path doesn't resolve (e.g. on Vercel)
 _INLINE_GUIDE = """
 # KodBank User Guide
@@ -53,42 +67,272 @@ US Markets: AAPL, NVDA, TSLA, MSFT, GOOGL, META, AMZN, and major NASDAQ/NYSE sto
 """
 
 
+# ── Tokenization ──────────────────────────────────────────────────────────────
+
+# Same analyzer as sklearn's TfidfVectorizer defaults, so query vectors can be
+# built without importing scikit-learn (only fitting needs it).
+_TFIDF_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+# Lexical tokens keep terms like 'fy2024-25', 'note 42' and 'ebitda' intact
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+
+def _tokenize(text: str, stop_words: frozenset) -> list[str]:
+    """Lowercase BM25 tokens with stop words removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in stop_words]
+
+
+def _tfidf_terms(text: str, stop_words: frozenset) -> list[str]:
+    """Unigrams + bigrams exactly as TfidfVectorizer(ngram_range=(1, 2)) emits them."""
+    tokens = [t for t in _TFIDF_TOKEN_RE.findall(text.lower()) if t not in stop_words]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+# ── Lexical (BM25) index ──────────────────────────────────────────────────────
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index stored as flat arrays: the postings of
+    term t are docs[indptr[t]:indptr[t + 1]] with matching term frequencies.
+    Flat arrays can be saved, loaded and shared between processes as-is.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms: dict[str, int] = {}
+        self._arrays: dict | None = None   # indptr, docs, tfs, doc_len
+        self._stop_words: frozenset = frozenset()
+
+    def fit(self, chunks: list[str], stop_words: frozenset = frozenset()):
+        import numpy as np
+
+        postings: dict[str, list[tuple[int, int]]] = {}
+        doc_len = []
+        for idx, chunk in enumerate(chunks):
+            tokens = _tokenize(chunk, stop_words)
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((idx, tf))
+        terms, indptr, docs, tfs = {}, [0], [], []
+        for row, (term, plist) in enumerate(postings.items()):
+            terms[term] = row
+            docs.extend(i for i, _ in plist)
+            tfs.extend(tf for _, tf in plist)
+            indptr.append(len(docs))
+        self._terms = terms
+        self._arrays = {
+            'indptr':  np.asarray(indptr, dtype=np.int64),
+            'docs':    np.asarray(docs, dtype=np.int32),
+            'tfs':     np.asarray(tfs, dtype=np.int32),
+            'doc_len': np.asarray(doc_len, dtype=np.int32),
+        }
+        self._stop_words = stop_words
+
+    def export_state(self) -> tuple[dict, dict]:
+        return ({f'bm25_{k}': v for k, v in self._arrays.items()},
+                {'bm25_terms': dict(self._terms)})
+
+    def load_state(self, arrays, meta: dict, stop_words: frozenset):
+        self._terms = meta['bm25_terms']
+        self._arrays = {k: arrays[f'bm25_{k}'] for k in ('indptr', 'docs', 'tfs', 'doc_len')}
+        self._stop_words = stop_words
+
+    def scores(self, query: str):
+        """BM25 score of every chunk for `query` (float64 array)."""
+        import numpy as np
+
+        a = self._arrays
+        if a is None or not len(a['doc_len']):
+            return np.zeros(0)
+        n_docs = len(a['doc_len'])
+        avgdl = float(a['doc_len'].mean()) or 1.0
+        scores = np.zeros(n_docs, dtype=np.float64)
+        for term in set(_tokenize(query, self._stop_words)):
+            row = self._terms.get(term)
+            if row is None:
+                continue
+            start, end = a['indptr'][row], a['indptr'][row + 1]
+            docs, tf = a['docs'][start:end], a['tfs'][start:end]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * a['doc_len'][docs] / avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int) -> list[int]:
+        """Return up to top_k chunk indices ranked by BM25 score (score > 0 only)."""
+        import numpy as np
+
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        ranked = hits[np.argsort(-scores[hits], kind='stable')]
+        return [int(i) for i in ranked[:top_k]]
+
+
+def _reciprocal_rank_fusion(rankings: list[list[int]], k: int = 60) -> list[int]:
+    """Fuse several ranked lists of chunk indices: score = sum(1 / (k + rank))."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking, start=1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (k + rank)
+    return [idx for idx, _ in sorted(fused.items(), key=lambda kv: kv[1], reverse=True)]
+
+
 class RAGRetriever:
-    """TF-IDF based retriever over text chunks."""
+    """
+    Hybrid retriever: TF-IDF cosine + BM25 (lexical) fused with RRF.
+
+    The TF-IDF matrix is kept as L2-normalized CSC arrays (data, indices,
+    indptr) plus the vocabulary and IDF weights. Query scoring walks only the
+    columns of the query's terms with NumPy, so a loaded index never needs
+    scikit-learn or SciPy; only fit() does.
+    """
+
+    # How many candidates each retriever contributes before fusion
+    CANDIDATES = 10
 
     def __init__(self):
         self._lock = threading.Lock()
         self._chunks: list[str] = []
-        self._vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
-        self._matrix = None
+        self._vocab: dict[str, int] = {}
+        self._stop_words: frozenset = frozenset()
+        self._arrays: dict | None = None   # data, indices, indptr, shape, idf
+        self._bm25 = BM25Index()
+        # Identifies the indexed content; refresh_news() skips refits that keep it
+        self.chunks_hash = _chunks_digest([])
+
+    def _index(self):
+        """(Re)build both indexes from self._chunks. Caller holds the lock."""
+        # scikit-learn is imported on first fit, not at module import
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
+        matrix = vectorizer.fit_transform(self._chunks).tocsc()
+        matrix.sort_indices()
+        self._vocab = {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+        self._stop_words = frozenset(vectorizer.get_stop_words() or ())
+        self._arrays = {
+            'data':    matrix.data,
+            'indices': matrix.indices,
+            'indptr':  matrix.indptr,
+            'shape':   _int_array(matrix.shape),
+            'idf':     vectorizer.idf_,
+        }
+        self._bm25.fit(self._chunks, self._stop_words)
+
+    def export_state(self) -> tuple[dict, dict]:
+        """
+        Return (arrays, meta) describing the fitted index: the CSC parts of the
+        L2-normalized TF-IDF matrix, IDF weights and BM25 postings as arrays,
+        plus the vocabularies, stop words and chunk texts as JSON-serializable
+        metadata.
+        """
+        with self._lock:
+            if self._arrays is None:
+                raise RuntimeError("Retriever is not fitted.")
+            bm25_arrays, bm25_meta = self._bm25.export_state()
+            meta = {
+                'vocabulary': dict(self._vocab),
+                'stop_words': sorted(self._stop_words),
+                'chunks':     list(self._chunks),
+                'chunks_hash': self.chunks_hash,
+                **bm25_meta,
+            }
+            return {**self._arrays, **bm25_arrays}, meta
+
+    def load_state(self, arrays, meta: dict):
+        """
+        Restore a fitted index from export_state() output without refitting.
+        Arrays are used as given (no copy), so they may be views into a mmap;
+        likewise the chunks and vocabularies may be read-only sequence and
+        mapping views (shared_index.StringTable / StringMap).
+        """
+        stop_words = frozenset(meta['stop_words'])
+        bm25 = BM25Index()
+        bm25.load_state(arrays, meta, stop_words)
+        with self._lock:
+            self._chunks = meta['chunks']
+            self.chunks_hash = meta.get('chunks_hash') or _chunks_digest(meta['chunks'])
+            self._vocab = meta['vocabulary']
+            self._stop_words = stop_words
+            self._arrays = {k: arrays[k] for k in ('data', 'indices', 'indptr', 'shape', 'idf')}
+            self._bm25 = bm25
+
+    def size_bytes(self) -> int:
+        """Estimated bytes held: index arrays (own or mapped) plus chunk text."""
+        with self._lock:
+            arrays = dict(self._arrays or {})
+            if self._bm25._arrays:
+                arrays.update(self._bm25._arrays)
+            chunks = self._chunks
+            text = sum(len(c) for c in chunks) if isinstance(chunks, list) else chunks.nbytes
+            return sum(a.nbytes for a in arrays.values()) + text
 
     def fit(self, chunks: list[str]):
-        """Fit the vectorizer on a list of text chunks."""
+        """Fit the vectorizer and BM25 index on a list of text chunks."""
         with self._lock:
             self._chunks = [c.strip() for c in chunks if c.strip()]
+            self.chunks_hash = _chunks_digest(self._chunks)
             if not self._chunks:
                 return
-            self._matrix = self._vectorizer.fit_transform(self._chunks)
+            self._index()
 
     def add_chunks(self, new_chunks: list[str]):
         """Append new chunks and refit (used for news refresh)."""
         with self._lock:
-            combined = self._chunks + [c.strip() for c in new_chunks if c.strip()]
+            combined = list(self._chunks) + [c.strip() for c in new_chunks if c.strip()]
             self._chunks = combined
+            self.chunks_hash = _chunks_digest(combined)
             if self._chunks:
-                self._matrix = self._vectorizer.fit_transform(self._chunks)
-
-    def retrieve(self, query: str, top_k: int = 3) -> list[str]:
-        """Return top_k most relevant chunks for the query."""
+                self._index()
+
+    def _dense_scores(self, query: str):
+        """Cosine similarity of the query against every chunk (both sides L2-normalized)."""
+        import numpy as np
+
+        a = self._arrays
+        scores = np.zeros(int(a['shape'][0]), dtype=np.float64)
+        weights = {}
+        for term, tf in Counter(_tfidf_terms(query, self._stop_words)).items():
+            col = self._vocab.get(term)
+            if col is not None:
+                weights[col] = tf * float(a['idf'][col])
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return scores
+        for col, w in weights.items():
+            start, end = a['indptr'][col], a['indptr'][col + 1]
+            scores[a['indices'][start:end]] += a['data'][start:end] * (w / norm)
+        return scores
+
+    def retrieve(self, query: str, top_k: int = 3, timings: dict | None = None) -> list[str]:
+        """
+        Return top_k most relevant chunks for the query.
+        If `timings` is given, per-stage durations (ms) are written into it.
+        """
         with self._lock:
-            if self._matrix is None or not self._chunks:
+            if self._arrays is None or not self._chunks:
                 return []
             try:
-                q_vec = self._vectorizer.transform([query])
-                scores = cosine_similarity(q_vec, self._matrix).flatten()
-                top_indices = np.argsort(scores)[::-1][:top_k]
-                # Only return chunks with non-zero similarity
-                return [self._chunks[i] for i in top_indices if scores[i] > 0.01]
+                import numpy as np
+
+                t0 = time.perf_counter()
+                scores = self._dense_scores(query)
+                top_indices = np.argsort(scores)[::-1][:self.CANDIDATES]
+                # Only keep chunks with non-zero similarity
+                dense = [int(i) for i in top_indices if scores[i] > 0.01]
+                t1 = time.perf_counter()
+                lexical = self._bm25.search(query, self.CANDIDATES)
+                t2 = time.perf_counter()
+                fused = _reciprocal_rank_fusion([dense, lexical])[:top_k]
+                t3 = time.perf_counter()
+                if timings is not None:
+                    timings.update({
+                        'dense_ms':   round((t1 - t0) * 1000, 3),
+                        'lexical_ms': round((t2 - t1) * 1000, 3),
+                        'fusion_ms':  round((t3 - t2) * 1000, 3),
+                    })
+                return [self._chunks[i] for i in fused]
             except Exception:
                 return []
 
@@ -132,6 +376,62 @@ def _chunk_guide(text: str) -> list[str]:
     return chunks
 
 
+# ── Index artifact ────────────────────────────────────────────────────────────
+
+def _int_array(values):
+    import numpy as np
+    return np.asarray(values, dtype=np.int64)
+
+
+def _chunks_digest(chunks) -> str:
+    """Short content hash of an indexed chunk list (see RAGRetriever.chunks_hash)."""
+    return hashlib.sha256('\0'.join(chunks).encode('utf-8')).hexdigest()[:16]
+
+
+def guide_hash(text: str) -> str:
+    """Content hash that decides whether a saved artifact is still valid."""
+    h = hashlib.sha256()
+    h.update(f"v{ARTIFACT_VERSION}\n".encode())
+    h.update(text.encode('utf-8'))
+    return h.hexdigest()
+
+
+def save_artifact(rag: 'RAGRetriever', content_hash: str, base: str = _ARTIFACT_BASE):
+    """
+    Write <base>.npz (uncompressed arrays) and <base>.json (version, hash,
+    vocabulary, chunks). Files are written to temp names and renamed so a
+    concurrently starting worker never reads a half-written artifact.
+    """
+    import numpy as np
+
+    arrays, meta = rag.export_state()
+    meta = {'version': ARTIFACT_VERSION, 'guide_hash': content_hash, **meta}
+    os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+    tmp_npz, tmp_json = f"{base}.{os.getpid()}.tmp.npz", f"{base}.{os.getpid()}.tmp.json"
+    np.savez(tmp_npz, **arrays)
+    with open(tmp_json, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    # Arrays first: the JSON (which carries the hash) only appears once they match
+    os.replace(tmp_npz, base + '.npz')
+    os.replace(tmp_json, base + '.json')
+
+
+def load_artifact(rag: 'RAGRetriever', content_hash: str, base: str = _ARTIFACT_BASE) -> bool:
+    """Load a saved artifact into `rag` if it matches this version and hash."""
+    import numpy as np
+
+    try:
+        with open(base + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != ARTIFACT_VERSION or meta.get('guide_hash') != content_hash:
+            return False
+        with np.load(base + '.npz') as arrays:
+            rag.load_state({k: arrays[k] for k in arrays.files}, meta)
+        return True
+    except (OSError, ValueError, KeyError):
+        return False
+
+
 # ── News chunking ──────────────────────────────────────────────────────────────
 
 def news_articles_to_chunks(articles: list[dict]) -> list[str]:
@@ -150,42 +450,179 @@ def news_articles_to_chunks(articles: list[dict]) -> list[str]:
 
 # Singleton retriever
 retriever = RAGRetriever()
+_build_lock = threading.Lock()
+_built = False
+
+# Shared-index mode (several gunicorn workers): set RAG_SHARED_INDEX to a file
+# path. One worker at a time fits and publishes the index there (see
+# shared_index.py); every worker maps it read-only and remaps on new versions.
+_SHARED_PATH = os.environ.get('RAG_SHARED_INDEX')
+_shared_segment = None
+_sync_lock = threading.Lock()
+
+
+def _load_guide_index(target: RAGRetriever, guide_text: str, content_hash: str):
+    """Fill `target` from the prebuilt artifact, or fit it and save an artifact."""
+    t0 = time.perf_counter()
+    if load_artifact(target, content_hash):
+        log.info('knowledge base loaded from artifact',
+                 extra={'ms': round((time.perf_counter() - t0) * 1000, 1)})
+        return
+    chunks = _chunk_guide(guide_text)
+    target.fit(chunks)
+    log.info('knowledge base built', extra={'guide_chunks': len(chunks)})
+    try:
+        save_artifact(target, content_hash)
+    except Exception as e:
+        log.warning('could not write index artifact', extra={'error': str(e)})
+
+
+def _sync_shared(force: bool = False) -> bool:
+    """Map the latest published shared segment into `retriever` if it changed."""
+    import shared_index
+
+    # Request threads call this concurrently: remap and load as one step so a
+    # slower thread never loads an older generation over a newer one
+    with _sync_lock:
+        if not _shared_segment.poll() and not force:
+            return False
+        arrays = _shared_segment.arrays
+        retriever.load_state(arrays, {
+            **_shared_segment.meta,
+            'chunks':     shared_index.StringTable(arrays, 'chunks'),
+            'vocabulary': shared_index.StringMap(arrays, 'vocabulary'),
+            'bm25_terms': shared_index.StringMap(arrays, 'bm25_terms'),
+        })
+    log.info('mapped shared index', extra={'generation': _shared_segment.generation,
+                                           'mapped_bytes': _shared_segment.mapped_bytes})
+    return True
+
+
+def _publish_shared(source: RAGRetriever, content_hash: str):
+    """Publish `source` as a new shared segment. Caller holds publisher_lock."""
+    import shared_index
+
+    arrays, meta = source.export_state()
+    arrays.update(shared_index.pack_strings('chunks', meta.pop('chunks')))
+    arrays.update(shared_index.pack_mapping('vocabulary', meta.pop('vocabulary')))
+    arrays.update(shared_index.pack_mapping('bm25_terms', meta.pop('bm25_terms')))
+    shared_index.publish(_SHARED_PATH, arrays, {'guide_hash': content_hash, **meta})
 
 
 def build_knowledge_base() -> RAGRetriever:
     """
-    Load the user guide, chunk it, and fit the retriever.
-    Called once at Flask startup.
+    Load the user guide index. Uses the prebuilt artifact when its content
+    hash matches the current guide; otherwise chunks the guide, fits the
+    retriever and (best effort) writes a fresh artifact for the next process.
+    In shared mode the first worker publishes the segment and the others map it.
+    Called lazily by get_context() on the first chat request.
     Returns the retriever so tests can call retrieve() on it directly.
     """
+    global _built, _shared_segment
     guide_text = _load_guide_text()
-    chunks = _chunk_guide(guide_text)
-    retriever.fit(chunks)
-    print(f"[RAG] Knowledge base built: {len(chunks)} guide chunks loaded.")
+    content_hash = guide_hash(guide_text)
+    if not _SHARED_PATH:
+        _load_guide_index(retriever, guide_text, content_hash)
+        _built = True
+        return retriever
+
+    import shared_index
+
+    _shared_segment = shared_index.SharedSegment(_SHARED_PATH)
+    with shared_index.publisher_lock(_SHARED_PATH):
+        # Reuse whatever is published (guide + latest news) if the guide matches
+        if not (_shared_segment.poll() and _shared_segment.meta.get('guide_hash') == content_hash):
+            scratch = RAGRetriever()
+            _load_guide_index(scratch, guide_text, content_hash)
+            _publish_shared(scratch, content_hash)
+    _sync_shared(force=True)
+    _built = True
     return retriever
 
 
-def refresh_news(articles: list[dict]):
+def ensure_knowledge_base():
+    """Build the knowledge base once per process, on first use."""
+    if not _built:
+        with _build_lock:
+            if not _built:
+                build_knowledge_base()
+
+
+def refresh_news(articles: list[dict], progress=None) -> dict:
     """
-    Called from app.py after a news fetch to add fresh articles into the retriever.
-    Re-fits only the news portion by rebuilding from scratch.
+    Called from app.py (as a background job) after a news fetch to add fresh
+    articles into the retriever. Re-fits only the news portion by rebuilding
+    from scratch, and not at all when the chunks match the current index.
+    `progress(stage, **counts)` is called after each stage. In shared mode
+    the refit is published once for all workers.
     """
+    global _built
     # Re-load guide chunks first so we don't lose them
     guide_text = _load_guide_text()
     guide_chunks = _chunk_guide(guide_text)
     news_chunks = news_articles_to_chunks(articles)
     all_chunks = guide_chunks + news_chunks
-    retriever.fit(all_chunks)
-    print(f"[RAG] Refreshed with {len(news_chunks)} news chunks. Total: {len(all_chunks)}.")
+    if progress:
+        progress('chunked', articles=len(articles), chunks=len(all_chunks))
+    if _SHARED_PATH:
+        ensure_knowledge_base()
+        _sync_shared()
+    if _built and retriever.chunks_hash == _chunks_digest([c.strip() for c in all_chunks if c.strip()]):
+        log.info('news unchanged', extra={'news_chunks': len(news_chunks)})
+        return {'news_chunks': len(news_chunks), 'total_chunks': len(all_chunks), 'unchanged': True}
+    if _SHARED_PATH:
+        import shared_index
+
+        scratch = RAGRetriever()
+        scratch.fit(all_chunks)
+        with shared_index.publisher_lock(_SHARED_PATH):
+            _publish_shared(scratch, guide_hash(guide_text))
+        _sync_shared()
+    else:
+        retriever.fit(all_chunks)
+        _built = True
+    if progress:
+        progress('indexed', chunks=len(all_chunks))
+    log.info('refreshed news', extra={'news_chunks': len(news_chunks), 'total_chunks': len(all_chunks)})
+    return {'news_chunks': len(news_chunks), 'total_chunks': len(all_chunks)}
+
+
+def index_size_bytes() -> int:
+    """Memory accounting hook (see memory.py)."""
+    return retriever.size_bytes()
+
+
+def trim_to_guide(budget_bytes: int):
+    """
+    Memory-budget eviction hook: drop news chunks by reloading the guide-only
+    index. In shared mode the index is a file-backed mapping the OS can page
+    out, so there is nothing to evict per worker.
+    """
+    if _SHARED_PATH or not _built:
+        return
+    guide_text = _load_guide_text()
+    _load_guide_index(retriever, guide_text, guide_hash(guide_text))
+    log.info('trimmed to guide-only index',
+             extra={'bytes': retriever.size_bytes(), 'budget': budget_bytes})
 
 
-def get_context(query: str, top_k: int = 3) -> str:
+def get_context(query: str, top_k: int = 3, max_chars: int | None = None) -> str:
     """
     Retrieve relevant context for a user query.
     Returns a formatted string to inject into the system prompt.
+    Each chunk is cut to `max_chars` (on a word boundary) when given.
     """
-    chunks = retriever.retrieve(query, top_k=top_k)
+    ensure_knowledge_base()
+    if _shared_segment is not None:
+        _sync_shared()
+    timings: dict = {}
+    chunks = retriever.retrieve(query, top_k=top_k, timings=timings)
+    if timings:
+        log.debug('retrieve', extra=timings)
     if not chunks:
         return ""
+    if max_chars:
+        chunks = [c if len(c) <= max_chars else c[:max_chars].rsplit(' ', 1)[0] + '…'
+                  for c in chunks]
     return "\n\n---\nRelevant context from KodBank knowledge base:\n" + \
            "\n\n".join(f"• {c}" for c in chunks)
@@ -0,0 +1,327 @@
+"""
+resilience.py — Rate limiting, circuit breaking and retries for upstream calls.
+
+Each upstream (Yahoo Finance, NewsAPI, GitHub Models) gets an Upstream
+policy combining:
+
+  • TokenBucket   — client-side rate limit. A 429 halves the rate and pauses
+                    until Retry-After; successes grow it back (AIMD).
+  • Bulkhead      — cap on concurrent in-flight calls, so one slow upstream
+                    cannot occupy every worker thread.
+  • CircuitBreaker — after BREAKER_FAILURES consecutive failures calls fail
+                    fast for BREAKER_RESET_S, then one probe is let through.
+  • RetryBudget   — retries with full-jitter backoff, limited to a fraction
+                    (RETRY_BUDGET_RATIO) of recent calls so retries cannot
+                    multiply load during an outage.
+
+A call that is not attempted raises UpstreamUnavailable (a RuntimeError),
+which callers turn into a fast 502 or serve cached data instead:
+
+    resp = resilience.call('yahoo_finance', lambda: session.get(url))
+
+Streamed responses are read after call() returns, so they keep their
+bulkhead slot until the stream is done:
+
+    stream, slot = resilience.call('github_models', open_stream, hold_slot=True)
+    try:
+        for chunk in stream: ...
+    finally:
+        slot.release()
+
+State, rejections and retries are exported as kodbank_upstream_* metrics.
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+
+import metrics
+
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', '5'))
+BREAKER_RESET_S = float(os.environ.get('BREAKER_RESET_S', '30'))
+RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', '0.2'))
+BACKOFF_BASE_S = 0.2
+BACKOFF_CAP_S = 2.0
+
+breaker_state = metrics.Gauge('kodbank_upstream_breaker_state',
+                              'Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).',
+                              ('upstream',))
+rejections = metrics.Counter('kodbank_upstream_rejections_total',
+                             'Upstream calls not attempted, by reason.', ('upstream', 'reason'))
+retries = metrics.Counter('kodbank_upstream_retries_total', 'Upstream call retries.', ('upstream',))
+throttled = metrics.Counter('kodbank_upstream_throttled_total',
+                            'Responses with HTTP 429 from an upstream.', ('upstream',))
+rate_limit = metrics.Gauge('kodbank_upstream_rate_limit', 'Current client-side rate limit (req/s).',
+                           ('upstream',))
+
+
+class UpstreamUnavailable(RuntimeError):
+    """The call was not attempted (breaker open, rate limited or bulkhead full)."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float | None = None):
+        super().__init__(f'{upstream} unavailable ({reason})')
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value) -> float | None:
+    """Retry-After header (seconds or HTTP date) -> seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ── Building blocks ───────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """Token bucket whose rate adapts to throttling (multiplicative decrease)."""
+
+    def __init__(self, rate: float, burst: float, min_fraction: float = 0.1):
+        self.max_rate = rate
+        self.min_rate = rate * min_fraction
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait: float = 0.0) -> bool:
+        """Take a token, waiting up to max_wait seconds; False if none in time."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                ready_at = max(self.blocked_until, now + (1 - self.tokens) / self.rate)
+            if ready_at > deadline:
+                return False
+            time.sleep(ready_at - now)
+
+    def throttled(self, retry_after: float | None):
+        with self._lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            self._updated = now
+            self.blocked_until = max(self.blocked_until, now + (retry_after or 1 / self.rate))
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failures: int, reset_after: float):
+        self.failure_threshold = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def cancel(self):
+        """The allowed call was not made after all (e.g. rate limited)."""
+        with self._lock:
+            self._probing = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """Each call deposits `ratio` tokens (capped); each retry spends one."""
+
+    def __init__(self, ratio: float, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self.balance = cap
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.cap, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                return True
+            return False
+
+
+class Slot:
+    """A bulkhead slot held past call(); release() is idempotent."""
+
+    def __init__(self, semaphore: threading.BoundedSemaphore | None):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            semaphore, self._semaphore = self._semaphore, None
+        if semaphore is not None:
+            semaphore.release()
+
+
+# ── Upstream policy ───────────────────────────────────────────────────────────
+
+def _status_of(result_or_exc) -> int | None:
+    """HTTP status of a requests.Response or an azure HttpResponseError, if any."""
+    status = getattr(result_or_exc, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after_of(result_or_exc) -> float | None:
+    resp = getattr(result_or_exc, 'response', None) if isinstance(result_or_exc, Exception) else result_or_exc
+    headers = getattr(resp, 'headers', None) or {}
+    return parse_retry_after(headers.get('Retry-After'))
+
+
+class Upstream:
+    def __init__(self, name: str, rate: float, burst: float, concurrency: int, max_retries: int,
+                 queue_wait: float = 0.5):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_S)
+        self.budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.max_retries = max_retries
+        self.queue_wait = queue_wait
+        self._slots = threading.BoundedSemaphore(concurrency)
+        breaker_state.set(name, value=CircuitBreaker.CLOSED)
+        rate_limit.set(name, value=rate)
+
+    def _reject(self, reason: str, retry_after: float | None = None):
+        self.breaker.cancel()
+        rejections.inc(self.name, reason)
+        raise UpstreamUnavailable(self.name, reason, retry_after)
+
+    def _record(self, ok: bool):
+        self.breaker.record(ok)
+        breaker_state.set(self.name, value=self.breaker.state)
+        rate_limit.set(self.name, value=round(self.bucket.rate, 3))
+
+    def call(self, fn, hold_slot: bool = False):
+        """
+        Run fn() under this policy. fn either returns a response (requests-style,
+        with .status_code) or raises. 429 and 5xx responses count as failures and
+        are retried within budget; the last response is returned as-is.
+        With hold_slot=True a successful call returns (result, Slot) and the
+        bulkhead slot stays taken until the caller releases it.
+        """
+        if not self.breaker.allow():
+            rejections.inc(self.name, 'breaker_open')
+            raise UpstreamUnavailable(self.name, 'breaker_open', self.breaker.retry_in())
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(self.queue_wait):
+                self._reject('rate_limited', max(0.0, self.bucket.blocked_until - time.monotonic()))
+            if not self._slots.acquire(timeout=self.queue_wait):
+                self._reject('bulkhead_full')
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, e
+
+            outcome = error if error is not None else result
+            status = _status_of(outcome)
+            # Client errors (4xx other than 429) say nothing about upstream health
+            failed = (status is None and error is not None) or (status is not None
+                                                                and (status == 429 or status >= 500))
+            if not (hold_slot and not failed and error is None):
+                self._slots.release()
+            if status == 429:
+                throttled.inc(self.name)
+                self.bucket.throttled(_retry_after_of(outcome))
+            if not failed:
+                self.bucket.succeeded()
+                self._record(True)
+                if error is not None:
+                    raise error
+                return (result, Slot(self._slots)) if hold_slot else result
+
+            wait = min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt)
+            retry_after = _retry_after_of(outcome)
+            can_retry = (attempt < self.max_retries and self.breaker.state != CircuitBreaker.HALF_OPEN
+                         and (retry_after is None or retry_after <= BACKOFF_CAP_S))
+            if not can_retry or not self.budget.withdraw():
+                self._record(False)
+                if error is not None:
+                    raise error
+                return result
+            if hasattr(result, 'close'):
+                result.close()   # hand the connection back before retrying
+            attempt += 1
+            retries.inc(self.name)
+            time.sleep(retry_after if retry_after is not None else random.uniform(0, wait))
+
+
+def _env_float(name: str, key: str, default: float) -> float:
+    return float(os.environ.get(f'UPSTREAM_{name.upper()}_{key}', default))
+
+
+def _policy(name: str, rate: float, burst: float, concurrency: int, max_retries: int) -> Upstream:
+    return Upstream(name,
+                    rate=_env_float(name, 'RATE', rate),
+                    burst=_env_float(name, 'BURST', burst),
+                    concurrency=int(_env_float(name, 'CONCURRENCY', concurrency)),
+                    max_retries=int(_env_float(name, 'RETRIES', max_retries)))
+
+
+UPSTREAMS = {
+    'yahoo_finance': _policy('yahoo_finance', rate=5, burst=10, concurrency=8, max_retries=2),
+    'newsapi':       _policy('newsapi', rate=2, burst=5, concurrency=4, max_retries=1),
+    'github_models': _policy('github_models', rate=2, burst=5, concurrency=8, max_retries=1),
+}
+
+
+def call(upstream: str, fn, hold_slot: bool = False):
+    """fn() under the named upstream's policy; unknown names run unguarded."""
+    policy = UPSTREAMS.get(upstream)
+    if policy:
+        return policy.call(fn, hold_slot)
+    return (fn(), Slot(None)) if hold_slot else fn()
@@ -1,211 +1,172 @@
 """
 scraper.py — Yahoo Finance historical data scraper + technical indicator calculator
 for the NexTrade / Stock Analytics feature in KodBank.
+
+Daily bars are the only thing fetched for the analytics views; shorter ranges
+and weekly / monthly bars are derived from them locally with slice_range()
+and resample_history(). The chart JSON is decoded straight into typed arrays
+(bars.Bars) and the indicators run on those arrays.
 """
 
-import datetime
+import math
+import os
+
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+
+import http_client
+from bars import Bars
+from indicators import BB_WINDOW, EMA_SPANS, SIGNAL_SPAN, ema, rsi, summarize
+
+# Overridable so benchmarks can point at a local stand-in (bench/standins.py)
+YAHOO_CHART_URL = os.environ.get('YAHOO_CHART_URL', 'https://query1.finance.yahoo.com/v8/finance/chart')
 
 
+# User-Agent and Accept-Encoding come from the shared session (http_client.py)
 HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/114.0.0.0 Safari/537.36"
-    ),
     "Accept-Language": "en-US,en;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept": "application/json,text/plain;q=0.9,*/*;q=0.8",
 }
 
 
-def fetch_stock_history(ticker: str) -> list[dict]:
+# Chart ranges (days back from the latest bar; None = everything) and intervals
+RANGES = {'1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653, 'max': None}
+INTERVALS = ('1d', '1wk', '1mo')
+
+
+def bars_from_chart(data: dict) -> Bars:
+    """
+    Decode a Yahoo v8 chart response into Bars. Timestamps are dated in the
+    exchange's time zone (meta.gmtoffset); bars without a close are dropped.
+    """
+    result = (data.get("chart") or {}).get("result") or []
+    if not result:
+        raise ValueError("chart response has no result")
+    chart_data = result[0]
+    timestamps = np.array(chart_data.get("timestamp") or [], dtype=np.int64)
+    offset = int((chart_data.get("meta") or {}).get("gmtoffset") or 0)
+    indicators = chart_data.get("indicators", {})
+    quote = (indicators.get("quote") or [{}])[0]
+    n = len(timestamps)
+
+    def column(values):
+        return values if values is not None and len(values) == n else [None] * n
+
+    adjclose = (indicators.get("adjclose") or [{}])[0].get("adjclose")
+    return Bars.from_columns(
+        ((timestamps + offset) // 86400).astype("datetime64[D]"),
+        column(quote.get("open")), column(quote.get("high")), column(quote.get("low")),
+        column(quote.get("close")), adjclose, column(quote.get("volume")),
+    )
+
+
+def fetch_stock_history(ticker: str, range_: str = '2y', interval: str = '1d') -> Bars:
     """
-    Fetch Yahoo Finance historical data for the given ticker symbol via query API.
-    Returns a list of dicts with keys:
-        Date, Open, High, Low, Close, Adj Close, Volume
-    ordered oldest → newest.
+    Fetch Yahoo Finance historical data for the given ticker symbol via query
+    API, as Bars ordered oldest → newest (Bars.to_rows() gives the API rows:
+    Date, Open, High, Low, Close, Adj Close, Volume).
     """
-    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?range=2y&interval=1d"
+    url = f"{YAHOO_CHART_URL}/{ticker}"
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = http_client.get(url, upstream='yahoo_finance', headers=HEADERS,
+                               params={'range': range_, 'interval': interval})
         resp.raise_for_status()
     except requests.RequestException as exc:
         raise RuntimeError(f"Failed to fetch data for {ticker}: {exc}")
 
-    data = resp.json()
-    result = data.get("chart", {}).get("result", [])
-    if not result:
+    try:
+        return bars_from_chart(resp.json())
+    except ValueError:
         raise RuntimeError(f"No data found for {ticker} on Yahoo Finance.")
 
-    chart_data = result[0]
-    timestamps = chart_data.get("timestamp", [])
-    indicators = chart_data.get("indicators", {})
-    quote = indicators.get("quote", [{}])[0]
-    
-    # Optional adjclose; fallback to normal close if missing
-    adjclose_list = indicators.get("adjclose", [{}])[0].get("adjclose", quote.get("close", []))
-
-    opens = quote.get("open", [])
-    highs = quote.get("high", [])
-    lows = quote.get("low", [])
-    closes = quote.get("close", [])
-    volumes = quote.get("volume", [])
-
-    rows = []
-    for i in range(len(timestamps)):
-        if closes[i] is None:
-            continue
-            
-        dt = datetime.datetime.fromtimestamp(timestamps[i]).strftime('%Y-%m-%d')
-        rows.append({
-            "Date": dt,
-            "Open": opens[i],
-            "High": highs[i],
-            "Low": lows[i],
-            "Close": closes[i],
-            "Adj Close": adjclose_list[i] if adjclose_list and i < len(adjclose_list) else closes[i],
-            "Volume": volumes[i],
-        })
-
-    return rows
-
-
-def _clean_numeric(series: pd.Series) -> pd.Series:
-    """Strip commas and convert to float, coercing errors to NaN."""
-    return pd.to_numeric(series.astype(str).str.replace(",", "", regex=False), errors="coerce")
-
-
-def calculate_summary_statistics(history: list[dict]) -> dict:
+
+def fetch_latest_bar(ticker: str) -> dict | None:
     """
-    Accept the list from fetch_stock_history(), convert to DataFrame,
-    and return a dict containing summary stats + technical indicator values
-    and their human-readable analysis strings.
+    The most recent daily bar (today's, while the market is open), from a
+    5-day request so weekends and holidays still return the last session.
     """
-    df = pd.DataFrame(history)
+    bars = fetch_stock_history(ticker, range_='5d', interval='1d')
+    return bars.row(-1) if len(bars) else None
 
-    # Convert numeric columns
-    for col in ["Open", "High", "Low", "Close", "Adj Close"]:
-        df[col] = _clean_numeric(df[col])
-    df["Volume"] = _clean_numeric(df["Volume"])
 
-    df.dropna(subset=["Close"], inplace=True)
-    df.reset_index(drop=True, inplace=True)
+def slice_range(history: Bars, range_: str) -> Bars:
+    """Bars within `range_` of the latest bar."""
+    days = RANGES[range_]
+    if days is None or not len(history):
+        return history
+    start = np.searchsorted(history.date, history.date[-1] - days)
+    return history[start:]
 
-    close   = df["Close"]
-    price   = float(close.iloc[-1])   # latest closing price
 
-    # ── Basic summary ────────────────────────────────────────────────────────
-    first_close = float(close.iloc[0])
-    price_change   = round(price - first_close, 4)
-    percent_change = round((price_change / first_close) * 100, 4) if first_close else 0.0
+def slice_dates(history: Bars, start: str | None = None, end: str | None = None) -> Bars:
+    """Bars dated from `start` through `end` (ISO dates; either may be None)."""
+    lo = np.searchsorted(history.date, np.datetime64(start, 'D')) if start else 0
+    hi = np.searchsorted(history.date, np.datetime64(end, 'D'), side='right') if end else len(history)
+    return history[lo:hi]
 
-    # ── RSI (14-period Wilder smoothing) ─────────────────────────────────────
-    delta = close.diff()
-    gain  = delta.clip(lower=0)
-    loss  = (-delta).clip(lower=0)
 
-    avg_gain = gain.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
+def resample_history(history: Bars, interval: str) -> Bars:
+    """
+    Aggregate daily bars into weekly ('1wk', Monday-start) or monthly ('1mo')
+    OHLCV bars: first Open, max High, min Low, last Close / Adj Close, summed
+    Volume. Each bar is dated by the first trading day in its period.
+    """
+    if interval == '1d' or not len(history):
+        return history
+    dates = history.date
+    if interval == '1wk':
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        keys = (dates.astype(np.int64) + 3) // 7
+    else:
+        keys = dates.astype("datetime64[M]").astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    return history.aggregate(starts)
 
-    rs  = avg_gain / avg_loss.replace(0, float("inf"))
-    rsi_series = 100 - (100 / (1 + rs))
-    rsi_val = round(float(rsi_series.iloc[-1]), 2)
 
-    if rsi_val > 70:
-        rsi_analysis = "Asset is Overbought. Trend reversal may occur."
-    elif rsi_val < 30:
-        rsi_analysis = "Asset is Oversold. Potential buying opportunity."
-    else:
-        rsi_analysis = "RSI is Neutral."
-
-    # ── Bollinger Bands (20-period, 2 std) ───────────────────────────────────
-    bb_window = 20
-    bb_mid    = close.rolling(window=bb_window).mean()
-    bb_std    = close.rolling(window=bb_window).std()
-    bb_upper_val = round(float(bb_mid.iloc[-1] + 2 * bb_std.iloc[-1]), 4)
-    bb_lower_val = round(float(bb_mid.iloc[-1] - 2 * bb_std.iloc[-1]), 4)
-
-    if price >= bb_upper_val:
-        bb_analysis = "Price near Upper Band, suggesting overvalued."
-    elif price <= bb_lower_val:
-        bb_analysis = "Price near Lower Band, suggesting undervalued."
-    else:
-        bb_analysis = "Price within normal Bollinger Bands range."
-
-    # ── Moving Averages ───────────────────────────────────────────────────────
-    sma50  = round(float(close.rolling(window=50).mean().iloc[-1]),  4) if len(close) >= 50  else None
-    sma200 = round(float(close.rolling(window=200).mean().iloc[-1]), 4) if len(close) >= 200 else None
-    ema50  = round(float(close.ewm(span=50,  adjust=False).mean().iloc[-1]), 4)
-    ema200 = round(float(close.ewm(span=200, adjust=False).mean().iloc[-1]), 4)
-
-    if sma50 and sma200:
-        if sma50 > sma200 and price > sma50:
-            ma_analysis = "Strong Bullish Trend: Golden Cross."
-        elif sma50 < sma200 and price < sma50:
-            ma_analysis = "Strong Bearish Trend: Death Cross."
-        elif price > sma200:
-            ma_analysis = "Long-term Bullish."
-        else:
-            ma_analysis = "Long-term Bearish."
-    elif price > (sma200 or ema200):
-        ma_analysis = "Long-term Bullish."
-    else:
-        ma_analysis = "Long-term Bearish."
-
-    # ── MACD (12, 26, 9) ─────────────────────────────────────────────────────
-    ema12  = close.ewm(span=12, adjust=False).mean()
-    ema26  = close.ewm(span=26, adjust=False).mean()
-    macd   = ema12 - ema26
-    signal = macd.ewm(span=9, adjust=False).mean()
-    hist   = macd - signal
-
-    macd_val   = round(float(macd.iloc[-1]),   4)
-    signal_val = round(float(signal.iloc[-1]), 4)
-    hist_val   = round(float(hist.iloc[-1]),   4)
-
-    prev_macd   = float(macd.iloc[-2])   if len(macd)   >= 2 else macd_val
-    prev_signal = float(signal.iloc[-2]) if len(signal) >= 2 else signal_val
-
-    if prev_macd <= prev_signal and macd_val > signal_val:
-        macd_analysis = "Bullish Crossover"
-    elif prev_macd >= prev_signal and macd_val < signal_val:
-        macd_analysis = "Bearish Crossover"
-    elif macd_val > signal_val:
-        macd_analysis = "Bullish Trend"
-    elif macd_val < signal_val:
-        macd_analysis = "Bearish Trend"
-    else:
-        macd_analysis = "Neutral"
-
-    return {
-        # Summary
-        "last_close":     round(price, 4),
-        "period_high":    round(float(df["High"].max()),  4),
-        "period_low":     round(float(df["Low"].min()),   4),
-        "average_close":  round(float(close.mean()),      4),
-        "average_volume": round(float(df["Volume"].mean()), 2),
-        "price_change":    price_change,
-        "percent_change":  percent_change,
-        "total_records":   len(df),
-        # RSI
-        "rsi":          rsi_val,
-        "rsi_analysis": rsi_analysis,
-        # Bollinger Bands
-        "bb_upper":   bb_upper_val,
-        "bb_lower":   bb_lower_val,
-        "bb_analysis": bb_analysis,
-        # Moving Averages
-        "ma_50_sma":  sma50,
-        "ma_200_sma": sma200,
-        "ma_50_ema":  ema50,
-        "ma_200_ema": ema200,
-        "ma_analysis": ma_analysis,
-        # MACD
-        "macd_line":   macd_val,
-        "macd_signal": signal_val,
-        "macd_hist":   hist_val,
-        "macd_analysis": macd_analysis,
-    }
+def calculate_summary_statistics(history: Bars | list[dict]) -> dict:
+    """
+    Summary stats + technical indicator values and their human-readable
+    analysis strings (see indicators.summarize) for the latest bar, computed
+    on the price arrays. Row dicts (fetch_stock_history().to_rows() shape)
+    are accepted too. For live updates one bar at a time,
+    indicators.IndicatorState gives the same result in O(1) per bar.
+    """
+    bars = history if isinstance(history, Bars) else Bars.from_rows(history)
+    close = bars.close
+    row = close[None, :]          # the array indicators work on tickers × bars
+
+    def last(values):
+        value = float(values[-1]) if len(values) else math.nan
+        return None if math.isnan(value) else value
+
+    def window(w):
+        return close[-w:] if len(close) >= w else close[:0]
+
+    macd = ema(row, 2 / (EMA_SPANS[0] + 1))[0] - ema(row, 2 / (EMA_SPANS[1] + 1))[0]
+    signal = ema(macd[None, :], 2 / (SIGNAL_SPAN + 1))[0]
+    with np.errstate(all='ignore'):
+        high, low = np.nanmax(bars.high), np.nanmin(bars.low)
+    volume = bars.volume[bars.has_volume]
+    bb = window(BB_WINDOW)
+
+    # Short resampled series (e.g. a few monthly bars) may not fill the windows
+    return summarize({
+        "price":          float(close[-1]),
+        "first_close":    float(close[0]),
+        "period_high":    None if math.isnan(high) else float(high),
+        "period_low":     None if math.isnan(low) else float(low),
+        "average_close":  float(close.mean()),
+        "average_volume": float(volume.mean()) if len(volume) else None,
+        "total_records":  len(close),
+        "rsi":            last(rsi(row)[0]),
+        "bb_mid":         float(bb.mean()) if len(bb) else None,
+        "bb_std":         float(bb.std(ddof=1)) if len(bb) else None,
+        "sma50":          float(window(50).mean()) if len(close) >= 50 else None,
+        "sma200":         float(window(200).mean()) if len(close) >= 200 else None,
+        "ema50":          last(ema(row, 2 / 51)[0]),
+        "ema200":         last(ema(row, 2 / 201)[0]),
+        "macd":           float(macd[-1]),
+        "signal":         float(signal[-1]),
+        "prev_macd":      float(macd[-2]) if len(macd) >= 2 else None,
+        "prev_signal":    float(signal[-2]) if len(signal) >= 2 else None,
+    })
@@ -0,0 +1,428 @@
+"""
+screener.py — Market-wide screener over combined_tickers.json.
+
+A refresh job (run on jobs.manager, every SCREENER_REFRESH_INTERVAL seconds
+once an admin has started it) fetches 2y daily histories at low priority,
+computes calculate_summary_statistics() for each ticker in a
+process pool, and stores the latest values in a ScreenerTable:
+
+  • one float64 NumPy array per statistic (columnar), plus symbol, name
+    and market (NSE / US)
+  • secondary indexes — a sorted copy of each INDEXED column with its row
+    order — so `rsi < 30` is two binary searches instead of a full scan;
+    remaining filters run vectorized on the (usually small) candidate set
+
+    table.query(['rsi<30', 'price>sma200'], sort='-percent_change', limit=50)
+
+The table is shared with other workers through the response cache
+(`screener:table`); a process picks up a newer build within
+TABLE_CHECK_INTERVAL seconds. A refresh first takes the `screener:lease`
+cache key (cache.add with a TTL), so with a shared cache only one worker
+builds at a time.
+
+Fetches share Yahoo's `yahoo_finance` policy with interactive requests, so
+the screener keeps to its own smaller budget: at most FETCH_CONCURRENCY
+requests in flight (well below the policy's bulkhead) and FETCH_RATE per
+second (a share of its token bucket), leaving the rest to users.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import logs
+import metrics
+import resilience
+from cache import cache
+from bars import Bars
+
+log = logs.get_logger('screener')
+
+REFRESH_INTERVAL = float(os.environ.get('SCREENER_REFRESH_INTERVAL', '21600'))
+FETCH_CONCURRENCY = int(os.environ.get('SCREENER_FETCH_CONCURRENCY', '2'))
+FETCH_RATE = float(os.environ.get('SCREENER_FETCH_RATE', '2'))
+# A refresh holds the lease while it runs; the TTL only matters if its worker dies
+LEASE_KEY = 'screener:lease'
+LEASE_TTL = float(os.environ.get('SCREENER_LEASE_TTL', '10800'))
+PROCESSES = int(os.environ.get('SCREENER_PROCESSES', str(min(4, os.cpu_count() or 1))))
+CHUNK_SIZE = 64               # tickers per process-pool task
+FETCH_ATTEMPTS = 3
+TABLE_CHECK_INTERVAL = 60
+MAX_LIMIT = 500
+
+TICKERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'combined_tickers.json')
+
+# Numeric statistics kept per ticker (keys of calculate_summary_statistics)
+COLUMNS = ('last_close', 'price_change', 'percent_change', 'period_high', 'period_low',
+           'average_close', 'average_volume', 'total_records', 'rsi', 'bb_upper', 'bb_lower',
+           'ma_50_sma', 'ma_200_sma', 'ma_50_ema', 'ma_200_ema', 'macd_line', 'macd_signal',
+           'macd_hist')
+# Columns with a secondary (sorted) index: the common filters
+INDEXED = ('last_close', 'percent_change', 'average_volume', 'rsi', 'ma_200_sma', 'macd_hist')
+ALIASES = {'price': 'last_close', 'change': 'percent_change', 'volume': 'average_volume',
+           'sma50': 'ma_50_sma', 'sma200': 'ma_200_sma', 'ema50': 'ma_50_ema',
+           'ema200': 'ma_200_ema', 'macd': 'macd_line', 'signal': 'macd_signal'}
+MARKETS = ('NSE', 'US')
+
+table_rows = metrics.Gauge('kodbank_screener_rows', 'Tickers in the current screener table.')
+build_seconds = metrics.Gauge('kodbank_screener_build_seconds', 'Duration of the last screener refresh.')
+
+
+class ScreenerQueryError(ValueError):
+    """Malformed filter or sort expression (reported to the client as 400)."""
+
+
+_FILTER_RE = re.compile(r'^\s*([a-z_0-9]+)\s*(<=|>=|==|!=|<|>)\s*([^\s]+)\s*$')
+
+_OPS = {
+    '<':  np.less,
+    '<=': np.less_equal,
+    '>':  np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+
+def _column(name: str) -> str:
+    name = ALIASES.get(name, name)
+    if name not in COLUMNS:
+        raise ScreenerQueryError(f"unknown column '{name}'")
+    return name
+
+
+def parse_filter(expr: str) -> tuple[str, str, float | str]:
+    """'rsi<30' -> ('rsi', '<', 30.0); 'price>sma200' -> ('last_close', '>', 'ma_200_sma')."""
+    m = _FILTER_RE.match(expr)
+    if not m:
+        raise ScreenerQueryError(f"cannot parse filter '{expr}' (expected e.g. rsi<30 or price>sma200)")
+    column, op, rhs = m.groups()
+    try:
+        return _column(column), op, float(rhs)
+    except ValueError:
+        return _column(column), op, _column(rhs)
+
+
+def market_of(symbol: str) -> str:
+    return 'NSE' if symbol.endswith('.NS') else 'US'
+
+
+# ── Columnar table ────────────────────────────────────────────────────────────
+
+class ScreenerTable:
+    """Latest statistics for every screened ticker, one array per column."""
+
+    def __init__(self, symbols: list[str], names: list[str], columns: dict[str, np.ndarray],
+                 built_at: float | None = None):
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.markets = np.asarray([market_of(s) for s in symbols], dtype=object)
+        self.columns = {c: np.asarray(columns[c], dtype=np.float64) for c in COLUMNS}
+        self.built_at = built_at if built_at is not None else time.time()
+        self._market_rows = {m: np.flatnonzero(self.markets == m) for m in MARKETS}
+        # Secondary indexes: rows with a value, ordered by it (NaN = missing)
+        self._indexes = {}
+        for c in INDEXED:
+            values = self.columns[c]
+            order = np.flatnonzero(~np.isnan(values))
+            order = order[np.argsort(values[order], kind='stable')]
+            self._indexes[c] = (order, values[order])
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[str, str, dict]], built_at: float | None = None) -> 'ScreenerTable':
+        """rows: (symbol, name, statistics) in any order; stored sorted by symbol."""
+        rows = sorted(rows, key=lambda r: r[0])
+        columns = {c: np.array([np.nan if r[2].get(c) is None else r[2][c] for r in rows], dtype=np.float64)
+                   for c in COLUMNS}
+        return cls([r[0] for r in rows], [r[1] for r in rows], columns, built_at)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def size_bytes(self) -> int:
+        return sum(a.nbytes for a in self.columns.values()) + sum(
+            o.nbytes + v.nbytes for o, v in self._indexes.values()) + 100 * len(self)
+
+    def _index_rows(self, column: str, op: str, value: float) -> np.ndarray | None:
+        """Row ids satisfying `column op value` via the sorted index, if any."""
+        if column not in self._indexes or op == '!=':
+            return None
+        order, values = self._indexes[column]
+        if op == '<':
+            return order[:np.searchsorted(values, value, 'left')]
+        if op == '<=':
+            return order[:np.searchsorted(values, value, 'right')]
+        if op == '>':
+            return order[np.searchsorted(values, value, 'right'):]
+        if op == '>=':
+            return order[np.searchsorted(values, value, 'left'):]
+        return order[np.searchsorted(values, value, 'left'):np.searchsorted(values, value, 'right')]
+
+    def query(self, where: list[str] = (), market: str | None = None, sort: str | None = None,
+              limit: int = 50) -> tuple[np.ndarray, int]:
+        """
+        Row ids matching every filter (missing values never match), sorted by
+        `sort` ('-col' for descending, missing last) and cut to `limit`.
+        Returns (rows, total number of matches).
+        """
+        filters = [parse_filter(w) for w in where]
+        if market is not None and market not in MARKETS:
+            raise ScreenerQueryError(f"market must be one of {', '.join(MARKETS)}")
+
+        # Start from the most selective indexed filter (or market), then
+        # evaluate everything else on that candidate set only
+        candidates, used = None, None
+        if market is not None:
+            candidates = self._market_rows[market]
+        for i, (column, op, rhs) in enumerate(filters):
+            if isinstance(rhs, float):
+                rows = self._index_rows(column, op, rhs)
+                if rows is not None and (candidates is None or len(rows) < len(candidates)):
+                    candidates, used = rows, i
+        if candidates is None:
+            candidates = np.arange(len(self))
+        elif used is not None and market is not None:
+            candidates = candidates[self.markets[candidates] == market]
+        candidates = np.sort(candidates)
+
+        for i, (column, op, rhs) in enumerate(filters):
+            if i == used or not len(candidates):
+                continue
+            left = self.columns[column][candidates]
+            right = self.columns[rhs][candidates] if isinstance(rhs, str) else rhs
+            with np.errstate(invalid='ignore'):
+                keep = _OPS[op](left, right) & ~np.isnan(left)
+            if isinstance(rhs, str):
+                keep &= ~np.isnan(right)
+            candidates = candidates[keep]
+
+        total = len(candidates)
+        if sort:
+            descending = sort.startswith('-')
+            values = self.columns[_column(sort.lstrip('-+'))][candidates]
+            order = np.argsort(-values if descending else values, kind='stable')   # NaN sorts last
+            candidates = candidates[order]
+        return candidates[:max(0, limit)], total
+
+    def row(self, i: int) -> dict:
+        out = {'symbol': self.symbols[i], 'name': self.names[i], 'market': self.markets[i]}
+        for c, values in self.columns.items():
+            v = float(values[i])
+            out[c] = None if np.isnan(v) else v
+        out['total_records'] = int(out['total_records']) if out['total_records'] is not None else None
+        return out
+
+
+# ── Current table (per process, shared via the cache) ────────────────────────
+
+_table: ScreenerTable | None = None
+_checked_at = 0.0
+_table_lock = threading.Lock()
+
+
+def publish(table: ScreenerTable):
+    global _table
+    with _table_lock:
+        _table = table
+    cache.set('screener:table', table)
+    cache.set('screener:built_at', table.built_at)
+    table_rows.set(value=len(table))
+
+
+def current() -> ScreenerTable | None:
+    """This process's table, replaced by a newer cached build when one exists."""
+    global _table, _checked_at
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < TABLE_CHECK_INTERVAL:
+        return _table
+    with _table_lock:
+        _checked_at = now
+        built_at = cache.get('screener:built_at')
+        if built_at is not None and (_table is None or built_at > _table.built_at):
+            table = cache.get('screener:table')
+            if table is not None:
+                _table = table
+                table_rows.set(value=len(table))
+        return _table
+
+
+# ── Refresh job ───────────────────────────────────────────────────────────────
+
+def load_symbols(path: str = TICKERS_PATH) -> list[dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Low-priority budget on top of the shared yahoo_finance policy (see module docstring)
+_fetch_bucket = resilience.TokenBucket(FETCH_RATE, burst=1)
+
+
+def _fetch(load_history, symbol: str) -> Bars:
+    """load_history(symbol) within the screener's rate, waiting out rate limiting."""
+    for attempt in range(FETCH_ATTEMPTS):
+        while not _fetch_bucket.acquire(max_wait=60):
+            pass
+        try:
+            return load_history(symbol)
+        except resilience.UpstreamUnavailable as e:
+            if e.reason == 'breaker_open' or attempt == FETCH_ATTEMPTS - 1:
+                raise
+            time.sleep(min(e.retry_after or 1.0, 30))
+
+
+def _compute_chunk(chunk: list[tuple[str, Bars]]) -> list[tuple[str, dict | None]]:
+    """Process-pool task: statistics for a batch of (symbol, history)."""
+    from scraper import calculate_summary_statistics
+    out = []
+    for symbol, history in chunk:
+        try:
+            out.append((symbol, calculate_summary_statistics(history)))
+        except Exception:
+            out.append((symbol, None))
+    return out
+
+
+def refresh(load_history, symbols: list[dict], progress=None, fetch_concurrency: int = FETCH_CONCURRENCY,
+            processes: int = PROCESSES, holds_lease: bool = False) -> dict:
+    """
+    Rebuild and publish the table for `symbols` ({'symbol', 'name'} dicts).
+    load_history(symbol) returns daily bars; fetching and computing overlap,
+    chunk by chunk. processes=0 computes in this process. An open Yahoo
+    circuit breaker aborts the refresh and keeps the previous table.
+    holds_lease: started by RefreshSchedule, which took the refresh lease;
+    it is released when the refresh ends either way.
+    """
+    try:
+        return _build(load_history, symbols, progress, fetch_concurrency, processes)
+    finally:
+        if holds_lease:
+            cache.delete(LEASE_KEY)
+
+
+def _build(load_history, symbols: list[dict], progress, fetch_concurrency: int, processes: int) -> dict:
+    t0 = time.monotonic()
+    emit = progress or (lambda *a, **k: None)
+    names = {s['symbol']: s.get('name', '') for s in symbols}
+    results: list[tuple[str, str, dict]] = []
+    failed = 0
+    # spawn: forking a threaded server process can copy held locks
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) if processes else None
+    fetchers = ThreadPoolExecutor(fetch_concurrency, thread_name_prefix='kodbank-screener')
+    try:
+        pending, chunk = [], []
+
+        def submit(chunk):
+            pending.append(pool.submit(_compute_chunk, chunk) if pool else _Done(_compute_chunk(chunk)))
+
+        futures = {fetchers.submit(_fetch, load_history, s): s for s in names}
+        for n, future in enumerate(as_completed(futures), 1):
+            symbol = futures[future]
+            try:
+                history = future.result()
+            except resilience.UpstreamUnavailable as e:
+                if e.reason == 'breaker_open':
+                    raise RuntimeError(f'Screener refresh aborted: {e}') from e
+                history = None
+            except Exception:
+                history = None
+            if history:
+                chunk.append((symbol, history))
+            else:
+                failed += 1
+            if len(chunk) >= CHUNK_SIZE:
+                submit(chunk)
+                chunk = []
+            if n % CHUNK_SIZE == 0:
+                emit('fetching', done=n, total=len(names), failed=failed)
+        if chunk:
+            submit(chunk)
+
+        emit('computing', chunks=len(pending))
+        for future in pending:
+            for symbol, stats in future.result():
+                if stats is None:
+                    failed += 1
+                else:
+                    results.append((symbol, names[symbol], stats))
+    finally:
+        fetchers.shutdown(wait=False, cancel_futures=True)
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    table = ScreenerTable.from_rows(results)
+    publish(table)
+    seconds = time.monotonic() - t0
+    build_seconds.set(value=round(seconds, 3))
+    log.info('screener refreshed', extra={'rows': len(table), 'failed': failed, 'seconds': round(seconds, 1)})
+    return {'rows': len(table), 'failed': failed, 'seconds': round(seconds, 1)}
+
+
+class _Done:
+    """Future-like wrapper for a result computed inline (processes=0)."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+
+class RefreshSchedule:
+    """
+    Submits a refresh (via `submit(owner) -> jobs.Job`, which must pass
+    holds_lease=True to refresh()) when triggered, and once started, whenever
+    the table is `interval` seconds old. A refresh only starts after taking
+    the lease, so at most one runs across all workers sharing the cache.
+    """
+
+    def __init__(self, submit, interval: float = REFRESH_INTERVAL):
+        self.submit = submit
+        self.interval = interval
+        self.job = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._worker = uuid.uuid4().hex
+
+    def trigger(self, owner: str | None = None):
+        """
+        Submit a refresh unless one is already queued or running. Returns
+        this worker's job, or None while another worker holds the lease.
+        Raises jobs.JobQueueFull if the job pool is saturated.
+        """
+        with self._lock:
+            if self.job is not None and not self.job.done:
+                return self.job
+            if not cache.add(LEASE_KEY, self._worker, ttl=LEASE_TTL):
+                return None
+            try:
+                self.job = self.submit(owner)
+            except Exception:
+                cache.delete(LEASE_KEY)
+                raise
+            return self.job
+
+    def ensure_started(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='kodbank-screener-schedule',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            table = current()
+            if table is None or time.time() - table.built_at >= self.interval:
+                try:
+                    self.trigger()
+                except Exception as e:
+                    log.warning('screener refresh not submitted', extra={'error': str(e)})
+            time.sleep(min(self.interval, TABLE_CHECK_INTERVAL))
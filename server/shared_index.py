@@ -0,0 +1,223 @@
+"""
+shared_index.py — Read-only index segments shared between gunicorn workers.
+
+One process publishes a set of NumPy arrays plus JSON metadata into a single
+segment file; every worker memory-maps that file read-only and wraps the
+arrays with np.frombuffer, so there is one resident copy in the page cache
+and retrieval reads it without copying.
+
+Segment layout (little-endian):
+    0   8s   magic  b'KBSEG001'
+    8   u64  generation (incremented on every publish)
+    16  u64  metadata length in bytes
+    24  ...  reserved (zero) up to HEADER_SIZE
+    64  ...  metadata JSON, then each array at a 64-byte aligned offset
+
+Publishing writes a temp file and renames it over the segment, so readers
+either see the old file (which stays valid while mapped) or the new one;
+they notice a new version by its changed inode / mtime and remap.
+
+Large string data (chunk texts, vocabularies) goes in as arrays too, not in
+the JSON: pack_strings() / pack_mapping() encode it as an offsets array plus
+a UTF-8 blob, and StringTable / StringMap read it straight from the mapping,
+so no worker parses or holds its own copy.
+"""
+
+import bisect
+import contextlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b'KBSEG001'
+HEADER_SIZE = 64
+_HEADER = struct.Struct('<8sQQ')
+_ALIGN = 64
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def read_generation(path: str) -> int:
+    """Generation number of the segment at `path`, or 0 if there is none."""
+    try:
+        with open(path, 'rb') as f:
+            magic, generation, _ = _HEADER.unpack(f.read(_HEADER.size))
+        return generation if magic == MAGIC else 0
+    except (OSError, struct.error):
+        return 0
+
+
+def publish(path: str, arrays: dict, meta: dict) -> int:
+    """
+    Write `arrays` (name -> ndarray) and `meta` as a new segment generation.
+    Callers should hold publisher_lock(path). Returns the new generation.
+    """
+    import numpy as np
+
+    generation = read_generation(path) + 1
+    layout, offset = {}, 0
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    for name, a in arrays.items():
+        layout[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _aligned(offset + a.nbytes)
+    meta_bytes = json.dumps({'arrays': layout, 'meta': meta}).encode('utf-8')
+    data_start = _aligned(HEADER_SIZE + len(meta_bytes))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, generation, len(meta_bytes)).ljust(HEADER_SIZE, b'\0'))
+        f.write(meta_bytes)
+        for name, a in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(a.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return generation
+
+
+# ── String tables ─────────────────────────────────────────────────────────────
+
+def pack_strings(name: str, strings) -> dict:
+    """Arrays `<name>_offsets` (int64, len + 1) and `<name>_blob` (UTF-8 bytes)."""
+    import numpy as np
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {f'{name}_offsets': offsets,
+            f'{name}_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8)}
+
+
+def pack_mapping(name: str, mapping: dict) -> dict:
+    """pack_strings() of the keys in UTF-8 byte order, plus their int values as `<name>_ids`."""
+    import numpy as np
+
+    keys = sorted(mapping, key=lambda k: k.encode('utf-8'))
+    return {**pack_strings(name, keys),
+            f'{name}_ids': np.asarray([mapping[k] for k in keys], dtype=np.int64)}
+
+
+class StringTable:
+    """Read-only sequence of the strings packed by pack_strings(), decoded on access."""
+
+    def __init__(self, arrays: dict, name: str):
+        self._offsets = arrays[f'{name}_offsets']
+        self._blob = arrays[f'{name}_blob']
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _bytes(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        return self._bytes(range(len(self))[i]).decode('utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        return self._offsets.nbytes + self._blob.nbytes
+
+
+class StringMap:
+    """Read-only str -> int mapping packed by pack_mapping(); lookups binary-search the blob."""
+
+    def __init__(self, arrays: dict, name: str):
+        self._keys = StringTable(arrays, name)
+        self._ids = arrays[f'{name}_ids']
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _find(self, key: str) -> int:
+        raw = key.encode('utf-8')
+        i = bisect.bisect_left(range(len(self._keys)), raw, key=self._keys._bytes)
+        return i if i < len(self._keys) and self._keys._bytes(i) == raw else -1
+
+    def get(self, key: str, default=None):
+        i = self._find(key)
+        return int(self._ids[i]) if i >= 0 else default
+
+    def __getitem__(self, key: str) -> int:
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return int(self._ids[i])
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) >= 0
+
+    def keys(self):
+        return iter(self._keys)
+
+    def items(self):
+        return zip(self._keys, (int(i) for i in self._ids))
+
+
+@contextlib.contextmanager
+def publisher_lock(path: str):
+    """Cross-process exclusive lock so only one worker rebuilds and publishes."""
+    import fcntl  # POSIX only; shared mode is meant for gunicorn hosts
+
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SharedSegment:
+    """Read-only view of a published segment that remaps when a new one appears."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation = 0
+        self.arrays: dict = {}
+        self.meta: dict = {}
+        self.mapped_bytes = 0
+        self._key = None
+        self._mm = None
+        self._lock = threading.Lock()
+
+    def poll(self) -> bool:
+        """Map the segment if it changed since the last call. Returns True on remap."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if key == self._key:
+                return False
+            self._map()
+            self._key = key
+            return True
+
+    def _map(self):
+        """Map the current file and swap in its arrays. Caller holds _lock."""
+        import numpy as np
+
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, generation, meta_len = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a KodBank index segment")
+        payload = json.loads(mm[HEADER_SIZE:HEADER_SIZE + meta_len].decode('utf-8'))
+        data_start = _aligned(HEADER_SIZE + meta_len)
+        arrays = {}
+        for name, spec in payload['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count,
+                                         offset=data_start + spec['offset']).reshape(spec['shape'])
+        # The previous mmap is released once no array views reference it
+        self._mm = mm
+        self.arrays = arrays
+        self.meta = payload['meta']
+        self.generation = generation
+        self.mapped_bytes = len(mm)
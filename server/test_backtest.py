@@ -0,0 +1,113 @@
+"""
+test_backtest.py — Tests for the vectorized backtest engine (backtest.py).
+
+Indicators are checked against the batch statistics (scraper.py), positions
+and metrics against a straightforward bar-by-bar loop. Run with:
+    cd server && python -m pytest test_backtest.py -q
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+import backtest
+from bars import Bars
+from scraper import calculate_summary_statistics
+
+
+def _walk(seed: int, n: int, m: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.round(100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (m, n)), axis=1)), 2)
+
+
+def _history(closes) -> Bars:
+    close = np.asarray(closes, dtype=np.float64)
+    dates = np.datetime64('2020-01-01') + np.arange(len(close))
+    return Bars(dates, close, close, close, close, close, np.ones(len(close), dtype=np.int64))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_indicators_match_batch_statistics(seed):
+    close = _walk(seed, 300)
+    stats = calculate_summary_statistics(_history(close[0]))
+    assert backtest.sma(close, 50)[0, -1] == pytest.approx(stats['ma_50_sma'], abs=1e-4)
+    assert backtest.sma(close, 200)[0, -1] == pytest.approx(stats['ma_200_sma'], abs=1e-4)
+    assert backtest.ema(close, 2 / 51)[0, -1] == pytest.approx(stats['ma_50_ema'], abs=1e-4)
+    assert backtest.rsi(close)[0, -1] == pytest.approx(stats['rsi'], abs=0.01)
+    mid, std = backtest.sma(close, 20)[0, -1], backtest.rolling_std(close, 20)[0, -1]
+    assert mid + 2 * std == pytest.approx(stats['bb_upper'], abs=1e-4)
+    macd = backtest.ema(close, 2 / 13) - backtest.ema(close, 2 / 27)
+    assert macd[0, -1] == pytest.approx(stats['macd_line'], abs=1e-4)
+    assert backtest.ema(macd, 0.2)[0, -1] == pytest.approx(stats['macd_signal'], abs=1e-4)
+
+
+def _loop_positions(close, enter, exit_):
+    pos, out = 0.0, []
+    for e, x in zip(enter, exit_):
+        if x:
+            pos = 0.0
+        elif e:
+            pos = 1.0
+        out.append(pos)
+    return np.array(out)
+
+
+def _loop_metrics(close, pos, cost_bps):
+    equity, peak, max_dd, trades, wins, trade_growth = 1.0, 1.0, 0.0, 0, 0, None
+    prev_held = 0.0
+    for t in range(1, len(close)):
+        held = pos[t - 1]
+        r = held * (close[t] / close[t - 1] - 1) - abs(held - prev_held) * cost_bps / 1e4
+        equity *= 1 + r
+        peak = max(peak, equity)
+        max_dd = min(max_dd, equity / peak - 1)
+        if held and not prev_held:
+            trades += 1
+            trade_growth = 1.0
+        if held:
+            trade_growth *= 1 + r
+        if prev_held and not held or held and t == len(close) - 1:
+            wins += trade_growth > 1
+        prev_held = held
+    return {'total_return': equity - 1, 'max_drawdown': max_dd, 'trades': trades,
+            'hit_rate': wins / trades if trades else None}
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('rule', backtest.RULES)
+def test_matches_a_bar_by_bar_loop(seed, rule):
+    close = _walk(seed, 600)
+    pos = backtest.positions(close, rule)[0]
+    if rule == 'rsi':
+        r = backtest.rsi(close)[0]
+        with np.errstate(invalid='ignore'):
+            np.testing.assert_array_equal(pos, _loop_positions(close[0], r < 30, r > 70))
+    expected = _loop_metrics(close[0], pos, cost_bps=5)
+    got = backtest.run(close[0], rules=[rule], cost_bps=5)[rule]
+    assert got['total_return'] == pytest.approx(expected['total_return'], abs=1e-6)
+    assert got['max_drawdown'] == pytest.approx(expected['max_drawdown'], abs=1e-6)
+    assert got['trades'] == expected['trades']
+    if expected['hit_rate'] is None:
+        assert got['hit_rate'] is None
+    else:
+        assert got['hit_rate'] == pytest.approx(expected['hit_rate'], abs=1e-6)
+
+
+def test_run_many_stacks_rows_independently():
+    close = _walk(11, 400, m=5)
+    series = {f'T{i}': close[i] for i in range(5)}
+    series['SHORT'] = close[0][:120]
+    series['ONE'] = close[0][:1]
+    results = backtest.run_many(series)
+    assert set(results) == {'T0', 'T1', 'T2', 'T3', 'T4', 'SHORT'}
+    for i in range(5):
+        assert results[f'T{i}'] == backtest.run(close[i])
+    assert results['SHORT']['golden_cross']['trades'] == 0     # SMA200 never defined
+    assert math.isclose(results['T3']['macd']['buy_hold_return'], close[3, -1] / close[3, 0] - 1,
+                        abs_tol=1e-6)
+
+
+def test_unknown_rule_is_rejected():
+    with pytest.raises(ValueError):
+        backtest.run_many({'A': _walk(1, 50)[0]}, rules=['moon'])
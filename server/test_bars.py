@@ -0,0 +1,148 @@
+"""
+test_bars.py — Tests for the typed chart ingest (bars.py, scraper.bars_from_chart).
+
+Decoding is checked against the row-by-row conversion it replaced, the row
+dicts against a round trip, and weekly / monthly resampling against a
+calendar grouping of the rows. Run with:
+    cd server && python -m pytest test_bars.py -q
+"""
+
+import datetime
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+from standins import synthetic_chart   # noqa: E402
+
+from bars import Bars                  # noqa: E402
+from scraper import bars_from_chart, resample_history, slice_range   # noqa: E402
+
+
+def _with_gaps(seed: int) -> dict:
+    """A synthetic chart with random nulls, as Yahoo sends for halted sessions."""
+    rng = random.Random(seed)
+    chart = synthetic_chart(f'GAP{seed}', bars=rng.randint(1, 300))
+    result = chart['chart']['result'][0]
+    for values in list(result['indicators']['quote'][0].values()) + [result['indicators']['adjclose'][0]['adjclose']]:
+        for i in range(len(values)):
+            if rng.random() < 0.05:
+                values[i] = None
+    result['meta']['gmtoffset'] = 19800
+    return chart
+
+
+def _rows_reference(chart: dict) -> list[dict]:
+    result = chart['chart']['result'][0]
+    quote = result['indicators']['quote'][0]
+    adj = result['indicators']['adjclose'][0]['adjclose']
+    tz = datetime.timezone(datetime.timedelta(seconds=result['meta']['gmtoffset']))
+    rows = []
+    for i, ts in enumerate(result['timestamp']):
+        if quote['close'][i] is None:
+            continue
+        rows.append({
+            'Date':      datetime.datetime.fromtimestamp(ts, tz).strftime('%Y-%m-%d'),
+            'Open':      quote['open'][i],
+            'High':      quote['high'][i],
+            'Low':       quote['low'][i],
+            'Close':     quote['close'][i],
+            'Adj Close': adj[i] if adj[i] is not None else quote['close'][i],
+            'Volume':    quote['volume'][i],
+        })
+    return rows
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_decode_matches_row_conversion(seed):
+    chart = _with_gaps(seed)
+    bars = bars_from_chart(chart)
+    assert bars.close.dtype == np.float64 and bars.volume.dtype == np.int64
+    assert bars.to_rows() == _rows_reference(chart)
+    assert Bars.from_rows(bars.to_rows()).to_rows() == bars.to_rows()
+
+
+def test_slicing_and_resampling_keep_types():
+    bars = bars_from_chart(synthetic_chart('TCS.NS'))
+    year = slice_range(bars, '1y')
+    assert year.date[0] >= bars.date[-1] - 366 and year.date[-1] == bars.date[-1]
+    weekly = resample_history(year, '1wk')
+    assert isinstance(weekly, Bars) and weekly.volume.sum() == year.volume.sum()
+    assert bars.row(-1) == bars.to_rows()[-1]
+
+
+def _bar(date, o, h, l, c, v):
+    return {'Date': date, 'Open': o, 'High': h, 'Low': l, 'Close': c, 'Adj Close': c, 'Volume': v}
+
+
+def test_weekly_buckets_start_on_monday():
+    daily = Bars.from_rows([
+        _bar('2024-01-04', 10, 12, 9, 11, 100),     # Thu
+        _bar('2024-01-05', 11, 15, 10, 14, 200),    # Fri
+        _bar('2024-01-07', 14, 14, 8, 9, 50),       # Sun: still the week of Mon 1 Jan
+        _bar('2024-01-08', 9, 10, 7, 8, 300),       # Mon: a new week
+        _bar('2024-01-12', 8, 13, 8, 12, 400),      # Fri
+    ])
+    assert resample_history(daily, '1wk').to_rows() == [
+        _bar('2024-01-04', 10, 15, 8, 9, 350),
+        _bar('2024-01-08', 9, 13, 7, 12, 700),
+    ]
+
+
+def test_monthly_buckets_follow_calendar_months():
+    daily = Bars.from_rows([
+        _bar('2024-01-30', 10, 12, 9, 11, 100),
+        _bar('2024-01-31', 11, 16, 10, 15, 200),
+        _bar('2024-02-01', 15, 15, 6, 7, 300),
+        _bar('2024-02-29', 7, 9, 7, 8, 400),
+        _bar('2024-03-01', 8, 8, 8, 8, 0),
+    ])
+    assert resample_history(daily, '1mo').to_rows() == [
+        _bar('2024-01-30', 10, 16, 9, 15, 300),
+        _bar('2024-02-01', 15, 15, 6, 8, 700),
+        _bar('2024-03-01', 8, 8, 8, 8, 0),
+    ]
+
+
+def test_buckets_without_any_volume_keep_it_missing():
+    daily = Bars.from_rows([
+        _bar('2024-01-04', 10, 12, 9, 11, None),
+        _bar('2024-01-05', 11, 15, 10, 14, None),
+        _bar('2024-01-08', 9, 10, 7, 8, None),      # one missing volume in a week that has one
+        _bar('2024-01-09', 8, 13, 8, 12, 400),
+    ])
+    assert [r['Volume'] for r in resample_history(daily, '1wk').to_rows()] == [None, 400]
+
+
+def _resample_reference(rows: list[dict], interval: str) -> list[dict]:
+    """Group rows by ISO week (Monday start) or calendar month, one dict at a time."""
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        day = datetime.date.fromisoformat(row['Date'])
+        key = day.isocalendar()[:2] if interval == '1wk' else (day.year, day.month)
+        groups.setdefault(key, []).append(row)
+    return [{
+        'Date':      group[0]['Date'],
+        'Open':      group[0]['Open'],
+        'High':      max(r['High'] for r in group),
+        'Low':       min(r['Low'] for r in group),
+        'Close':     group[-1]['Close'],
+        'Adj Close': group[-1]['Adj Close'],
+        'Volume':    sum(r['Volume'] for r in group),
+    } for group in groups.values()]
+
+
+@pytest.mark.parametrize('interval', ['1wk', '1mo'])
+@pytest.mark.parametrize('ticker', ['TCS.NS', 'AAPL', 'HDFCBANK.NS'])
+def test_resampling_matches_calendar_grouping(ticker, interval):
+    bars = bars_from_chart(synthetic_chart(ticker, bars=800))
+    assert resample_history(bars, interval).to_rows() == _resample_reference(bars.to_rows(), interval)
+
+
+def test_empty_result_is_rejected():
+    with pytest.raises(ValueError):
+        bars_from_chart({'chart': {'result': None, 'error': {'code': 'Not Found'}}})
@@ -0,0 +1,129 @@
+"""
+test_cache.py — Tests for the cache backends (cache.py): get / set / TTL /
+add / delete and the hit / miss / error counters, run against the in-process
+LRU, a SQLite file and the Redis stand-in (bench/standins.py). Run with:
+    cd server && python -m pytest test_cache.py -q
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+from standins import RedisStandIn   # noqa: E402
+
+import cache                         # noqa: E402
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        yield cache.LRUCache()
+    elif request.param == 'sqlite':
+        yield cache.SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    else:
+        with RedisStandIn() as redis:
+            yield cache.RedisCache(redis.url)
+
+
+def test_get_set_delete_round_trip(backend):
+    value = {'rows': [1, 2.5, None], 'name': 'TCS.NS'}
+    assert backend.get('k') is None and backend.get('k', 'dflt') == 'dflt'
+    backend.set('k', value)
+    assert backend.get('k') == value
+    backend.set('k', 'replaced')
+    assert backend.get('k') == 'replaced'
+    backend.delete('k')
+    assert backend.get('k') is None
+    backend.delete('never-set')                  # deleting a missing key is not an error
+
+
+def test_entries_expire_after_their_ttl(backend):
+    backend.set('short', 1, ttl=0.05)
+    backend.set('forever', 2)
+    assert backend.get('short') == 1
+    time.sleep(0.1)
+    assert backend.get('short') is None and backend.get('forever') == 2
+
+
+def test_add_only_stores_absent_or_expired_keys(backend):
+    assert backend.add('lease', 'worker-1', ttl=0.05)
+    assert not backend.add('lease', 'worker-2', ttl=0.05)
+    assert backend.get('lease') == 'worker-1'
+    time.sleep(0.1)
+    assert backend.add('lease', 'worker-2', ttl=60)
+    assert backend.get('lease') == 'worker-2'
+    backend.delete('lease')
+    assert backend.add('lease', 'worker-3')
+
+
+def test_get_or_set_and_get_or_stale(backend):
+    calls = []
+    assert backend.get_or_set('g', 60, lambda: calls.append(1) or 'loaded') == 'loaded'
+    assert backend.get_or_set('g', 60, lambda: calls.append(1) or 'again') == 'loaded'
+    assert len(calls) == 1
+
+    assert backend.get_or_stale('s', 0.05, lambda: 'fresh', stale_ttl=60) == ('fresh', False)
+    time.sleep(0.1)
+
+    def down():
+        raise RuntimeError('upstream down')
+
+    assert backend.get_or_stale('s', 0.05, down, stale_ttl=60) == ('fresh', True)
+    with pytest.raises(RuntimeError):
+        backend.get_or_stale('never', 60, down, stale_ttl=60)
+
+
+def test_metrics_count_hits_misses_and_sets(backend):
+    backend.set('a', 1)
+    backend.get('a')
+    backend.get('a')
+    backend.get('missing')
+    m = backend.metrics()
+    assert (m['backend'], m['hits'], m['misses'], m['sets'], m['errors']) == (backend.name, 2, 1, 1, 0)
+    assert m['hit_rate'] == round(2 / 3, 4)
+
+
+def test_unreadable_entry_counts_as_error_and_miss(backend):
+    backend._set_raw('bad', b'not a pickle', None)
+    assert backend.get('bad', 'dflt') == 'dflt'
+    m = backend.metrics()
+    assert (m['hits'], m['misses'], m['errors']) == (0, 1, 1)
+
+
+def test_unreachable_redis_is_a_miss():
+    with RedisStandIn() as redis:
+        url = redis.url
+    backend = cache.RedisCache(url, timeout=0.2)
+    backend.set('k', 1)
+    assert backend.get('k') is None
+    assert backend.metrics()['errors'] == 2
+
+
+def test_lru_evicts_least_recently_used():
+    lru = cache.LRUCache(max_entries=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+    assert lru.get('b') is None and lru.get('a') == 1 and lru.get('c') == 3
+    assert lru.evict_to(0) == 2 and lru.size_bytes == 0
+
+
+def test_sqlite_purges_expired_rows_every_n_sets(tmp_path):
+    sqlite = cache.SQLiteCache(str(tmp_path / 'cache.sqlite3'), purge_every=10)
+    for i in range(5):
+        sqlite.set(f'old{i}', i, ttl=0.01)
+    time.sleep(0.05)
+
+    def rows():
+        return sqlite._conn().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    for i in range(4):
+        sqlite.set(f'new{i}', i, ttl=60)
+    assert rows() == 9                           # expired rows linger until a purge
+    sqlite.set('new4', 4, ttl=60)                # the 10th set purges
+    assert rows() == 5
@@ -0,0 +1,77 @@
+"""
+test_downsample.py — Tests for chart downsampling (downsample.py).
+
+LTTB is checked against a direct transcription of the published algorithm,
+OHLC buckets against the bars they cover. Run with:
+    cd server && python -m pytest test_downsample.py -q
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+from standins import synthetic_chart   # noqa: E402
+
+import downsample                      # noqa: E402
+from scraper import bars_from_chart    # noqa: E402
+
+
+def _lttb_reference(x, y, n):
+    m = len(y)
+
+    def edge(i):                                   # bucket boundaries, exactly
+        return i * (m - 2) // (n - 2) + 1
+
+    kept, a = [0], 0
+    for i in range(n - 2):
+        lo, hi = edge(i), edge(i + 1)
+        nlo, nhi = hi, edge(i + 2)
+        if i == n - 3:
+            nlo, nhi = m - 1, m
+        cx = sum(x[nlo:nhi]) / (nhi - nlo)
+        cy = sum(y[nlo:nhi]) / (nhi - nlo)
+        best, best_area = lo, -1.0
+        for b in range(lo, hi):
+            area = abs((x[a] - cx) * (y[b] - y[a]) - (x[a] - x[b]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = b, area
+        kept.append(best)
+        a = best
+    return kept + [m - 1]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('table', [True, False])
+def test_lttb_matches_reference(seed, table, monkeypatch):
+    if not table:
+        monkeypatch.setattr(downsample, '_TABLE_CELLS', 0)
+    rng = random.Random(seed)
+    m = rng.randint(4, 3000)
+    n = rng.randint(3, m - 1)
+    x = np.cumsum(np.random.default_rng(seed).integers(1, 4, m)).astype(float)
+    y = np.cumsum(np.random.default_rng(seed + 1).normal(0, 1, m))
+    assert downsample.lttb_indices(x, y, n).tolist() == _lttb_reference(x.tolist(), y.tolist(), n)
+
+
+@pytest.mark.parametrize('points', [10, 97, 500, 2519, 5000])
+def test_candle_buckets_cover_every_bar(points):
+    bars = bars_from_chart(synthetic_chart('LONG.NS', bars=2520))
+    view = downsample.downsample(bars, points, 'candle')
+    assert len(view) == min(points, len(bars))
+    assert view.date[0] == bars.date[0] and view.close[-1] == bars.close[-1]
+    assert view.high.max() == bars.high.max() and view.low.min() == bars.low.min()
+    assert view.volume.sum() == bars.volume.sum()
+
+
+def test_line_keeps_endpoints_and_extremes():
+    bars = bars_from_chart(synthetic_chart('LONG.NS', bars=2520))
+    view = downsample.downsample(bars, 300, 'line')
+    assert len(view) == 300
+    assert view.date[0] == bars.date[0] and view.date[-1] == bars.date[-1]
+    assert bars.close.max() in view.close and bars.close.min() in view.close
+    assert downsample.downsample(bars, 5000, 'line') is bars
@@ -0,0 +1,129 @@
+"""
+test_indicators.py — Property tests: IndicatorState (indicators.py) matches
+calculate_summary_statistics (scraper.py) on randomly generated histories.
+
+Each property runs over many seeded random walks (lengths, volatility, gaps
+and revisions vary with the seed), so failures are reproducible. Run with:
+    cd server && python -m pytest test_indicators.py -q
+"""
+
+import datetime
+import json
+import random
+
+import pytest
+
+from indicators import IndicatorState
+from scraper import calculate_summary_statistics
+
+SEEDS = range(40)
+
+
+def _bar(rng: random.Random, day: datetime.date, prev_close: float) -> dict:
+    close = max(0.5, prev_close * (1 + rng.gauss(0, rng.choice((0.002, 0.02, 0.06)))))
+    open_ = prev_close
+    return {
+        'Date':      day.isoformat(),
+        'Open':      round(open_, 2),
+        'High':      round(max(open_, close) * (1 + rng.random() * 0.01), 2),
+        'Low':       round(min(open_, close) * (1 - rng.random() * 0.01), 2),
+        'Close':     round(close, 2),
+        'Adj Close': round(close, 2),
+        'Volume':    None if rng.random() < 0.02 else rng.randint(0, 5_000_000),
+    }
+
+
+def _history(seed: int, length: int | None = None) -> list[dict]:
+    rng = random.Random(seed)
+    length = length or rng.choice((1, 2, 13, 15, 19, 20, 21, 49, 50, 199, 200, 201, rng.randint(1, 700)))
+    price = rng.uniform(1, 5000)
+    day = datetime.date(2020, 1, 1)
+    bars = []
+    while len(bars) < length:
+        day += datetime.timedelta(days=rng.choice((1, 1, 1, 3)))
+        bar = _bar(rng, day, price)
+        price = bar['Close']
+        bars.append(bar)
+    return bars
+
+
+def _assert_matches(incremental: dict, batch: dict):
+    assert incremental.keys() == batch.keys()
+    for key, expected in batch.items():
+        got = incremental[key]
+        if isinstance(expected, float) and got is not None:
+            # Both sides round to 2-4 places; allow one unit in the last place
+            assert got == pytest.approx(expected, rel=1e-9, abs=1.01e-4 if key != 'average_volume' else 0.011), key
+        else:
+            assert got == expected, key
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_appending_bars_matches_batch(seed):
+    history = _history(seed)
+    _assert_matches(IndicatorState.from_history(history).statistics(),
+                    calculate_summary_statistics(history))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_every_prefix_matches_batch(seed):
+    history = _history(seed, length=random.Random(seed).randint(1, 60))
+    state = IndicatorState()
+    for i, bar in enumerate(history):
+        state.append(bar)
+        _assert_matches(state.statistics(), calculate_summary_statistics(history[:i + 1]))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_revising_the_latest_bar_matches_batch(seed):
+    rng = random.Random(seed)
+    history = _history(seed)
+    state = IndicatorState.from_history(history[:-1])
+    final = history[-1]
+    prev_close = history[-2]['Close'] if len(history) > 1 else final['Open']
+    # Intraday updates of the open session, then its final bar
+    for _ in range(rng.randint(1, 20)):
+        state.update({**_bar(rng, datetime.date.fromisoformat(final['Date']), prev_close)})
+    state.update(final)
+    _assert_matches(state.statistics(), calculate_summary_statistics(history))
+
+    next_day = datetime.date.fromisoformat(final['Date']) + datetime.timedelta(days=1)
+    new_bar = _bar(rng, next_day, final['Close'])
+    assert state.update(new_bar)
+    _assert_matches(state.statistics(), calculate_summary_statistics(history + [new_bar]))
+
+
+@pytest.mark.parametrize('seed', SEEDS[:10])
+def test_serialized_state_resumes_identically(seed):
+    history = _history(seed, length=300)
+    state = IndicatorState.from_history(history[:250])
+    restored = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.statistics() == state.statistics()
+    for bar in history[250:]:
+        state.update(bar)
+        restored.update(bar)
+    assert restored.statistics() == state.statistics()
+    _assert_matches(restored.statistics(), calculate_summary_statistics(history))
+
+
+def test_long_stream_does_not_drift():
+    history = _history(7, length=5000)
+    _assert_matches(IndicatorState.from_history(history).statistics(),
+                    calculate_summary_statistics(history))
+
+
+def test_older_and_closeless_bars_are_ignored():
+    history = _history(3, length=30)
+    state = IndicatorState.from_history(history)
+    before = state.statistics()
+    assert not state.update({**history[5], 'Close': 1.0})
+    state.append({**history[-1], 'Date': '2099-01-01', 'Close': None})
+    assert state.statistics() == before
+    assert IndicatorState().statistics() is None
+
+
+def test_unknown_version_is_rejected():
+    data = IndicatorState.from_history(_history(1, length=5)).to_dict()
+    data['version'] = 99
+    with pytest.raises(ValueError):
+        IndicatorState.from_dict(data)
@@ -0,0 +1,101 @@
+"""
+test_jobs.py — Tests for the background job subsystem (jobs.py): submit,
+the pending-job cap, pruning, the SSE event stream and the cache-mirrored
+view other workers read. Run with:
+    cd server && python -m pytest test_jobs.py -q
+"""
+
+import threading
+
+import pytest
+
+import jobs
+from cache import LRUCache
+
+
+def _work(n, progress):
+    for i in range(n):
+        progress('step', i=i)
+    return n * 2
+
+
+def _fail(progress):
+    raise ValueError('boom')
+
+
+@pytest.fixture
+def manager():
+    m = jobs.JobManager(max_workers=1, max_pending=2, store=LRUCache())
+    yield m
+    m._executor.shutdown(wait=True)
+
+
+def _stages(job):
+    return [e['stage'] for e in job.iter_events(heartbeat=0.05) if e is not None]
+
+
+def test_submit_runs_the_job_and_records_events(manager):
+    job = manager.submit('count', _work, 3, owner='u1')
+    assert _stages(job) == ['queued', 'started', 'step', 'step', 'step', 'done']
+    assert job.status == 'done' and job.result == 6 and job.owner == 'u1'
+    assert [e['i'] for e in job.events if e['stage'] == 'step'] == [0, 1, 2]
+    assert manager.get(job.id) is job
+    assert job.to_dict()['events'] == 6
+
+
+def test_failed_job_reports_the_error(manager):
+    job = manager.submit('fail', _fail)
+    assert _stages(job)[-1] == 'failed'
+    assert job.status == 'failed' and job.error == 'boom'
+    assert job.events[-1]['error'] == 'boom'
+
+
+def test_queue_cap_raises_job_queue_full(manager):
+    release = threading.Event()
+    held = [manager.submit('hold', lambda progress: release.wait(5)) for _ in range(2)]
+    with pytest.raises(jobs.JobQueueFull):
+        manager.submit('hold', lambda progress: None)
+    release.set()
+    for job in held:
+        _stages(job)
+    assert manager.submit('after', _work, 0).id      # room again once they finish
+
+
+def test_finished_jobs_are_pruned_after_the_ttl(manager):
+    old = manager.submit('count', _work, 1)
+    _stages(old)
+    old.finished_at -= jobs._JOB_TTL_SECONDS + 1
+    manager.store.delete(f'job:{old.id}')              # the cache entry expires alongside
+    fresh = manager.submit('count', _work, 1)
+    _stages(fresh)
+    assert manager.get(old.id) is None
+    assert manager.get(fresh.id) is fresh
+
+
+def test_iter_events_sends_heartbeats_while_the_job_is_quiet(manager):
+    release = threading.Event()
+    job = manager.submit('hold', lambda progress: release.wait(5))
+    stream = job.iter_events(heartbeat=0.01)
+    seen = []
+    for event in stream:
+        seen.append(event)
+        if seen.count(None) == 2:
+            break
+    release.set()
+    seen.extend(stream)
+    assert [e['stage'] for e in seen if e is not None] == ['queued', 'started', 'done']
+    assert None in seen
+
+
+def test_other_workers_read_the_job_from_the_shared_store(manager, monkeypatch):
+    monkeypatch.setattr(jobs, '_SHARED_POLL_SECONDS', 0.01)
+    other = jobs.JobManager(max_workers=1, store=manager.store)    # a second worker process
+    release = threading.Event()
+    job = manager.submit('hold', lambda progress: release.wait(5) and 'ok', owner='u1')
+    remote = other.get(job.id)
+    assert isinstance(remote, jobs.SharedJob) and remote.owner == 'u1' and not remote.done
+    release.set()
+    assert _stages(remote) == ['queued', 'started', 'done']
+    assert other.get(job.id).to_dict() == job.to_dict()
+    assert other.get('missing') is None
+    other._executor.shutdown()
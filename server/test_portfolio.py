@@ -0,0 +1,123 @@
+"""
+test_portfolio.py — Tests for the aligned price matrix and risk statistics
+(portfolio.py).
+
+Incrementally extended matrices are checked against a full rebuild, and the
+statistics against plain numpy/pandas references. Run with:
+    cd server && python -m pytest test_portfolio.py -q
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import portfolio
+from portfolio import MatrixCache, PriceMatrix
+
+
+def _column(seed: int, n: int = 300, skip: float = 0.05, start: str = '2024-01-01'):
+    """Random walk on business days, with a fraction of days missing."""
+    rng = np.random.default_rng(seed)
+    dates = np.arange(np.datetime64(start), np.datetime64(start) + int(n * 1.5), dtype='datetime64[D]')
+    dates = dates[np.is_busday(dates)][:n]
+    dates = dates[rng.random(len(dates)) >= skip]
+    closes = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.015, len(dates))))
+    return dates, closes
+
+
+def _frame(columns: dict) -> pd.DataFrame:
+    return pd.DataFrame({t: pd.Series(c, index=pd.DatetimeIndex(d)) for t, (d, c) in columns.items()})
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_extended_matrix_matches_a_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    columns = {f'T{i}': _column(seed * 10 + i, start=str(np.datetime64('2024-01-01') + int(rng.integers(0, 40))))
+               for i in range(5)}
+    full = PriceMatrix.empty().with_columns(columns)
+    step = PriceMatrix.empty()
+    for t, c in columns.items():
+        step = step.with_columns({t: c})
+    np.testing.assert_array_equal(step.dates, full.dates)
+    np.testing.assert_array_equal(step.values, full.values)
+
+    expected = _frame(columns).sort_index().ffill().dropna()
+    dates, values = full.aligned()
+    np.testing.assert_array_equal(dates, expected.index.values.astype('datetime64[D]'))
+    np.testing.assert_allclose(values, expected.values)
+
+
+def test_select_reorders_and_drops_empty_rows():
+    a, b = _column(1, skip=0), _column(2, n=50, skip=0, start='2025-06-02')
+    matrix = PriceMatrix.empty().with_columns({'A': a, 'B': b})
+    only_b = matrix.select(['B'])
+    np.testing.assert_array_equal(only_b.dates, b[0])
+    np.testing.assert_array_equal(only_b.values[:, 0], b[1])
+    assert matrix.select(['B', 'A']).tickers == ['B', 'A']
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_risk_matches_reference(seed):
+    columns = {t: _column(seed * 7 + i) for i, t in enumerate(('A', 'B', 'C', 'IDX'))}
+    matrix = PriceMatrix.empty().with_columns(columns)
+    weights = [0.5, 0.3, 0.2]
+    stats = portfolio.risk(matrix, ['A', 'B', 'C'], weights, benchmark='IDX')
+
+    returns = _frame(columns).sort_index().ffill().dropna().pct_change().dropna()
+    r = returns[['A', 'B', 'C']]
+    cov = r.cov() * 252
+    np.testing.assert_allclose(stats['covariance']['matrix'], cov.values, atol=1e-7)
+    np.testing.assert_allclose(stats['correlation']['matrix'], r.corr().values, atol=1e-5)
+    for t in 'ABC':
+        beta = r[t].cov(returns['IDX']) / returns['IDX'].var()
+        assert stats['assets'][t]['beta'] == pytest.approx(beta, abs=1e-5)
+        assert stats['assets'][t]['volatility'] == pytest.approx(r[t].std() * np.sqrt(252), abs=1e-5)
+    port = r @ np.array(weights)
+    assert stats['portfolio']['volatility'] == pytest.approx(port.std() * np.sqrt(252), abs=1e-5)
+    assert stats['portfolio']['annual_return'] == pytest.approx(port.mean() * 252, abs=1e-5)
+    assert sum(stats['portfolio']['risk_contribution'].values()) == pytest.approx(1, abs=1e-4)
+    assert stats['observations'] == len(returns)
+
+
+def test_risk_needs_overlapping_history():
+    matrix = PriceMatrix.empty().with_columns({'A': _column(1, n=2, skip=0)})
+    with pytest.raises(ValueError):
+        portfolio.risk(matrix, ['A'], [1.0])
+
+
+@pytest.mark.parametrize('weights', [[float('nan'), 1.0], [float('inf'), 1.0], [-1.0, 2.0],
+                                     [0.0, 0.0], [1.0]])
+def test_risk_rejects_invalid_weights(weights):
+    matrix = PriceMatrix.empty().with_columns({'A': _column(1), 'B': _column(2)})
+    with pytest.raises(ValueError):
+        portfolio.risk(matrix, ['A', 'B'], weights)
+
+
+def test_cache_adds_only_the_new_column():
+    columns = {t: _column(i) for i, t in enumerate('ABCD')}
+    loads = []
+
+    def load(t):
+        loads.append(t)
+        return columns[t]
+
+    cache = MatrixCache()
+    _, outcome = cache.get(['A', 'B', 'C'], '1y', load)
+    assert outcome == 'built' and loads == ['A', 'B', 'C']
+    matrix, outcome = cache.get(['A', 'B', 'C', 'D'], '1y', load)
+    assert outcome == 'extended' and loads[3:] == ['D']
+    np.testing.assert_array_equal(matrix.values, PriceMatrix.empty().with_columns(columns).values)
+
+    assert cache.get(['C', 'A'], '1y', load)[1] == 'subset'
+    assert cache.get(['D', 'C', 'B', 'A'], '1y', load)[1] == 'hit'
+    assert cache.get(['A'], '6mo', load)[1] == 'built'
+    assert len(loads) == 5
+
+    cache.evict_to(0)
+    assert cache.size_bytes() == 0
+
+
+def test_cache_ignores_expired_matrices():
+    cache = MatrixCache(ttl=0)
+    cache.get(['A'], '1y', lambda t: _column(1))
+    assert cache.get(['A', 'B'], '1y', lambda t: _column(2))[1] == 'built'
@@ -0,0 +1,141 @@
+"""
+test_quotes.py — Tests for the live quote hub (quotes.py).
+
+Needs no live server: load/poll are in-memory fakes that count their calls.
+Run with:
+    cd server && python -m pytest test_quotes.py -q
+"""
+
+import threading
+import time
+
+import pytest
+
+import quotes
+
+
+class FakeMarket:
+    def __init__(self):
+        self.bar = {'Date': '2026-01-02', 'Open': 100.0, 'High': 101.0, 'Low': 99.0,
+                    'Close': 100.5, 'Adj Close': 100.5, 'Volume': 1000}
+        self.loads = 0
+        self.polls = 0
+        self._lock = threading.Lock()
+
+    def load(self, ticker):
+        self.loads += 1
+        return [{**self.bar, 'Date': '2026-01-01'}, dict(self.bar)]
+
+    def poll(self, ticker):
+        with self._lock:
+            self.polls += 1
+            return dict(self.bar)
+
+    def move(self, **fields):
+        with self._lock:
+            self.bar = {**self.bar, **fields}
+
+
+@pytest.fixture
+def market():
+    return FakeMarket()
+
+
+@pytest.fixture
+def hub(market):
+    return quotes.QuoteHub(market.load, market.poll, interval=0.02)
+
+
+def _next(sub, timeout=2.0):
+    for event in sub.events(heartbeat=timeout):
+        return event
+
+
+def _drain_until(sub, predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        event = _next(sub, timeout=0.2)
+        if event is not None and predicate(event):
+            return event
+    raise AssertionError('expected event not received')
+
+
+def test_subscribers_share_one_poller_and_get_a_snapshot(hub, market):
+    subs = [hub.subscribe('TCS.NS') for _ in range(5)]
+    first = _next(subs[0])
+    assert first['type'] == 'snapshot' and first['statistics']['last_close'] == 100.5
+    late = hub.subscribe('TCS.NS')
+    assert _next(late)['type'] == 'snapshot'        # immediately, from the feed's state
+    assert hub.tickers() == {'TCS.NS': 6}
+    assert market.loads == 1
+    assert len([t for t in threading.enumerate() if t.name == 'kodbank-quotes-TCS.NS']) == 1
+    for sub in subs + [late]:
+        sub.close()
+
+
+def test_only_changed_fields_are_pushed(hub, market):
+    sub = hub.subscribe('TCS.NS')
+    _next(sub)
+    market.move(Close=102.0, High=102.5)
+    event = _drain_until(sub, lambda e: e['type'] == 'quote')
+    assert event['bar'] == {'Close': 102.0, 'High': 102.5}
+    assert event['statistics']['last_close'] == 102.0
+    assert 'total_records' not in event['statistics']
+    assert event['new_bar'] is False
+
+    market.move(Date='2026-01-03', Open=102.0)
+    event = _drain_until(sub, lambda e: e['type'] == 'quote')
+    assert event['new_bar'] is True and event['bar']['Date'] == '2026-01-03'
+    assert event['statistics']['total_records'] == 3
+    sub.close()
+
+
+def test_poller_stops_when_the_last_subscriber_leaves(hub, market):
+    a, b = hub.subscribe('INFY.NS'), hub.subscribe('INFY.NS')
+    _next(a)
+    a.close()
+    assert hub.tickers() == {'INFY.NS': 1}
+    b.close()
+    assert hub.tickers() == {}
+    time.sleep(0.1)
+    polls = market.polls
+    time.sleep(0.1)
+    assert market.polls == polls
+    assert not any(t.name == 'kodbank-quotes-INFY.NS' for t in threading.enumerate())
+
+
+def test_hub_refuses_tickers_beyond_the_cap(market):
+    hub = quotes.QuoteHub(market.load, market.poll, interval=0.02, max_tickers=1)
+    sub = hub.subscribe('A.NS')
+    with pytest.raises(quotes.HubFull):
+        hub.subscribe('B.NS')
+    sub.close()
+    hub.subscribe('B.NS').close()
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot(market):
+    hub = quotes.QuoteHub(market.load, market.poll, interval=0.001)
+    sub = hub.subscribe('TCS.NS')
+    _next(sub)
+    for i in range(quotes.SUBSCRIBER_QUEUE * 3):
+        market.move(Close=200.0 + i)
+        time.sleep(0.005)
+    time.sleep(0.1)
+    events = []
+    while True:
+        event = _next(sub, timeout=0.05)
+        if event is None:
+            break
+        events.append(event)
+    assert any(e['type'] == 'snapshot' for e in events)
+    assert len(events) <= quotes.SUBSCRIBER_QUEUE
+    sub.close()
+
+
+def test_stream_ends_after_max_age(hub):
+    sub = hub.subscribe('TCS.NS')
+    start = time.monotonic()
+    events = list(sub.events(heartbeat=0.02, max_age=0.1))
+    assert 0.1 <= time.monotonic() - start < 1.0
+    assert events[0]['type'] == 'snapshot' and None in events
+    sub.close()
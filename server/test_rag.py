@@ -0,0 +1,136 @@
+"""
+test_rag.py — Tests for the hybrid retriever (rag.py): BM25 scores against
+hand-computed values, reciprocal rank fusion, fused retrieval and the
+prebuilt artifact round trip. Run with:
+    cd server && python -m pytest test_rag.py -q
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+import rag
+from rag import BM25Index, RAGRetriever
+
+_DOCS = ['apple banana apple', 'banana cherry', 'cherry date egg fig']
+
+_CHUNKS = [
+    'To transfer money open the Transfers tab and enter the recipient account number.',
+    'Your balance is shown on the dashboard next to the latest transactions.',
+    'Stock analytics shows RSI, Bollinger Bands and MACD for any NSE or US ticker.',
+    'Reset a forgotten password from the login page using your registered email.',
+    'News from Reuters: RBI keeps the repo rate unchanged at 6.5 percent.',
+]
+
+
+def _bm25_term(idf, tf, doc_len, avgdl, k1=1.5, b=0.75):
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avgdl))
+
+
+def test_bm25_scores_match_hand_computation():
+    index = BM25Index()
+    index.fit(_DOCS)
+    avgdl = 3.0                                   # (3 + 2 + 4) / 3
+    idf_apple = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    idf_two = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))   # banana, cherry: df = 2
+
+    np.testing.assert_allclose(index.scores('apple'), [_bm25_term(idf_apple, 2, 3, avgdl), 0, 0])
+    np.testing.assert_allclose(index.scores('banana cherry'), [
+        _bm25_term(idf_two, 1, 3, avgdl),
+        _bm25_term(idf_two, 1, 2, avgdl) * 2,
+        _bm25_term(idf_two, 1, 4, avgdl),
+    ])
+    assert index.search('banana cherry', 5) == [1, 0, 2]
+    assert index.search('banana cherry', 2) == [1, 0]
+    assert index.search('apple', 5) == [0]
+    assert index.search('kiwi', 5) == []
+
+
+def test_reciprocal_rank_fusion_orders_by_summed_reciprocal_rank():
+    # 1: 1/61 + 1/62, 3: 1/63 + 1/61, 2: 1/62, 4: 1/63
+    assert rag._reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]]) == [1, 3, 2, 4]
+    assert rag._reciprocal_rank_fusion([[], [7]]) == [7]
+    assert rag._reciprocal_rank_fusion([[5, 6], [6, 5]]) == [5, 6]    # ties keep first-seen order
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    retriever = RAGRetriever()
+    retriever.fit(_CHUNKS)
+    return retriever
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('how do I transfer money to another account', 0),
+    ('forgot my password', 3),
+    ('repo rate RBI', 4),
+    ('MACD and RSI indicators', 2),
+])
+def test_fused_retrieval_returns_the_matching_chunk(fitted, query, expected):
+    timings = {}
+    assert fitted.retrieve(query, top_k=1, timings=timings) == [_CHUNKS[expected]]
+    assert set(timings) == {'dense_ms', 'lexical_ms', 'fusion_ms'}
+
+
+def test_artifact_round_trip(fitted, tmp_path):
+    base = str(tmp_path / 'index')
+    rag.save_artifact(fitted, 'hash-1', base=base)
+
+    loaded = RAGRetriever()
+    assert rag.load_artifact(loaded, 'hash-1', base=base)
+    arrays, meta = fitted.export_state()
+    loaded_arrays, loaded_meta = loaded.export_state()
+    assert loaded_meta == meta
+    for name, values in arrays.items():
+        np.testing.assert_array_equal(loaded_arrays[name], values)
+    for query in ('transfer money', 'password reset', 'repo rate'):
+        assert loaded.retrieve(query) == fitted.retrieve(query)
+
+    assert not rag.load_artifact(RAGRetriever(), 'other-hash', base=base)
+    assert not rag.load_artifact(RAGRetriever(), 'hash-1', base=str(tmp_path / 'missing'))
+
+
+def test_shared_segment_serves_strings_from_the_mapping(fitted, tmp_path, monkeypatch):
+    import shared_index
+
+    path = str(tmp_path / 'index.seg')
+    monkeypatch.setattr(rag, '_SHARED_PATH', path)
+    monkeypatch.setattr(rag, '_shared_segment', shared_index.SharedSegment(path))
+    monkeypatch.setattr(rag, 'retriever', RAGRetriever())
+    rag._publish_shared(fitted, 'hash-1')
+    assert rag._sync_shared() and not rag._sync_shared()
+
+    segment = rag._shared_segment
+    assert set(segment.meta) == {'guide_hash', 'stop_words', 'chunks_hash'}       # no strings left in the JSON
+    vocab = shared_index.StringMap(segment.arrays, 'vocabulary')
+    assert dict(vocab.items()) == fitted._vocab and vocab.get('not a term') is None
+    assert list(shared_index.StringTable(segment.arrays, 'chunks')) == _CHUNKS
+    for query in ('transfer money', 'password reset', 'repo rate', 'RSI'):
+        assert rag.retriever.retrieve(query) == fitted.retrieve(query)
+    assert rag.retriever.chunks_hash == fitted.chunks_hash
+
+
+def test_chunks_hash_changes_with_the_indexed_content():
+    retriever = RAGRetriever()
+    retriever.fit(_CHUNKS)
+    before = retriever.chunks_hash
+    retriever.add_chunks(['News from Reuters: markets close higher.'])
+    assert retriever.chunks_hash != before
+    retriever.fit(_CHUNKS)
+    assert retriever.chunks_hash == before
+
+
+def test_refresh_news_skips_the_refit_when_the_articles_are_unchanged(monkeypatch):
+    monkeypatch.setattr(rag, 'retriever', RAGRetriever())
+    monkeypatch.setattr(rag, '_built', False)
+    articles = [{'title': 'RBI keeps the repo rate unchanged', 'description': 'At 6.5 percent.',
+                 'source': 'Reuters'}]
+    assert 'unchanged' not in rag.refresh_news(articles)
+    fitted_hash = rag.retriever.chunks_hash
+    fits = []
+    monkeypatch.setattr(rag.retriever, 'fit', lambda chunks: fits.append(chunks))
+
+    assert rag.refresh_news(articles)['unchanged'] is True
+    assert rag.refresh_news([{**articles[0], 'title': 'Markets close higher'}]).get('unchanged') is None
+    assert len(fits) == 1 and rag.retriever.chunks_hash == fitted_hash
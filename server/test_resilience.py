@@ -0,0 +1,206 @@
+"""
+test_resilience.py — Tests for resilience.py against a fault-injecting stand-in.
+
+Unlike the other test_*.py scripts this needs no live server or credentials:
+upstreams are bench/standins.py's UpstreamStandIn, with faults injected per
+test. Run with:
+    cd server && python -m pytest test_resilience.py -q
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+from standins import UpstreamStandIn   # noqa: E402
+from startup import _DUMMY_ENV         # noqa: E402
+
+import resilience                      # noqa: E402
+from resilience import CircuitBreaker, TokenBucket, Upstream, UpstreamUnavailable   # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def upstream():
+    with UpstreamStandIn(token_rate=0, tokens=5) as standin:
+        yield standin
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch, upstream):
+    monkeypatch.setattr(resilience, 'BACKOFF_BASE_S', 0.01)
+    monkeypatch.setattr(resilience, 'BACKOFF_CAP_S', 0.5)
+    upstream.clear_faults()
+    upstream.requests.clear()
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    """A fresh 'test' upstream policy, registered so http_client uses it."""
+    monkeypatch.setattr(resilience, 'BREAKER_FAILURES', 3)
+    monkeypatch.setattr(resilience, 'BREAKER_RESET_S', 0.3)
+    up = Upstream('test', rate=100, burst=100, concurrency=4, max_retries=2, queue_wait=0.05)
+    monkeypatch.setitem(resilience.UPSTREAMS, 'test', up)
+    return up
+
+
+def _get(upstream, path='/v8/finance/chart/TEST'):
+    import http_client
+    return http_client.get(upstream.base_url + path, upstream='test')
+
+
+# ── Building blocks ───────────────────────────────────────────────────────────
+
+def test_token_bucket_halves_rate_and_honours_retry_after():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()                      # burst spent, no waiting allowed
+    bucket.throttled(retry_after=0.2)
+    assert bucket.rate == 5
+    assert not bucket.acquire(max_wait=0.1)          # still inside Retry-After
+    assert bucket.acquire(max_wait=0.5)
+    for _ in range(20):
+        bucket.succeeded()
+    assert bucket.rate == 10                         # additive recovery, capped
+
+
+def test_breaker_opens_then_probes_once():
+    breaker = CircuitBreaker(failures=2, reset_after=0.1)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    time.sleep(0.12)
+    assert breaker.allow()                           # half-open probe
+    assert not breaker.allow()                       # only one at a time
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+# ── Against the fault-injecting stand-in ──────────────────────────────────────
+
+def test_transient_5xx_is_retried(upstream, policy):
+    upstream.inject('/v8/finance/chart/', status=503, times=1)
+    resp = _get(upstream)
+    assert resp.status_code == 200
+    assert upstream.requests['/v8/finance/chart'] == 2
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_429_slows_the_bucket_and_waits_for_retry_after(upstream, policy):
+    upstream.inject('/v8/finance/chart/', status=429, retry_after=0.3, times=1)
+    t0 = time.monotonic()
+    resp = _get(upstream)
+    assert resp.status_code == 200
+    assert time.monotonic() - t0 >= 0.3
+    assert policy.bucket.rate < policy.bucket.max_rate
+
+
+def test_long_retry_after_is_not_waited_out(upstream, policy):
+    upstream.inject('/v8/finance/chart/', status=429, retry_after=30, times=1)
+    t0 = time.monotonic()
+    resp = _get(upstream)
+    assert resp.status_code == 429
+    assert time.monotonic() - t0 < 1
+    with pytest.raises(UpstreamUnavailable) as exc:   # bucket blocked for 30s
+        _get(upstream)
+    assert exc.value.reason == 'rate_limited' and exc.value.retry_after > 20
+
+
+def test_breaker_fails_fast_while_open_and_recovers(upstream, policy):
+    upstream.inject('/v8/finance/chart/', status=500)
+    for _ in range(3):
+        assert _get(upstream).status_code == 500
+    assert policy.breaker.state == CircuitBreaker.OPEN
+    seen = upstream.requests['/v8/finance/chart']
+
+    t0 = time.monotonic()
+    with pytest.raises(UpstreamUnavailable) as exc:
+        _get(upstream)
+    assert exc.value.reason == 'breaker_open'
+    assert time.monotonic() - t0 < 0.05
+    assert upstream.requests['/v8/finance/chart'] == seen   # nothing sent
+
+    upstream.clear_faults()
+    time.sleep(0.35)
+    assert _get(upstream).status_code == 200
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_budget_limits_retries_during_outage(upstream, policy):
+    policy.breaker.failure_threshold = 1000
+    upstream.inject('/v8/finance/chart/', status=503)
+    calls = 30
+    for _ in range(calls):
+        _get(upstream)
+    retried = upstream.requests['/v8/finance/chart'] - calls
+    # initial budget (10) plus 0.2 per call, far below 2 retries per call
+    assert retried <= 10 + calls * resilience.RETRY_BUDGET_RATIO + 1
+
+
+def test_bulkhead_rejects_when_all_slots_are_busy(upstream, policy):
+    import threading
+    upstream.inject('/v8/finance/chart/', delay=0.5)
+    threads = [threading.Thread(target=_get, args=(upstream,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    with pytest.raises(UpstreamUnavailable) as exc:
+        _get(upstream)
+    assert exc.value.reason == 'bulkhead_full'
+    for t in threads:
+        t.join()
+
+
+def test_held_slot_stays_taken_until_released(policy):
+    held = [policy.call(lambda: 'stream', hold_slot=True) for _ in range(4)]
+    assert [result for result, _ in held] == ['stream'] * 4
+    with pytest.raises(UpstreamUnavailable) as exc:
+        policy.call(lambda: 'more')
+    assert exc.value.reason == 'bulkhead_full'
+    slot = held[0][1]
+    slot.release()
+    slot.release()                                    # idempotent: frees one slot only
+    assert policy.call(lambda: 'more') == 'more'
+    held.append(policy.call(lambda: 'stream', hold_slot=True))
+    with pytest.raises(UpstreamUnavailable):
+        policy.call(lambda: 'more')
+    for _, slot in held:
+        slot.release()
+    with pytest.raises(ZeroDivisionError):            # a failed call never keeps its slot
+        policy.call(lambda: 1 / 0, hold_slot=True)
+    assert [policy.call(lambda: 'stream', hold_slot=True)[0] for _ in range(4)] == ['stream'] * 4
+
+
+# ── App: stale data while Yahoo is down ───────────────────────────────────────
+
+def test_analytics_serves_stale_history_while_yahoo_is_down(upstream, monkeypatch):
+    for key, value in _DUMMY_ENV.items():
+        monkeypatch.setenv(key, os.environ.get(key, value))
+    monkeypatch.setenv('YAHOO_CHART_URL', upstream.yahoo_url)
+    monkeypatch.setenv('CACHE_BACKEND', 'memory')
+    monkeypatch.setenv('LOG_LEVEL', 'CRITICAL')
+    import app
+    import scraper
+    monkeypatch.setattr(scraper, 'YAHOO_CHART_URL', upstream.yahoo_url)
+    monkeypatch.setattr(resilience, 'BREAKER_FAILURES', 2)
+    monkeypatch.setitem(resilience.UPSTREAMS, 'yahoo_finance',
+                        Upstream('yahoo_finance', rate=100, burst=100, concurrency=4, max_retries=0))
+    client = app.app.test_client()
+
+    fresh = client.get('/api/analytics/stock/STALE.NS')
+    assert fresh.status_code == 200 and 'stale' not in fresh.json
+    app.cache.delete('bars:STALE.NS:2y:1d')       # fresh entry expired
+
+    upstream.inject('/v8/finance/chart/', status=500)
+    stale = client.get('/api/analytics/stock/STALE.NS')
+    assert stale.status_code == 200 and stale.json['stale'] is True
+    assert stale.json['history'] == fresh.json['history']
+
+    client.get('/api/analytics/stock/OTHER.NS')       # second failure opens the breaker
+    unavailable = client.get('/api/analytics/stock/NEW.NS')
+    assert unavailable.status_code == 503
+    assert unavailable.json['reason'] == 'breaker_open'
+    assert 'Retry-After' in unavailable.headers
@@ -0,0 +1,163 @@
+"""
+test_screener.py — Tests for the screener table and refresh job (screener.py).
+
+Index-backed queries are checked against a brute-force scan of random
+tables; the refresh job runs against an in-memory history loader. Run with:
+    cd server && python -m pytest test_screener.py -q
+"""
+
+import operator
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+from standins import synthetic_chart   # noqa: E402
+
+import resilience                      # noqa: E402
+import screener                        # noqa: E402
+from screener import ScreenerQueryError, ScreenerTable   # noqa: E402
+from scraper import bars_from_chart   # noqa: E402
+
+_OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+        '==': operator.eq, '!=': operator.ne}
+
+
+def _random_table(seed: int, n: int = 400) -> ScreenerTable:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        symbol = f'T{i:04d}' + ('.NS' if rng.random() < 0.4 else '')
+        stats = {c: (None if rng.random() < 0.05 else round(rng.uniform(0, 100), rng.choice((0, 1, 2))))
+                 for c in screener.COLUMNS}
+        rows.append((symbol, f'Company {i}', stats))
+    return ScreenerTable.from_rows(rows)
+
+
+def _brute_force(table: ScreenerTable, where: list[str], market: str | None) -> set[str]:
+    out = set()
+    for i in range(len(table)):
+        row = table.row(i)
+        if market and row['market'] != market:
+            continue
+        ok = True
+        for column, op, rhs in map(screener.parse_filter, where):
+            left = row[column]
+            right = rhs if isinstance(rhs, float) else row[rhs]
+            if left is None or right is None or not _OPS[op](left, right):
+                ok = False
+        if ok:
+            out.add(row['symbol'])
+    return out
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_indexed_queries_match_a_full_scan(seed):
+    rng = random.Random(seed)
+    table = _random_table(seed)
+    columns = list(screener.COLUMNS) + list(screener.ALIASES)
+    where = []
+    for _ in range(rng.randint(0, 3)):
+        rhs = rng.choice(columns) if rng.random() < 0.3 else rng.choice((rng.randint(0, 100), rng.uniform(0, 100)))
+        where.append(f'{rng.choice(columns)}{rng.choice(list(_OPS))}{rhs}')
+    market = rng.choice((None, 'NSE', 'US'))
+    rows, total = table.query(where, market=market, limit=10_000)
+    assert {table.symbols[i] for i in rows} == _brute_force(table, where, market)
+    assert total == len(rows)
+
+
+def test_sort_and_limit():
+    table = _random_table(1)
+    rows, total = table.query(['rsi<50'], sort='-percent_change', limit=20)
+    assert len(rows) == 20 and total > 20
+    values = [table.row(i)['percent_change'] for i in rows]
+    present = [v for v in values if v is not None]
+    assert present == sorted(present, reverse=True)
+    assert values[:len(present)] == present             # missing values sort last
+
+
+def test_bad_queries_are_rejected():
+    table = _random_table(2, n=10)
+    for where in (['rsi<<30'], ['nope<3'], ['rsi<nope']):
+        with pytest.raises(ScreenerQueryError):
+            table.query(where)
+    with pytest.raises(ScreenerQueryError):
+        table.query([], market='LSE')
+    with pytest.raises(ScreenerQueryError):
+        table.query([], sort='nope')
+
+
+# ── Refresh job ───────────────────────────────────────────────────────────────
+
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    """Lift the screener's own fetch rate, sized for the real Yahoo."""
+    monkeypatch.setattr(screener, '_fetch_bucket', resilience.TokenBucket(10_000, burst=10_000))
+
+
+def _history(symbol: str):
+    return bars_from_chart(synthetic_chart(symbol, bars=260))
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_refresh_builds_and_publishes_a_table(processes):
+    symbols = [{'symbol': f'S{i}.NS', 'name': f'Stock {i}'} for i in range(150)] + [
+        {'symbol': 'MISSING', 'name': 'No data'}]
+    loader = lambda s: [] if s == 'MISSING' else _history(s)   # noqa: E731
+    summary = screener.refresh(loader, symbols, processes=processes)
+    assert summary['rows'] == 150 and summary['failed'] == 1
+
+    table = screener.current()
+    assert len(table) == 150
+    row = table.row(int(np.flatnonzero(table.symbols == 'S7.NS')[0]))
+    from scraper import calculate_summary_statistics
+    expected = calculate_summary_statistics(_history('S7.NS'))
+    assert row['rsi'] == expected['rsi'] and row['ma_200_sma'] == expected['ma_200_sma']
+
+
+def test_refresh_aborts_when_the_breaker_is_open():
+    before = screener.current()
+
+    def loader(symbol):
+        raise resilience.UpstreamUnavailable('yahoo_finance', 'breaker_open', 30)
+
+    with pytest.raises(RuntimeError):
+        screener.refresh(loader, [{'symbol': 'A', 'name': 'A'}], processes=0)
+    assert screener.current() is before
+
+
+def test_fetch_rate_is_limited_to_the_screener_share(monkeypatch):
+    monkeypatch.setattr(screener, '_fetch_bucket', resilience.TokenBucket(50, burst=1))
+    t0 = time.monotonic()
+    summary = screener.refresh(_history, [{'symbol': f'R{i}.NS', 'name': ''} for i in range(11)],
+                               processes=0, fetch_concurrency=4)
+    assert summary['rows'] == 11
+    assert time.monotonic() - t0 >= 10 / 50 * 0.9          # 11 fetches, one token at a time
+
+
+def test_refresh_lease_admits_one_builder(monkeypatch):
+    import jobs
+    from cache import LRUCache
+    monkeypatch.setattr(screener, 'cache', LRUCache())         # stands in for the shared tier
+    manager = jobs.JobManager(max_workers=2)
+    release = threading.Event()
+
+    def submit(owner):
+        return manager.submit('screener', screener.refresh, lambda s: release.wait(5) and _history(s),
+                              [{'symbol': 'L.NS', 'name': ''}], processes=0, holds_lease=True)
+
+    first, second = screener.RefreshSchedule(submit), screener.RefreshSchedule(submit)   # two workers
+    job = first.trigger()
+    assert job is not None and first.trigger() is job        # already running here
+    assert second.trigger() is None                          # the other worker holds the lease
+    release.set()
+    list(job.iter_events(heartbeat=0.05))
+    assert job.status == 'done'
+    assert second.trigger() is not None                      # released when the refresh ended
+    manager._executor.shutdown(wait=True)
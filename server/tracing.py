@@ -0,0 +1,262 @@
+"""
+tracing.py — Lightweight span tracing for KodBank request pipelines.
+
+Every request gets a root span and a trace id (taken from an incoming
+X-Trace-Id header or generated), returned as the X-Trace-Id response header.
+Handlers open child spans around their stages:
+
+    with tracing.span('rag.get_context'):
+        ...
+
+Spans are plain objects with start/end times and attributes. Finished spans
+go to an in-memory ring buffer (TRACE_BUFFER spans, read by /debug/traces)
+and, if TRACE_FILE is set, are appended to that file as JSON lines. File
+export goes through a bounded queue and one writer thread, which appends
+whatever has queued up in a single write; spans that find the queue full
+are dropped and counted, never blocking the request.
+
+Streaming generators run after the view returns, so the current span is not
+implicitly available there: capture it with current_span() in the view and
+pass it as `parent=` when opening spans inside the generator.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+
+import metrics
+
+_BUFFER = deque(maxlen=int(os.environ.get('TRACE_BUFFER', '2000')))
+_TRACE_FILE = os.environ.get('TRACE_FILE')
+_QUEUE_SIZE = int(os.environ.get('TRACE_QUEUE_SIZE', '10000'))
+# Most spans the writer thread appends in one write
+_WRITE_BATCH = 500
+_file_queue: queue.Queue | None = None
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+_current: contextvars.ContextVar = contextvars.ContextVar('kodbank_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start', 't0',
+                 'duration_ms', 'attrs', 'status')
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None = None, **attrs):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        self.duration_ms = None
+        self.attrs = attrs
+        self.status = 'ok'
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, status: str | None = None):
+        """Finish the span and export it. Ending twice is a no-op."""
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self.t0) * 1000, 3)
+        if status:
+            self.status = status
+        _export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id':    self.trace_id,
+            'span_id':     self.span_id,
+            'parent_id':   self.parent_id,
+            'name':        self.name,
+            'start':       round(self.start, 6),
+            'duration_ms': self.duration_ms,
+            'status':      self.status,
+            'attrs':       self.attrs,
+        }
+
+
+spans_dropped = metrics.Counter('kodbank_trace_spans_dropped_total',
+                                'Spans not written to TRACE_FILE because the queue was full.')
+
+
+def _export(span: Span):
+    record = span.to_dict()
+    _BUFFER.append(record)
+    if _TRACE_FILE:
+        q = _file_queue or _start_writer()
+        try:
+            q.put_nowait(record)
+        except queue.Full:
+            spans_dropped.inc()
+
+
+# ── TRACE_FILE writer thread ──────────────────────────────────────────────────
+
+def _write_spans(q: queue.Queue):
+    """Append queued spans to TRACE_FILE, one write per batch, until a None arrives."""
+    while True:
+        batch = [q.get()]
+        while len(batch) < _WRITE_BATCH:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in batch
+        lines = ''.join(json.dumps(r, default=str) + '\n' for r in batch if r is not None)
+        if lines:
+            try:
+                with open(_TRACE_FILE, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+            except OSError:
+                spans_dropped.inc(amount=len(batch) - batch.count(None))
+        if stop:
+            return
+
+
+def _start_writer() -> queue.Queue:
+    global _file_queue, _writer
+    with _writer_lock:
+        if _file_queue is None:
+            q = queue.Queue(maxsize=_QUEUE_SIZE)
+            _writer = threading.Thread(target=_write_spans, args=(q,), daemon=True,
+                                       name='kodbank-trace-writer')
+            _writer.start()
+            _file_queue = q
+        return _file_queue
+
+
+def _reset_writer():
+    # The writer thread does not survive fork; the child starts its own on first export
+    global _file_queue, _writer
+    _file_queue, _writer = None, None
+
+
+def shutdown():
+    """Write out queued spans and stop the writer thread."""
+    q, writer = _file_queue, _writer
+    if q is not None and writer is not None and writer.is_alive():
+        q.put(None)
+        writer.join(timeout=5)
+        _reset_writer()
+
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_reset_writer)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def current_trace_id() -> str | None:
+    s = _current.get()
+    return s.trace_id if s else None
+
+
+def start_span(name: str, parent: Span | None = None, **attrs) -> Span:
+    """Start a span (child of `parent` or of the current span); call .end() yourself."""
+    parent = parent or _current.get()
+    trace_id = parent.trace_id if parent else new_trace_id()
+    return Span(name, trace_id, parent.span_id if parent else None, **attrs)
+
+
+@contextlib.contextmanager
+def span(name: str, parent: Span | None = None, **attrs):
+    """Context manager: child span that is current for the duration of the block."""
+    s = start_span(name, parent, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.set(error=str(e))
+        s.end('error')
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+def buffer_size_bytes() -> int:
+    """Rough size of the span ring buffer (memory accounting hook)."""
+    return sum(len(json.dumps(r, default=str)) for r in list(_BUFFER))
+
+
+def trim_buffer(budget_bytes: int):
+    """Drop the oldest spans until the buffer estimate fits budget_bytes."""
+    size = buffer_size_bytes()
+    while _BUFFER and size > budget_bytes:
+        size -= len(json.dumps(_BUFFER.popleft(), default=str))
+
+
+def recent_traces(limit: int = 50, trace_id: str | None = None) -> list[dict]:
+    """Group buffered spans by trace, newest trace first."""
+    traces: dict[str, list] = {}
+    for record in reversed(list(_BUFFER)):
+        if trace_id and record['trace_id'] != trace_id:
+            continue
+        traces.setdefault(record['trace_id'], []).append(record)
+        if len(traces) > limit:
+            traces.pop(record['trace_id'])
+            break
+    return [{'trace_id': tid, 'spans': sorted(spans, key=lambda r: r['start'])}
+            for tid, spans in traces.items()]
+
+
+def init_app(app):
+    """Root span per request, X-Trace-Id propagation and the /debug/traces page."""
+    from flask import g, jsonify, request, session
+
+    @app.before_request
+    def _trace_start():
+        incoming = request.headers.get('X-Trace-Id', '')
+        trace_id = incoming if 8 <= len(incoming) <= 64 and incoming.isalnum() else new_trace_id()
+        root = Span(f'{request.method} {request.path}', trace_id, method=request.method)
+        g._trace_root = root
+        g._trace_token = _current.set(root)
+
+    @app.after_request
+    def _trace_header(response):
+        root = g.get('_trace_root')
+        if root is not None:
+            response.headers['X-Trace-Id'] = root.trace_id
+            root.set(status_code=response.status_code,
+                     route=request.url_rule.rule if request.url_rule else 'unmatched')
+        return response
+
+    @app.teardown_request
+    def _trace_end(exc):
+        # Teardown runs after streamed bodies finish, so SSE spans nest inside
+        root = g.pop('_trace_root', None)
+        token = g.pop('_trace_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                pass   # reset from a different context (streamed response)
+        if root is not None:
+            root.end('error' if exc else None)
+
+    @app.route('/debug/traces')
+    def debug_traces():
+        if session.get('role') != 'admin':
+            return jsonify({'message': 'Forbidden'}), 403
+        try:
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            return jsonify({'message': 'limit must be an integer'}), 400
+        if limit < 0:
+            return jsonify({'message': 'limit must not be negative'}), 400
+        return jsonify({'traces': recent_traces(min(limit, 500), request.args.get('trace_id'))}), 200